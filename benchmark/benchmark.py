@@ -1,5 +1,6 @@
 import time
 import argparse
+import itertools
 import numpy as np
 import scipy.sparse as spp
 
@@ -63,14 +64,17 @@ def benchmark_fft(backend, args):
 
 
 def benchmark_csrmm(backend, args):
-    N = 150                        # problem scale ~ image edge length
+    N = args.scale                 # problem scale ~ image edge length
     XYZ  = N**3                    # number of columns
     pXYZ = int(8 * N**3 * 1.35**3) # number of rows (8 coils, 1.35 oversampling factor)
 
-    # make one nonzero per row along diagonal
-    indptrs = np.arange(pXYZ+1, dtype=np.int32)
-    indices = np.arange(pXYZ, dtype=np.int32) % XYZ
-    data    = np.ones(pXYZ, dtype=np.complex64)
+    # make `nnz` nonzeros per row, clustered around the diagonal
+    nnz = args.nnz
+    indptrs = np.arange(pXYZ+1, dtype=np.int32) * nnz
+    indices = (np.arange(pXYZ*nnz, dtype=np.int64) // nnz + \
+               np.tile(np.arange(nnz) * N, pXYZ)) % XYZ
+    indices = indices.astype(np.int32)
+    data    = np.ones(pXYZ*nnz, dtype=np.complex64)
 
     A = spp.csr_matrix((data,indices,indptrs), shape=(pXYZ,XYZ), dtype=np.complex64)
     x = rand64c( XYZ,args.batch)
@@ -93,8 +97,16 @@ def benchmark_csrmm(backend, args):
     frac = gbps / args.stream * 100
     nthreads = backend.get_max_threads()
     name = backend.__class__.__name__
-    print("csrmm %s, %d threads, %d nnz, batch %d, %2.0f GB, %2.2f GB/s, %2.0f%% STREAM" % \
-        (name, nthreads, len(A.data), args.batch, nbytes/1e9, gbps, frac), flush=True)
+    print("csrmm %s, %d threads, %d nnz, batch %d, %2.0f GB, %2.2f ms, %2.2f GB/s, %2.0f%% STREAM" % \
+        (name, nthreads, len(A.data), args.batch, nbytes/1e9, nsec*1000, gbps, frac), flush=True)
+
+
+def benchmark_csrmm_batches(backend, args):
+    """ Sweeps csrmm over batch sizes 1 through 64. """
+    batch = args.batch
+    for args.batch in (1, 2, 4, 8, 16, 32, 64):
+        benchmark_csrmm(backend, args)
+    args.batch = batch
 
 
 
@@ -112,69 +124,51 @@ def apf(x, y, z):
     fz = set(factors(z))
     return np.average(list(fx|fy|fz))
 
-def fft_search(args):
-
-    shape = (308,208,480)
-    minosf, maxosf = 1.25, 1.5
-
-    from indigo.backends.cuda import CudaBackend
-
-    best_flops = None
-    best_flops_s = None
-    best_flops_f = 0
-    best_sec = None
-    best_sec_s = 1e99
-    best_sec_f = 1e99
+def fft_search(backend, args):
+    """
+    Times 3D FFTs of every grid shape in the oversampling window of
+    `args.fft_shape`, best candidates by `apf` first, and records them in
+    the backend's FFT timing table at `indigo.fftshape.table_path`, the
+    file NUFFT consults when choosing its grid and UnscaledFFT when
+    choosing its batch size. Set INDIGO_FFT_TABLE to move the table for
+    both the search and the later runs that read it.
+    """
+    from indigo.fftshape import load_table, save_table, table_path, measure_fft, shape_key
+
+    shape = tuple(args.fft_shape)
+    minosf, maxosf = args.osf_min, args.osf_max
+    path = table_path(backend)
+    name = backend.__class__.__name__
 
     print("Generating shapes...", flush=True)
-    shapes = []
-    for     x in range(int(shape[0]*minosf), int(shape[0]*maxosf)):
-      for   y in range(int(shape[1]*minosf), int(shape[1]*maxosf)):
-        for z in range(int(shape[2]*minosf), int(shape[2]*maxosf)):
-            shapes.append( ((x,y,z), apf(x,y,z)) )
-
-    print("Sorting shapes...", flush=True)
-    shapes.sort(key=lambda xyzf: xyzf[-1])
-
-    # best known
-    shapes.insert(0, ((448,270,640),'?') )
-    shapes.insert(0, ((432,270,600),'?') )
-
-    print("Evaluating shapes...", flush=True)
-    for (x,y,z), fp in shapes:
-
-        backend = CudaBackend()
-        F = backend.UnscaledFFT( (z,y,x), dtype=np.dtype('complex64') )
-
-        u_d = backend.zero_array( (z*y*x, args.batch), dtype=F.dtype )
-        v_d = backend.zero_array( (z*y*x, args.batch), dtype=F.dtype )
-
-        # warmup
-        F.eval(v_d, u_d)
-
-        timer = Timer()
-        backend.barrier()
-        with timer:
-            for trial in range(args.trials):
-                F.eval(v_d, u_d)
-            backend.barrier()
-
-        nsec = timer.median / args.trials
-        nflops = args.batch * 5 * x*y*z * np.log2(x*y*z)
-
-        floprate = nflops/nsec
-        if floprate > best_flops_f:
-            best_flops_f = floprate
-            best_flops_s = nsec
-            best_flops = (x, y, z)
-
-        if nsec < best_sec_s:
-            best_sec_s = nsec
-            best_sec_f = floprate
-            best_sec = (x, y, z)
-        
-        print("fft,  %03d xx % 3d x % 3d x % 3d :  %2.2f GFlops/s, %2.0f ms\tbest_flops: %s %2.2f GF/s %2.2f ms\tbest_time: %s %2.2f ms %2.2f GF/s" % \
-            (args.batch, x, y, z, nflops/nsec/1e9, nsec*1000, best_flops, best_flops_f/1e9, best_flops_s*1000, best_sec, best_sec_s*1000, best_sec_f/1e9), flush=True)
+    sizes = []
+    for n in shape:
+        axis = [m for m in range(int(np.ceil(n*minosf)), int(n*maxosf)+1)
+                if max(factors(m)) <= args.max_prime]
+        sizes.append( axis or [int(np.ceil(n*minosf))] )
+    shapes = [ (xyz, apf(*xyz)) for xyz in itertools.product(*sizes) ]
+
+    print("Sorting %d shapes..." % len(shapes), flush=True)
+    shapes.sort(key=lambda xyzf: (xyzf[-1], np.prod(xyzf[0])))
+    shapes = shapes[:args.max_shapes]
+
+    table = load_table(backend, path)
+    best_sec, best_sec_s = None, 1e99
+    print("Evaluating %d shapes on %s, writing %s..." % (len(shapes), name, path), flush=True)
+    for xyz, fp in shapes:
+        entry = table.setdefault(shape_key(xyz), dict())
+        for batch in args.fft_batches or [args.batch]:
+            nsec = measure_fft(backend, xyz, batch=batch, trials=args.trials)
+            entry[str(batch)] = nsec
+
+            XYZ = np.prod(xyz)
+            nflops = batch * 5 * XYZ * np.log2(XYZ)
+            if nsec / batch < best_sec_s:
+                best_sec_s, best_sec = nsec / batch, xyz
+
+            print("fft,  %s, batch %03d, % 4d x % 4d x % 4d, apf %2.1f:  %2.2f GFlops/s, %2.0f ms\tbest: %s %2.2f ms per transform" % \
+                (name, batch, *xyz, fp, nflops/nsec/1e9, nsec*1000, best_sec, best_sec_s*1000), flush=True)
+        save_table(backend, table, path)
 
 def main():
     parser = argparse.ArgumentParser(description='benchmark indigo')
@@ -182,23 +176,33 @@ def main():
     parser.add_argument('--axpby', action='store_true')
     parser.add_argument('--fft',   action='store_true')
     parser.add_argument('--csrmm', action='store_true')
-    parser.add_argument('--fftsearch', action='store_true')
+    parser.add_argument('--csrmm-batches', action='store_true', help='sweep csrmm over batch sizes 1 through 64')
+    parser.add_argument('--fftsearch', action='store_true', help='time FFT grid shapes and record them in the tuning table')
+    parser.add_argument('--fft-shape', type=int, nargs=3, default=[308,208,480], help='fftsearch image shape')
+    parser.add_argument('--osf-min', type=float, default=1.25, help='fftsearch minimum oversampling')
+    parser.add_argument('--osf-max', type=float, default=1.5, help='fftsearch maximum oversampling')
+    parser.add_argument('--max-prime', type=int, default=7, help='fftsearch skips sizes with larger prime factors')
+    parser.add_argument('--max-shapes', type=int, default=100, help='fftsearch times at most this many shapes, lowest apf first')
+    parser.add_argument('--fft-batches', type=int, nargs='+', help='fftsearch batch sizes, default --batch')
     parser.add_argument('--batch', type=int, default=1)
     parser.add_argument('--trials', type=int, default=10)
     parser.add_argument('--stream', type=float, help='Memory bandwidth in GB/sec.')
+    parser.add_argument('--scale', type=int, default=150, help='csrmm problem scale (image edge length)')
+    parser.add_argument('--nnz', type=int, default=1, help='csrmm nonzeros per row')
+    parser.add_argument('--backend', action='append', choices=['mkl', 'customcpu', 'numpy', 'cuda', 'customgpu'],
+        help='backend(s) to benchmark, default mkl')
     args = parser.parse_args()
 
-    from indigo.backends.mkl import MklBackend
-
-    Backends = [MklBackend,]
+    from indigo.backends import get_backend
 
-    for Backend in Backends:
-        backend = Backend()
+    for name in args.backend or ['mkl']:
+        backend = get_backend(name)
         if args.axpby or args.all: benchmark_axpby(backend, args)
         if args.fft   or args.all: benchmark_fft  (backend, args)
         if args.csrmm or args.all: benchmark_csrmm(backend, args)
+        if args.csrmm_batches:     benchmark_csrmm_batches(backend, args)
 
-        if args.fftsearch: fft_search(args)
+        if args.fftsearch: fft_search(backend, args)
 
 
 if __name__ == '__main__':
@@ -56,7 +56,7 @@ c,     y,  x = imgs.shape
 
 # construct operator
 F1 = B.FFT((py,px), imgs.dtype, name='fft2d')
-F = B.KronI(z, F1, name='preffts')
+F = B.FFT((py,px,z), imgs.dtype, axes=(0,1), name='preffts')
 C = B.BlockDiag([
     B.VStack([
         B.Diag(codes[ic,iz].flatten(), name='code_z%02d_c%02d' % (iz,ic)) for ic in range(c)
@@ -70,13 +70,6 @@ A._name = 'phasespace'
 
 # optimize tree
 from indigo.transforms import *
-class CodesInDia(Transform):
-    def visit_SpMatrix(self, node):
-        if 'code' in node._name:
-            log.info("requesting %s be stored in DIA format.", node._name)
-            node._use_dia = True
-        return node
-
 recipe = [
 #    DistributeAdjointOverProd, DistributeKroniOverProd,
     LiftUnscaledFFTs,
@@ -84,7 +77,7 @@ recipe = [
     MakeRightLeaning,
     GroupRightLeaningProducts,
     RealizeMatrices,
-    CodesInDia,
+    SelectFormats,
 ]
 A = A.optimize(recipe)
 log.info("final tree:\n%s", A.dump())
@@ -23,6 +23,9 @@ parser.add_argument('--backend', type=str, default='numpy', choices=['mkl', 'num
 parser.add_argument('--debug', type=int, default=logging.INFO, help='logging level')
 parser.add_argument('--crop', help='crop data before recon: --crop "COIL:2,TIME:4')
 parser.add_argument('--lamda', type=float, default=0, help='tikhonov reg parameter')
+parser.add_argument('--osf', type=float, default=640/480, help='minimum grid oversampling factor')
+parser.add_argument('--osf-max', type=float, default=None, help='pick the fastest FFT grid up to this oversampling factor')
+parser.add_argument('--tune-fft', action='store_true', help='time candidate FFT grids (results are cached)')
 parser.add_argument('-O', '--recipe', type=int, default=3, choices=range(5), help='optimization level')
 parser.add_argument('data', nargs='?', default="scan.h5", help='kspace data in an HDF file')
 args = parser.parse_args()
@@ -84,19 +87,15 @@ slc[dim.READ] = slice(None)
 slc[dim.PHS1] = slice(None)
 slc[dim.PHS2] = slice(None)
 
-osf = (640/480, 640/480, 640/480) # uniform
-#osf = (640/480, 270/208, 432/308) # cpu
-#osf = (640/480, 288/208, 400/308) # knl
-#osf = (600/480, 270/208, 392/308) # gpu
-
-F1= B.NUFFT(ksp_nc_dims[:3], ksp_c_dims[:3], traj[slc], oversamp=osf, dtype=ksp.dtype)
+F1= B.NUFFT(ksp_nc_dims[:3], ksp_c_dims[:3], traj[slc], oversamp=args.osf,
+    osf_max=args.osf_max, tune=args.tune_fft, dtype=ksp.dtype)
 F = B.KronI(C, F1)
 S = B.VStack([B.Diag(mps[:,:,:,c:c+1]) for c in range(C)], name='maps')
 A = F * S; A._name = 'SENSE1'
 
 import scipy.sparse as spp
 
-from indigo.transforms import Transform, Visitor
+from indigo.transforms import Transform, Visitor, SelectFormats, SplitCenteredFFTs
 from indigo.operators import (
     Product, UnscaledFFT, SpMatrix, VStack, Eye, Kron
 )
@@ -108,15 +107,13 @@ class MriGoodAdjoints(Transform):
         else:
             return node
 
-class UseExwriteProperty(Transform):
-    def visit_SpMatrix(self, node):
-        node._allow_exwrite = True
-        return node
-
 class MriRealize(Transform):
     def visit_VStack(self, node):
         return node.realize()
 
+    def visit_SeparableDiag(self, node):
+        return node.realize()
+
     def visit_Product(self, node):
         l, r = node.children
         if isinstance(r, VStack) and isinstance(l, Kron):
@@ -179,6 +176,7 @@ class MakeLeftLeaning(Transform):
 recipe = []
 if args.recipe >= 1:
     recipe += [
+        SplitCenteredFFTs,
         MakeRightLeaning,
         AssocSpMatrices,
         DistKroniOverFFT,
@@ -188,7 +186,7 @@ if args.recipe >= 2:
 if args.recipe >= 3:
     recipe += [MriGoodAdjoints]
 if args.recipe >= 4:
-    recipe += [UseExwriteProperty]
+    recipe += [SelectFormats]
 
 A = A.optimize(recipe)
 
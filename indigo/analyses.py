@@ -3,7 +3,7 @@ import numpy as np
 import scipy.sparse as spp
 from contextlib import contextmanager
 
-from indigo.transforms import Visitor
+from indigo.transforms import Visitor, _implements
 
 log = logging.getLogger(__name__)
 
@@ -14,10 +14,12 @@ class Memusage(Visitor):
     """
     def measure(self, node, ncols=1):
         self._seen = set()
+        self._seen_patterns = set()
         self._current_mem  = [0]
         self._current_cols = [ncols]
         self._max_mem = 0
         self.visit(node)
+        self._max_mem = max( self._max_mem, sum(self._current_mem) )
         return self._max_mem
 
     @contextmanager
@@ -52,6 +54,8 @@ class Memusage(Visitor):
         with self._push_mem(nbytes):
             self.generic_visit(node)
 
+    visit_RealFFT = visit_UnscaledFFT
+
     def visit_DenseMatrix(self, node):
         if id(node) in self._seen:
             return
@@ -59,16 +63,71 @@ class Memusage(Visitor):
         nbytes = node._matrix.nbytes
         self._current_mem[0] += nbytes
 
+    def visit_Gridding(self, node):
+        if id(node) in self._seen:
+            return
+        self._seen.add(id(node))
+        self._current_mem[0] += node.nbytes
+
+    visit_SeparableDiag = visit_Gridding
+
+    def visit_CenteredFFT(self, node):
+        self.visit_Gridding(node)
+        self.visit_UnscaledFFT(node)
+
     def visit_SpMatrix(self, node):
         if id(node) in self._seen:
             return
         self._seen.add(id(node))
-        nrows = node.shape[0]
+        nrows, nidx, nnz = node.shape[0], node.nnz, node.nnz
+        if node._format == 'bsr':
+            r, c = node._blocksize
+            if node._nblocks is None:
+                M = node._matrix
+                if node._stack_height is not None:
+                    M = M.tocsr()[node._interleaved_rows()]
+                node._nblocks = M.tobsr(node._blocksize).indices.size
+            nidx = node._nblocks
+            nrows, nnz = nrows // r, nidx * r * c
+        elif node._format == 'dia':
+            ndiag = node._matrix.todia().offsets.size
+            nrows, nidx, nnz = -1, ndiag, ndiag * node.shape[1]
+        elif node._format == 'sel':
+            nrows, nidx, nnz = -1, node.shape[0], 0
         rowptr = (nrows+1) * np.dtype('int32').itemsize
-        colind =  node.nnz * np.dtype('int32').itemsize
-        data   =  node.nnz * node.dtype.itemsize
-        nbytes = data + rowptr + colind
+        colind =  nidx * np.dtype('int32').itemsize
+        data   =  nnz * node.dtype.itemsize
+        if node._format == 'csr16':
+            # per-row int32 base plus one uint16 delta per nonzero
+            csr_bytes = data + rowptr + colind
+            colind = node.shape[0] * np.dtype('int32').itemsize + nidx * np.dtype('uint16').itemsize
+            nbytes = data + rowptr + colind
+            log.info("matrix %s: column indices compressed %.2fx, %d fewer bytes "
+                "streamed per evaluation (%.0f%% of CSR)", node._name,
+                node.nnz * 4 / max(colind, 1), csr_bytes - nbytes, 100 * nbytes / csr_bytes)
+        elif node._format in ('csr', 'lut'):
+            if node._format == 'lut':
+                data = sum(a.nbytes for a in node._lut)
+            # matrices with identical patterns share device index arrays
+            key = node._sparsity_key()
+            if key in self._seen_patterns:
+                rowptr = colind = 0
+            self._seen_patterns.add(key)
+            nbytes = data + rowptr + colind
+        else:
+            nbytes = data + rowptr + colind
+        if node._stack_height is not None:
+            # permutation that unstacks the interleaved rows
+            if _implements(node._backend, 'cselmm'):
+                nbytes += node.shape[0] * np.dtype('int32').itemsize
+            else:
+                nbytes += (node.shape[0]+1) * 4 + node.shape[0] * (4 + node.dtype.itemsize)
         self._current_mem[0] += nbytes
+        if node._stack_height is not None:
+            # plus the interleaved result, in scratch
+            ncols = np.prod(self._current_cols)
+            with self._push_mem(node.shape[0] * ncols * node.dtype.itemsize):
+                self.generic_visit(node)
 
 
 class TreeHasOp(Visitor):
@@ -5,18 +5,393 @@
 #include <stdio.h>
 
 #include <omp.h>
+#include <immintrin.h>
 
 #define MIN(a,b) (((a)<(b))?(a):(b))
 #define MAX(a,b) (((a)>(b))?(a):(b))
 
-extern void mkl_ccsrmv (const char *transa , const int *m , const int *k , const complex float *alpha , const char *matdescra , const complex float *val , const int *indx , const int *pntrb , const int *pntre , const complex float *x , const complex float *beta , complex float *y );
+// --------------------------------------------------------------------------
+// Forward CSR kernels. Each processes rows [m0,m1) for all N right-hand
+// sides, NT columns at a time so that accumulators stay in registers. Callers
+// pass short row ranges so the rows' values and indices stay in L1 across
+// column tiles.
+//
+// The same kernels serve CSR with 16-bit column deltas, where the column of
+// nonzero i in row m is base[m] + delta[i]: base[m] is folded into the row's
+// pointer into B, leaving one 16-bit load per nonzero to decode. The *_impl
+// functions are always inlined with either `col` or `delta` NULL, so each
+// wrapper compiles to a loop for one index width.
+// --------------------------------------------------------------------------
+
+#define NT 4   // right-hand-side columns per tile
+#define PF 16  // prefetch distance, in nonzeros
+
+#define COL(i) (delta ? (unsigned int) delta[i] : col[i])
+
+typedef void (*csrmm_rows_t)(
+    unsigned int m0, unsigned int m1, unsigned int N, complex float alpha,
+    const complex float *val, const unsigned int *col,
+    const unsigned int *pntrb, const unsigned int *pntre,
+    const complex float *B, unsigned int ldb, complex float beta,
+    complex float *C, unsigned int ldc);
+
+typedef void (*csr16mm_rows_t)(
+    unsigned int m0, unsigned int m1, unsigned int N, complex float alpha,
+    const complex float *val, const unsigned int *base, const unsigned short *delta,
+    const unsigned int *pntrb, const unsigned int *pntre,
+    const complex float *B, unsigned int ldb, complex float beta,
+    complex float *C, unsigned int ldc);
+
+#define CSRMM_ROWS_WRAPPERS(isa, target) \
+    __attribute__((target)) static void \
+    csrmm_rows_##isa( \
+        unsigned int m0, unsigned int m1, unsigned int N, complex float alpha, \
+        const complex float *val, const unsigned int *col, \
+        const unsigned int *pntrb, const unsigned int *pntre, \
+        const complex float *B, unsigned int ldb, complex float beta, \
+        complex float *C, unsigned int ldc \
+    ) { \
+        csrmm_rows_##isa##_impl(m0, m1, N, alpha, val, col, NULL, NULL, \
+            pntrb, pntre, B, ldb, beta, C, ldc); \
+    } \
+    __attribute__((target)) static void \
+    csr16mm_rows_##isa( \
+        unsigned int m0, unsigned int m1, unsigned int N, complex float alpha, \
+        const complex float *val, const unsigned int *base, const unsigned short *delta, \
+        const unsigned int *pntrb, const unsigned int *pntre, \
+        const complex float *B, unsigned int ldb, complex float beta, \
+        complex float *C, unsigned int ldc \
+    ) { \
+        csrmm_rows_##isa##_impl(m0, m1, N, alpha, val, NULL, base, delta, \
+            pntrb, pntre, B, ldb, beta, C, ldc); \
+    }
+
+static inline void
+csrmm_store(complex float *c, unsigned int ldc, const complex float *acc,
+    unsigned int nt, complex float alpha, complex float beta)
+{
+    if (beta == 0.0f)
+        for (unsigned int n = 0; n < nt; n++)
+            c[n*ldc] = alpha * acc[n];
+    else
+        for (unsigned int n = 0; n < nt; n++)
+            c[n*ldc] = alpha * acc[n] + beta * c[n*ldc];
+}
+
+__attribute__((always_inline))
+static inline void
+csrmm_rows_generic_impl(
+    unsigned int m0, unsigned int m1, unsigned int N, complex float alpha,
+    const complex float *val, const unsigned int *col,
+    const unsigned int *base, const unsigned short *delta,
+    const unsigned int *pntrb, const unsigned int *pntre,
+    const complex float *B, unsigned int ldb, complex float beta,
+    complex float *C, unsigned int ldc
+) {
+    for (unsigned int n0 = 0; n0 < N; n0 += NT) {
+        unsigned int nt = MIN(NT, N-n0);
+        for (unsigned int m = m0; m < m1; m++) {
+            const complex float *Bt = &B[(size_t) n0*ldb + (delta ? base[m] : 0)];
+            complex float acc[NT] = {0};
+            for (unsigned int i = pntrb[m]; i < pntre[m]; i++) {
+                complex float v = val[i];
+                const complex float *b = &Bt[COL(i)];
+                for (unsigned int n = 0; n < nt; n++)
+                    acc[n] += v * b[(size_t) n*ldb];
+            }
+            csrmm_store(&C[m+(size_t)n0*ldc], ldc, acc, nt, alpha, beta);
+        }
+    }
+}
+
+CSRMM_ROWS_WRAPPERS(generic, )
+
+// Complex FMA on interleaved (re,im) lanes: re += vr*x and im += vi*swap(x),
+// finished with an add/sub so that lane pairs hold (vr*xr - vi*xi, vr*xi + vi*xr).
+
+__attribute__((target("avx2,fma")))
+static inline complex float
+hsum_avx2(__m256 re, __m256 im)
+{
+    __m256 s = _mm256_addsub_ps(re, im);
+    __m128 t = _mm_add_ps(_mm256_castps256_ps128(s), _mm256_extractf128_ps(s, 1));
+    t = _mm_add_ps(t, _mm_movehl_ps(t, t));
+    float f[4];
+    _mm_storeu_ps(f, t);
+    return f[0] + I * f[1];
+}
+
+// The SIMD row kernels are written for a compile-time tile width `nt` and
+// always inlined into a switch, so that the re/im accumulators are promoted
+// to registers instead of living in a stack array.
+
+__attribute__((target("avx2,fma"), always_inline))
+static inline void
+csrmm_row_avx2(unsigned int b, unsigned int e, const unsigned int nt,
+    const complex float *val, const unsigned int *col, const unsigned short *delta,
+    const complex float *Bt, unsigned int ldb, complex float *acc)
+{
+    __m256 re[NT], im[NT];
+    for (unsigned int n = 0; n < nt; n++)
+        re[n] = im[n] = _mm256_setzero_ps();
+
+    unsigned int i = b;
+    for (; i + 4 <= e; i += 4) {
+        __m256 v = _mm256_loadu_ps((const float*) &val[i]);
+        __m256 vr = _mm256_moveldup_ps(v),
+               vi = _mm256_movehdup_ps(v);
+        __m128i idx = delta ? _mm_cvtepu16_epi32(_mm_loadl_epi64((const __m128i*) &delta[i]))
+                            : _mm_loadu_si128((const __m128i*) &col[i]);
+        unsigned int kp = COL(MIN(i+PF, e-1));
+        for (unsigned int n = 0; n < nt; n++) {
+            const double *bn = (const double*) &Bt[(size_t) n*ldb];
+            _mm_prefetch((const char*) &bn[kp], _MM_HINT_T0);
+            __m256 x = _mm256_castpd_ps(_mm256_i32gather_pd(bn, idx, 8));
+            re[n] = _mm256_fmadd_ps(vr, x, re[n]);
+            im[n] = _mm256_fmadd_ps(vi, _mm256_permute_ps(x, 0xB1), im[n]);
+        }
+    }
+
+    for (unsigned int n = 0; n < nt; n++)
+        acc[n] = hsum_avx2(re[n], im[n]);
+    for (; i < e; i++) {
+        complex float v = val[i];
+        const complex float *x = &Bt[COL(i)];
+        for (unsigned int n = 0; n < nt; n++)
+            acc[n] += v * x[(size_t) n*ldb];
+    }
+}
+
+__attribute__((target("avx2,fma"), always_inline))
+static inline void
+csrmm_rows_avx2_impl(
+    unsigned int m0, unsigned int m1, unsigned int N, complex float alpha,
+    const complex float *val, const unsigned int *col,
+    const unsigned int *base, const unsigned short *delta,
+    const unsigned int *pntrb, const unsigned int *pntre,
+    const complex float *B, unsigned int ldb, complex float beta,
+    complex float *C, unsigned int ldc
+) {
+    for (unsigned int n0 = 0; n0 < N; n0 += NT) {
+        unsigned int nt = MIN(NT, N-n0);
+        for (unsigned int m = m0; m < m1; m++) {
+            const complex float *Bt = &B[(size_t) n0*ldb + (delta ? base[m] : 0)];
+            complex float acc[NT];
+            switch (nt) {
+            case 1: csrmm_row_avx2(pntrb[m], pntre[m], 1, val, col, delta, Bt, ldb, acc); break;
+            case 2: csrmm_row_avx2(pntrb[m], pntre[m], 2, val, col, delta, Bt, ldb, acc); break;
+            case 3: csrmm_row_avx2(pntrb[m], pntre[m], 3, val, col, delta, Bt, ldb, acc); break;
+            default: csrmm_row_avx2(pntrb[m], pntre[m], NT, val, col, delta, Bt, ldb, acc); break;
+            }
+            csrmm_store(&C[m+(size_t)n0*ldc], ldc, acc, nt, alpha, beta);
+        }
+    }
+}
+
+CSRMM_ROWS_WRAPPERS(avx2, target("avx2,fma"))
+
+__attribute__((target("avx512f,avx2,fma"), always_inline))
+static inline void
+csrmm_row_avx512(unsigned int b, unsigned int e, const unsigned int nt,
+    const complex float *val, const unsigned int *col, const unsigned short *delta,
+    const complex float *Bt, unsigned int ldb, complex float *acc)
+{
+    __m512 re[NT], im[NT];
+    for (unsigned int n = 0; n < nt; n++)
+        re[n] = im[n] = _mm512_setzero_ps();
+
+    unsigned int i = b;
+    for (; i + 8 <= e; i += 8) {
+        __m512 v = _mm512_loadu_ps((const float*) &val[i]);
+        __m512 vr = _mm512_moveldup_ps(v),
+               vi = _mm512_movehdup_ps(v);
+        __m256i idx = delta ? _mm256_cvtepu16_epi32(_mm_loadu_si128((const __m128i*) &delta[i]))
+                            : _mm256_loadu_si256((const __m256i*) &col[i]);
+        unsigned int kp = COL(MIN(i+PF, e-1));
+        for (unsigned int n = 0; n < nt; n++) {
+            const double *bn = (const double*) &Bt[(size_t) n*ldb];
+            _mm_prefetch((const char*) &bn[kp], _MM_HINT_T0);
+            __m512 x = _mm512_castpd_ps(_mm512_i32gather_pd(idx, bn, 8));
+            re[n] = _mm512_fmadd_ps(vr, x, re[n]);
+            im[n] = _mm512_fmadd_ps(vi, _mm512_permute_ps(x, 0xB1), im[n]);
+        }
+    }
+
+    const __m512 ones = _mm512_set1_ps(1.0f);
+    for (unsigned int n = 0; n < nt; n++) {
+        // fold the 512-bit (re,im) pair into 256 bits, then reduce as avx2
+        __m512 s = _mm512_fmaddsub_ps(re[n], ones, im[n]);
+        __m256 lo = _mm512_castps512_ps256(s),
+               hi = _mm256_castpd_ps(_mm512_extractf64x4_pd(_mm512_castps_pd(s), 1));
+        acc[n] = hsum_avx2(_mm256_add_ps(lo, hi), _mm256_setzero_ps());
+    }
+    for (; i < e; i++) {
+        complex float v = val[i];
+        const complex float *x = &Bt[COL(i)];
+        for (unsigned int n = 0; n < nt; n++)
+            acc[n] += v * x[(size_t) n*ldb];
+    }
+}
+
+__attribute__((target("avx512f,avx2,fma"), always_inline))
+static inline void
+csrmm_rows_avx512_impl(
+    unsigned int m0, unsigned int m1, unsigned int N, complex float alpha,
+    const complex float *val, const unsigned int *col,
+    const unsigned int *base, const unsigned short *delta,
+    const unsigned int *pntrb, const unsigned int *pntre,
+    const complex float *B, unsigned int ldb, complex float beta,
+    complex float *C, unsigned int ldc
+) {
+    for (unsigned int n0 = 0; n0 < N; n0 += NT) {
+        unsigned int nt = MIN(NT, N-n0);
+        for (unsigned int m = m0; m < m1; m++) {
+            const complex float *Bt = &B[(size_t) n0*ldb + (delta ? base[m] : 0)];
+            complex float acc[NT];
+            switch (nt) {
+            case 1: csrmm_row_avx512(pntrb[m], pntre[m], 1, val, col, delta, Bt, ldb, acc); break;
+            case 2: csrmm_row_avx512(pntrb[m], pntre[m], 2, val, col, delta, Bt, ldb, acc); break;
+            case 3: csrmm_row_avx512(pntrb[m], pntre[m], 3, val, col, delta, Bt, ldb, acc); break;
+            default: csrmm_row_avx512(pntrb[m], pntre[m], NT, val, col, delta, Bt, ldb, acc); break;
+            }
+            csrmm_store(&C[m+(size_t)n0*ldc], ldc, acc, nt, alpha, beta);
+        }
+    }
+}
+
+CSRMM_ROWS_WRAPPERS(avx512, target("avx512f,avx2,fma"))
+
+// --------------------------------------------------------------------------
+// BSR block rows. Blocks are R-by-C and row-major; each block and its column
+// index are read once per right-hand side, however tall the blocks are.
+// --------------------------------------------------------------------------
+
+typedef void (*bsrmm_rows_t)(
+    unsigned int mb0, unsigned int mb1, unsigned int N, unsigned int R, unsigned int C,
+    complex float alpha, const complex float *val, const unsigned int *col,
+    const unsigned int *pntrb, const unsigned int *pntre,
+    const complex float *B, unsigned int ldb, complex float beta,
+    complex float *Y, unsigned int ldy);
+
+static void
+bsrmm_rows_generic(
+    unsigned int mb0, unsigned int mb1, unsigned int N, unsigned int R, unsigned int C,
+    complex float alpha, const complex float *val, const unsigned int *col,
+    const unsigned int *pntrb, const unsigned int *pntre,
+    const complex float *B, unsigned int ldb, complex float beta,
+    complex float *Y, unsigned int ldy
+) {
+    complex float acc[R];
+    for (unsigned int mb = mb0; mb < mb1; mb++)
+        for (unsigned int n = 0; n < N; n++) {
+            const complex float *b = &B[(size_t) n*ldb];
+            for (unsigned int r = 0; r < R; r++)
+                acc[r] = 0.0f;
+            for (unsigned int i = pntrb[mb]; i < pntre[mb]; i++) {
+                const complex float *blk = &val[(size_t) i*R*C];
+                const complex float *x = &b[col[i]*C];
+                for (unsigned int r = 0; r < R; r++)
+                    for (unsigned int c = 0; c < C; c++)
+                        acc[r] += blk[r*C+c] * x[c];
+            }
+            csrmm_store(&Y[mb*R+(size_t)n*ldy], 1, acc, R, alpha, beta);
+        }
+}
+
+// Tall (4*nv)-by-1 blocks, as for interleaved coil stacks: the block is a
+// column of 4*nv values scaled by one broadcast entry of B.
+
+__attribute__((target("avx2,fma"), always_inline))
+static inline void
+bsr_tall_row_avx2(unsigned int b, unsigned int e, const unsigned int nv,
+    const complex float *val, const unsigned int *col, const complex float *x,
+    complex float *acc)
+{
+    __m256 re[4], im[4];
+    for (unsigned int v = 0; v < nv; v++)
+        re[v] = im[v] = _mm256_setzero_ps();
+    for (unsigned int i = b; i < e; i++) {
+        const float *xi = (const float*) &x[col[i]];
+        __m256 xr = _mm256_broadcast_ss(&xi[0]),
+               xj = _mm256_broadcast_ss(&xi[1]);
+        const float *blk = (const float*) &val[(size_t) i*nv*4];
+        for (unsigned int v = 0; v < nv; v++) {
+            __m256 a = _mm256_loadu_ps(&blk[8*v]);
+            re[v] = _mm256_fmadd_ps(a, xr, re[v]);
+            im[v] = _mm256_fmadd_ps(_mm256_permute_ps(a, 0xB1), xj, im[v]);
+        }
+    }
+    for (unsigned int v = 0; v < nv; v++)
+        _mm256_storeu_ps((float*) &acc[4*v], _mm256_addsub_ps(re[v], im[v]));
+}
+
+__attribute__((target("avx2,fma")))
+static void
+bsrmm_rows_avx2(
+    unsigned int mb0, unsigned int mb1, unsigned int N, unsigned int R, unsigned int C,
+    complex float alpha, const complex float *val, const unsigned int *col,
+    const unsigned int *pntrb, const unsigned int *pntre,
+    const complex float *B, unsigned int ldb, complex float beta,
+    complex float *Y, unsigned int ldy
+) {
+    if (C != 1 || R % 4 || R > 16) {
+        bsrmm_rows_generic(mb0, mb1, N, R, C, alpha, val, col, pntrb, pntre, B, ldb, beta, Y, ldy);
+        return;
+    }
+    complex float acc[16];
+    for (unsigned int mb = mb0; mb < mb1; mb++)
+        for (unsigned int n = 0; n < N; n++) {
+            const complex float *x = &B[(size_t) n*ldb];
+            switch (R / 4) {
+            case 1: bsr_tall_row_avx2(pntrb[mb], pntre[mb], 1, val, col, x, acc); break;
+            case 2: bsr_tall_row_avx2(pntrb[mb], pntre[mb], 2, val, col, x, acc); break;
+            case 3: bsr_tall_row_avx2(pntrb[mb], pntre[mb], 3, val, col, x, acc); break;
+            default: bsr_tall_row_avx2(pntrb[mb], pntre[mb], 4, val, col, x, acc); break;
+            }
+            csrmm_store(&Y[mb*R+(size_t)n*ldy], 1, acc, R, alpha, beta);
+        }
+}
+
+static csrmm_rows_t csrmm_rows = csrmm_rows_generic;
+static bsrmm_rows_t bsrmm_rows = bsrmm_rows_generic;
+static csr16mm_rows_t csr16mm_rows = csr16mm_rows_generic;
+static const char *simd_isa = "generic";
+
+static void
+select_kernels(void)
+{
+    // INDIGO_CUSTOMCPU_SIMD=generic|avx2 caps the instruction set, for benchmarking.
+    const char *cap = getenv("INDIGO_CUSTOMCPU_SIMD");
+    int allow512 = !cap || strcmp(cap, "avx512") == 0,
+        allow2   = !cap || allow512 || strcmp(cap, "avx2") == 0;
+
+    __builtin_cpu_init();
+    if (allow512 && __builtin_cpu_supports("avx512f")) {
+        csrmm_rows = csrmm_rows_avx512;
+        csr16mm_rows = csr16mm_rows_avx512;
+        bsrmm_rows = bsrmm_rows_avx2;
+        simd_isa = "avx512";
+    } else if (allow2 && __builtin_cpu_supports("avx2") && __builtin_cpu_supports("fma")) {
+        csrmm_rows = csrmm_rows_avx2;
+        csr16mm_rows = csr16mm_rows_avx2;
+        bsrmm_rows = bsrmm_rows_avx2;
+        simd_isa = "avx2";
+    }
+}
+
+#define ROW_BLOCK 64
 
 void custom_ccc_csrmm(
     unsigned int transA, unsigned int M, unsigned int N, unsigned int K, complex float alpha,
     complex float *val, unsigned int *col, unsigned int *pntrb, unsigned int *pntre,
     complex float *B, unsigned int ldb, complex float beta,
-    complex float *C, unsigned int ldc, int exwrite
-) { 
+    complex float *C, unsigned int ldc, int exwrite,
+    const unsigned int *part, unsigned int P
+) {
+    // Rows are split into P parts [part[p], part[p+1]) of roughly equal
+    // rows+nonzeros (see customcpu.merge_path_partition); a static schedule
+    // over parts hands each thread an equal share of the work even when row
+    // lengths are skewed.
     if (transA && exwrite) {
         #pragma omp parallel
         {
@@ -28,8 +403,9 @@ void custom_ccc_csrmm(
                 }
             }
 
-             #pragma omp for schedule(static)
-             for (unsigned int m = 0; m < M; m++) {
+            #pragma omp for schedule(static)
+            for (unsigned int p = 0; p < P; p++)
+            for (unsigned int m = part[p]; m < part[p+1]; m++) {
                 for (unsigned int i = pntrb[m]; i < pntre[m]; i++) {
                     unsigned int k = col[i];
                     complex float v = alpha * conjf(val[i]);
@@ -40,12 +416,6 @@ void custom_ccc_csrmm(
                 }
             }   
         }
-    } else if (N==1 && transA==0) {
-
-        char adj = (transA) ? 'C' : 'N';
-        char *matdescr = "G NC  ";
-        mkl_ccsrmv(&adj, (const int *) &M, (const int *) &K, &alpha, matdescr, val, (const int *) col, (const int *) pntrb, (const int *) pntre, B, &beta, C);
-
     } else if (transA) {
         #pragma omp parallel
         {
@@ -57,8 +427,9 @@ void custom_ccc_csrmm(
                 }
             }
 
-             #pragma omp for schedule(static)
-             for (unsigned int m = 0; m < M; m++) {
+            #pragma omp for schedule(static)
+            for (unsigned int p = 0; p < P; p++)
+            for (unsigned int m = part[p]; m < part[p+1]; m++) {
                 for (unsigned int i = pntrb[m]; i < pntre[m]; i++) {
                     unsigned int k = col[i];
                     complex float v = alpha * conjf(val[i]);
@@ -78,36 +449,348 @@ void custom_ccc_csrmm(
             }   
         }
     } else {
+        #pragma omp parallel for schedule(static)
+        for (unsigned int p = 0; p < P; p++)
+            for (unsigned int m = part[p]; m < part[p+1]; m += ROW_BLOCK)
+                csrmm_rows(m, MIN(m+ROW_BLOCK, part[p+1]), N, alpha, val, col, pntrb, pntre,
+                    B, ldb, beta, C, ldc);
+    }
+}
+
+
+// --------------------------------------------------------------------------
+// CSR with 16-bit column deltas; see the forward kernels above.
+// --------------------------------------------------------------------------
+
+void custom_ccc_csr16mm(
+    unsigned int transA, unsigned int M, unsigned int N, unsigned int K, complex float alpha,
+    complex float *val, unsigned int *base, unsigned short *delta,
+    unsigned int *pntrb, unsigned int *pntre,
+    complex float *B, unsigned int ldb, complex float beta,
+    complex float *C, unsigned int ldc, int exwrite,
+    const unsigned int *part, unsigned int P
+) {
+    if (transA) {
         #pragma omp parallel
         {
-            #define W 8
+            #pragma omp for schedule(static)
+            for (unsigned int k = 0; k < K; k++)
+                for (unsigned int n = 0; n < N; n++)
+                    C[k+(size_t)n*ldc] = beta == 0.0f ? 0.0f : beta * C[k+(size_t)n*ldc];
+
+            #pragma omp for schedule(static)
+            for (unsigned int p = 0; p < P; p++)
+            for (unsigned int m = part[p]; m < part[p+1]; m++) {
+                complex float *Ct = &C[base[m]];
+                for (unsigned int i = pntrb[m]; i < pntre[m]; i++) {
+                    complex float v = alpha * conjf(val[i]);
+                    for (unsigned int n = 0; n < N; n++) {
+                        complex float res = v * B[m+(size_t)n*ldb];
+                        if (exwrite) {
+                            Ct[delta[i]+(size_t)n*ldc] += res;
+                        } else {
+                            float *out = (float*) &Ct[delta[i]+(size_t)n*ldc];
+
+                            #pragma omp atomic
+                            out[0] += crealf(res);
+
+                            #pragma omp atomic
+                            out[1] += cimagf(res);
+                        }
+                    }
+                }
+            }
+        }
+    } else {
+        #pragma omp parallel for schedule(static)
+        for (unsigned int p = 0; p < P; p++)
+            for (unsigned int m = part[p]; m < part[p+1]; m += ROW_BLOCK)
+                csr16mm_rows(m, MIN(m+ROW_BLOCK, part[p+1]), N, alpha, val, base, delta,
+                    pntrb, pntre, B, ldb, beta, C, ldc);
+    }
+}
+
+
+// --------------------------------------------------------------------------
+// CSR with table-index values: the value of nonzero i is the product of
+// table[lut[i*D+a]] over D axes, reconstructed in registers so that one
+// byte per axis is streamed instead of a complex value.
+// --------------------------------------------------------------------------
+
+__attribute__((always_inline))
+static inline float
+lut_weight(const unsigned char *lut, const float *table, unsigned int D, size_t i)
+{
+    const unsigned char *t = &lut[i*D];
+    if (D == 3)
+        return table[t[0]] * table[t[1]] * table[t[2]];
+    float w = 1.0f;
+    for (unsigned int a = 0; a < D; a++)
+        w *= table[t[a]];
+    return w;
+}
+
+// One row for nt right-hand sides; inlined with constant nt so that the
+// accumulators stay in registers.
+__attribute__((always_inline))
+static inline void
+lutmm_row(unsigned int b, unsigned int e, const unsigned int nt, const unsigned int D,
+    const unsigned char *lut, const float *table, const unsigned int *col,
+    const complex float *B, unsigned int ldb, complex float *c, unsigned int ldc,
+    complex float alpha, complex float beta)
+{
+    complex float acc[NT] = {0.0f};
+    for (unsigned int i = b; i < e; i++) {
+        float w = lut_weight(lut, table, D, i);
+        const complex float *x = &B[col[i]];
+        for (unsigned int t = 0; t < nt; t++)
+            acc[t] += w * x[(size_t)t*ldb];
+    }
+    csrmm_store(c, ldc, acc, nt, alpha, beta);
+}
 
-            complex float acc[W*N];
+void custom_ccc_lutmm(
+    unsigned int transA, unsigned int M, unsigned int N, unsigned int K, unsigned int D,
+    complex float alpha, const unsigned char *lut, const float *table,
+    unsigned int *col, unsigned int *pntrb, unsigned int *pntre,
+    complex float *B, unsigned int ldb, complex float beta,
+    complex float *C, unsigned int ldc, int exwrite,
+    const unsigned int *part, unsigned int P
+) {
+    if (transA) {
+        #pragma omp parallel
+        {
+            #pragma omp for schedule(static)
+            for (unsigned int k = 0; k < K; k++)
+                for (unsigned int n = 0; n < N; n++)
+                    C[k+(size_t)n*ldc] = beta == 0.0f ? 0.0f : beta * C[k+(size_t)n*ldc];
 
             #pragma omp for schedule(static)
-            for (unsigned int m = 0; m < M; m += W) {
-
-                memset(acc, 0, W*N*sizeof(complex float));
-
-                for (int idx = 0; ; idx++) { // for every potential nonzero in row
-                    char alive = 0;
-                    for (int w = 0; w < W && m+w < M; w++) { // for every row in block
-                        unsigned int i = pntrb[m+w] + idx; // compute index into value array
-                        if (i < pntre[m+w]) { // if a nonzero exists in that row at that index
-                            alive = 1;
-                            unsigned int k = col[i];
-                            complex float v = val[i];
-                            for (unsigned int n = 0; n < N; n++)
-                                acc[w*N+n] += v * B[k+n*ldb];
+            for (unsigned int p = 0; p < P; p++)
+            for (unsigned int m = part[p]; m < part[p+1]; m++) {
+                for (unsigned int i = pntrb[m]; i < pntre[m]; i++) {
+                    float w = lut_weight(lut, table, D, i);
+                    for (unsigned int n = 0; n < N; n++) {
+                        complex float res = alpha * (w * B[m+(size_t)n*ldb]);
+                        if (exwrite) {
+                            C[col[i]+(size_t)n*ldc] += res;
+                        } else {
+                            float *out = (float*) &C[col[i]+(size_t)n*ldc];
+
+                            #pragma omp atomic
+                            out[0] += crealf(res);
+
+                            #pragma omp atomic
+                            out[1] += cimagf(res);
                         }
                     }
-                    if (!alive) // no more nonzeros. finished.
-                        break;
                 }
+            }
+        }
+    } else {
+        #pragma omp parallel for schedule(static)
+        for (unsigned int p = 0; p < P; p++)
+        for (unsigned int m = part[p]; m < part[p+1]; m++) {
+            for (unsigned int n0 = 0; n0 < N; n0 += NT) {
+                const complex float *Bt = &B[(size_t)n0*ldb];
+                complex float *c = &C[m+(size_t)n0*ldc];
+                unsigned int b = pntrb[m], e = pntre[m];
+                unsigned int nt = MIN(NT, N-n0);
+                if (D == 3 && nt == 1)
+                    lutmm_row(b, e, 1, 3, lut, table, col, Bt, ldb, c, ldc, alpha, beta);
+                else if (D == 3 && nt == NT)
+                    lutmm_row(b, e, NT, 3, lut, table, col, Bt, ldb, c, ldc, alpha, beta);
+                else switch (nt) {
+                    case 1:  lutmm_row(b, e, 1, D, lut, table, col, Bt, ldb, c, ldc, alpha, beta); break;
+                    case 2:  lutmm_row(b, e, 2, D, lut, table, col, Bt, ldb, c, ldc, alpha, beta); break;
+                    case 3:  lutmm_row(b, e, 3, D, lut, table, col, Bt, ldb, c, ldc, alpha, beta); break;
+                    default: lutmm_row(b, e, NT, D, lut, table, col, Bt, ldb, c, ldc, alpha, beta); break;
+                }
+            }
+        }
+    }
+}
+
 
+void custom_ccc_bsrmm(
+    unsigned int transA, unsigned int MB, unsigned int N, unsigned int KB,
+    unsigned int R, unsigned int C, complex float alpha,
+    complex float *val, unsigned int *col, unsigned int *pntrb, unsigned int *pntre,
+    complex float *B, unsigned int ldb, complex float beta,
+    complex float *Y, unsigned int ldy
+) {
+    // A is (MB*R)-by-(KB*C), stored as MB block rows of R-by-C row-major blocks
+    if (transA) {
+        #pragma omp parallel
+        {
+            #pragma omp for schedule(static)
+            for (unsigned int k = 0; k < KB*C; k++)
                 for (unsigned int n = 0; n < N; n++)
-                for (unsigned int w = 0; w < W && m+w < M; w++)
-                    C[(m+w)+n*ldc] = alpha * acc[w*N+n] + beta * C[(m+w)+n*ldc];
+                    Y[k+n*ldy] *= beta;
+
+            #pragma omp for schedule(static)
+            for (unsigned int mb = 0; mb < MB; mb++) {
+                for (unsigned int i = pntrb[mb]; i < pntre[mb]; i++) {
+                    complex float *blk = &val[(size_t) i*R*C];
+                    unsigned int k0 = col[i] * C;
+                    for (unsigned int n = 0; n < N; n++) {
+                        for (unsigned int c = 0; c < C; c++) {
+                            complex float acc = 0.0f;
+                            for (unsigned int r = 0; r < R; r++)
+                                acc += conjf(blk[r*C+c]) * B[mb*R+r+n*ldb];
+                            complex float res = alpha * acc;
+                            float *out = (float*) &Y[k0+c+n*ldy];
+
+                            #pragma omp atomic
+                            out[0] += crealf(res);
+
+                            #pragma omp atomic
+                            out[1] += cimagf(res);
+                        }
+                    }
+                }
+            }
+        }
+    } else {
+        #pragma omp parallel for schedule(static)
+        for (unsigned int mb = 0; mb < MB; mb += ROW_BLOCK)
+            bsrmm_rows(mb, MIN(mb+ROW_BLOCK, MB), N, R, C, alpha, val, col, pntrb, pntre,
+                B, ldb, beta, Y, ldy);
+    }
+}
+
+
+#define DIA_ROW_BLOCK 256
+
+void custom_ccc_diamm(
+    unsigned int transA, unsigned int M, unsigned int N, unsigned int K,
+    unsigned int ndiag, const int *offsets, const complex float *data, unsigned int L,
+    complex float alpha, const complex float *X, unsigned int ldx,
+    complex float beta, complex float *Y, unsigned int ldy
+) {
+    // A is M-by-K in scipy's layout: A[m,m+off[d]] = data[m+off[d] + d*L].
+    // Forward computes rows m of Y from X[m+off]; the adjoint computes rows k
+    // of Y from X[k-off], conjugating data on the fly. Rows are blocked so the
+    // block's diagonals stay in cache while they are applied to each column.
+    unsigned int rows = transA ? K : M,
+                 cols = transA ? M : K;
+
+    #pragma omp parallel for schedule(static)
+    for (unsigned int r0 = 0; r0 < rows; r0 += DIA_ROW_BLOCK) {
+        unsigned int r1 = MIN(r0 + DIA_ROW_BLOCK, rows);
+        complex float acc[DIA_ROW_BLOCK];
+        for (unsigned int n = 0; n < N; n++) {
+            const complex float *x = &X[(size_t) n*ldx];
+            complex float *y = &Y[(size_t) n*ldy];
+            for (unsigned int r = r0; r < r1; r++)
+                acc[r-r0] = 0.0f;
+
+            for (unsigned int d = 0; d < ndiag; d++) {
+                long off = transA ? -offsets[d] : offsets[d];
+                const complex float *diag = &data[(size_t) d*L];
+                // rows r with 0 <= r+off < cols, and data column (r+off or r) < L
+                long lo = MAX((long) r0, -off),
+                     hi = MIN((long) r1, (long) cols - off);
+                if (transA) {
+                    hi = MIN(hi, (long) L);
+                    for (long r = lo; r < hi; r++)
+                        acc[r-r0] += conjf(diag[r]) * x[r+off];
+                } else {
+                    hi = MIN(hi, (long) L - off);
+                    for (long r = lo; r < hi; r++)
+                        acc[r-r0] += diag[r+off] * x[r+off];
+                }
+            }
+
+            if (beta == 0.0f)
+                for (unsigned int r = r0; r < r1; r++)
+                    y[r] = alpha * acc[r-r0];
+            else
+                for (unsigned int r = r0; r < r1; r++)
+                    y[r] = alpha * acc[r-r0] + beta * y[r];
+        }
+    }
+}
+
+
+void custom_ccc_selmm(
+    unsigned int transA, unsigned int M, unsigned int N, unsigned int K,
+    const int *col, complex float alpha, const complex float *X, unsigned int ldx,
+    complex float beta, complex float *Y, unsigned int ldy
+) {
+    // A is M-by-K with A[m,col[m]] = 1, or an empty row where col[m] < 0.
+    // Columns are distinct, so the adjoint's scatter has no write conflicts.
+    if (transA) {
+        #pragma omp parallel
+        {
+            #pragma omp for schedule(static)
+            for (unsigned int k = 0; k < K; k++)
+                for (unsigned int n = 0; n < N; n++)
+                    Y[k+(size_t)n*ldy] = beta == 0.0f ? 0.0f : beta * Y[k+(size_t)n*ldy];
+
+            #pragma omp for schedule(static)
+            for (unsigned int m = 0; m < M; m++)
+                if (col[m] >= 0)
+                    for (unsigned int n = 0; n < N; n++)
+                        Y[col[m]+(size_t)n*ldy] += alpha * X[m+(size_t)n*ldx];
+        }
+    } else {
+        #pragma omp parallel for schedule(static)
+        for (unsigned int m = 0; m < M; m++) {
+            for (unsigned int n = 0; n < N; n++) {
+                complex float v = col[m] < 0 ? 0.0f : alpha * X[col[m]+(size_t)n*ldx];
+                Y[m+(size_t)n*ldy] = beta == 0.0f ? v : v + beta * Y[m+(size_t)n*ldy];
+            }
+        }
+    }
+}
+
+
+static inline void
+sepdiag_row(unsigned int n, unsigned int adjoint, const complex float *d, complex float c,
+    const complex float *x, complex float beta, complex float *y)
+{
+    if (beta == 0.0f) {
+        if (adjoint)
+            for (unsigned int i = 0; i < n; i++)
+                y[i] = c * conjf(d[i]) * x[i];
+        else
+            for (unsigned int i = 0; i < n; i++)
+                y[i] = c * d[i] * x[i];
+    } else {
+        if (adjoint)
+            for (unsigned int i = 0; i < n; i++)
+                y[i] = c * conjf(d[i]) * x[i] + beta * y[i];
+        else
+            for (unsigned int i = 0; i < n; i++)
+                y[i] = c * d[i] * x[i] + beta * y[i];
+    }
+}
+
+
+void custom_ccc_sepdiagmm(
+    unsigned int adjoint, unsigned int N0, unsigned int N1, unsigned int N2, unsigned int N,
+    unsigned int h0, unsigned int h1, unsigned int h2,
+    const complex float *d0, const complex float *d1, const complex float *d2,
+    complex float alpha, const complex float *X, unsigned int ldx,
+    complex float beta, complex float *Y, unsigned int ldy
+) {
+    // A = diag(d2 (x) d1 (x) d0): row i + N0*(j + N1*k) is scaled by
+    // d0[i] * d1[j] * d2[k], so only N0+N1+N2 values are ever read.
+    // With shifts h, that row reads element (i+h0, j+h1, k+h2) of X,
+    // modulo the axis lengths; X may only alias Y if all h are zero.
+    #pragma omp parallel for collapse(2) schedule(static)
+    for (unsigned int k = 0; k < N2; k++) {
+        for (unsigned int j = 0; j < N1; j++) {
+            complex float c = adjoint ? conjf(d1[j] * d2[k]) : d1[j] * d2[k];
+            c *= alpha;
+            size_t row = N0 * ((size_t) j + (size_t) N1 * k),
+                   src = N0 * ((size_t) ((j + h1) % N1) + (size_t) N1 * ((k + h2) % N2));
+            for (unsigned int n = 0; n < N; n++) {
+                const complex float *x = &X[src + (size_t) n * ldx];
+                complex float *y = &Y[row + (size_t) n * ldy];
+                sepdiag_row(N0 - h0, adjoint, d0, c, x + h0, beta, y);
+                sepdiag_row(h0, adjoint, d0 + N0 - h0, c, x, beta, y + N0 - h0);
             }
         }
     }
@@ -147,13 +830,15 @@ py_csrmm(PyObject *self, PyObject *args)
 {
     PyObject *py_alpha, *py_beta;
     unsigned int adjoint, ldx, ldy, M, N, K, exw;
-    PyArrayObject *py_Y, *py_colind, *py_rowptr, *py_vals, *py_X;
-    if (!PyArg_ParseTuple(args, "piiiOOOOOiOOip",
+    PyArrayObject *py_Y, *py_colind, *py_rowptr, *py_vals, *py_X, *py_part;
+    if (!PyArg_ParseTuple(args, "piiiOOOOOiOOipO",
         &adjoint, &M, &N, &K, &py_alpha,
         &py_vals, &py_colind, &py_rowptr,
-        &py_X, &ldx, &py_beta, &py_Y, &ldy, &exw))
+        &py_X, &ldx, &py_beta, &py_Y, &ldy, &exw, &py_part))
         return NULL;
 
+    unsigned int *part = PyArray_DATA(py_part),
+                    P  = PyArray_SIZE(py_part) - 1;
     unsigned int *rowPtrs = PyArray_DATA(py_rowptr);
     unsigned int *colInds = PyArray_DATA(py_colind);
     void *values = PyArray_DATA(py_vals),
@@ -169,13 +854,197 @@ py_csrmm(PyObject *self, PyObject *args)
 
     PyArray_Descr *descr = PyArray_DTYPE(py_vals);
     if ( PyDataType_ISCOMPLEX(descr) )
-        custom_ccc_csrmm(adjoint, M, N, K, alpha, values, colInds, &rowPtrs[0], &rowPtrs[1], X, ldx, beta, Y, ldy, exw);
+        custom_ccc_csrmm(adjoint, M, N, K, alpha, values, colInds, &rowPtrs[0], &rowPtrs[1], X, ldx, beta, Y, ldy, exw, part, P);
     else
         assert(0 && "float times complex not implemented");
 
     Py_RETURN_NONE;
 }
 
+static PyObject*
+py_csr16mm(PyObject *self, PyObject *args)
+{
+    PyObject *py_alpha, *py_beta;
+    unsigned int adjoint, ldx, ldy, M, N, K, exw;
+    PyArrayObject *py_Y, *py_base, *py_delta, *py_rowptr, *py_vals, *py_X, *py_part;
+    if (!PyArg_ParseTuple(args, "piiiOOOOOOiOOipO",
+        &adjoint, &M, &N, &K, &py_alpha,
+        &py_vals, &py_base, &py_delta, &py_rowptr,
+        &py_X, &ldx, &py_beta, &py_Y, &ldy, &exw, &py_part))
+        return NULL;
+
+    unsigned int *part = PyArray_DATA(py_part),
+                    P  = PyArray_SIZE(py_part) - 1;
+    unsigned int *rowPtrs = PyArray_DATA(py_rowptr),
+                 *rowBase = PyArray_DATA(py_base);
+    unsigned short *colDelta = PyArray_DATA(py_delta);
+    complex float *values = PyArray_DATA(py_vals),
+                       *Y = PyArray_DATA(py_Y),
+                       *X = PyArray_DATA(py_X);
+
+    float alpha_r = (float) PyComplex_RealAsDouble( py_alpha ),
+          alpha_i = (float) PyComplex_ImagAsDouble( py_alpha ),
+           beta_r = (float) PyComplex_RealAsDouble( py_beta  ),
+           beta_i = (float) PyComplex_ImagAsDouble( py_beta  );
+    complex float alpha = alpha_r + I * alpha_i,
+                   beta =  beta_r + I *  beta_i;
+
+    custom_ccc_csr16mm(adjoint, M, N, K, alpha, values, rowBase, colDelta,
+        &rowPtrs[0], &rowPtrs[1], X, ldx, beta, Y, ldy, exw, part, P);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+py_lutmm(PyObject *self, PyObject *args)
+{
+    PyObject *py_alpha, *py_beta;
+    unsigned int adjoint, ldx, ldy, M, N, K, D, exw;
+    PyArrayObject *py_Y, *py_lut, *py_table, *py_colind, *py_rowptr, *py_X, *py_part;
+    if (!PyArg_ParseTuple(args, "piiiiOOOOOOiOOipO",
+        &adjoint, &M, &N, &K, &D, &py_alpha,
+        &py_lut, &py_table, &py_colind, &py_rowptr,
+        &py_X, &ldx, &py_beta, &py_Y, &ldy, &exw, &py_part))
+        return NULL;
+
+    unsigned int *part = PyArray_DATA(py_part),
+                    P  = PyArray_SIZE(py_part) - 1;
+    unsigned int *rowPtrs = PyArray_DATA(py_rowptr),
+                 *colInds = PyArray_DATA(py_colind);
+    unsigned char *lut = PyArray_DATA(py_lut);
+    float *table = PyArray_DATA(py_table);
+    complex float *Y = PyArray_DATA(py_Y),
+                  *X = PyArray_DATA(py_X);
+
+    float alpha_r = (float) PyComplex_RealAsDouble( py_alpha ),
+          alpha_i = (float) PyComplex_ImagAsDouble( py_alpha ),
+           beta_r = (float) PyComplex_RealAsDouble( py_beta  ),
+           beta_i = (float) PyComplex_ImagAsDouble( py_beta  );
+    complex float alpha = alpha_r + I * alpha_i,
+                   beta =  beta_r + I *  beta_i;
+
+    custom_ccc_lutmm(adjoint, M, N, K, D, alpha, lut, table, colInds,
+        &rowPtrs[0], &rowPtrs[1], X, ldx, beta, Y, ldy, exw, part, P);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+py_bsrmm(PyObject *self, PyObject *args)
+{
+    PyObject *py_alpha, *py_beta;
+    unsigned int adjoint, ldx, ldy, MB, N, KB, R, C;
+    PyArrayObject *py_Y, *py_colind, *py_rowptr, *py_vals, *py_X;
+    if (!PyArg_ParseTuple(args, "piiiiiOOOOOiOOi",
+        &adjoint, &MB, &N, &KB, &R, &C, &py_alpha,
+        &py_vals, &py_colind, &py_rowptr,
+        &py_X, &ldx, &py_beta, &py_Y, &ldy))
+        return NULL;
+
+    unsigned int *rowPtrs = PyArray_DATA(py_rowptr);
+    unsigned int *colInds = PyArray_DATA(py_colind);
+    complex float *values = PyArray_DATA(py_vals),
+                       *Y = PyArray_DATA(py_Y),
+                       *X = PyArray_DATA(py_X);
+
+    float alpha_r = (float) PyComplex_RealAsDouble( py_alpha ),
+          alpha_i = (float) PyComplex_ImagAsDouble( py_alpha ),
+           beta_r = (float) PyComplex_RealAsDouble( py_beta  ),
+           beta_i = (float) PyComplex_ImagAsDouble( py_beta  );
+    complex float alpha = alpha_r + I * alpha_i,
+                   beta =  beta_r + I *  beta_i;
+
+    custom_ccc_bsrmm(adjoint, MB, N, KB, R, C, alpha, values, colInds,
+        &rowPtrs[0], &rowPtrs[1], X, ldx, beta, Y, ldy);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+py_diamm(PyObject *self, PyObject *args)
+{
+    PyObject *py_alpha, *py_beta;
+    unsigned int adjoint, ldx, ldy, M, N, K, ndiag, L;
+    PyArrayObject *py_Y, *py_offsets, *py_data, *py_X;
+    if (!PyArg_ParseTuple(args, "piiiiOOiOOiOOi",
+        &adjoint, &M, &N, &K, &ndiag, &py_offsets, &py_data, &L,
+        &py_alpha, &py_X, &ldx, &py_beta, &py_Y, &ldy))
+        return NULL;
+
+    int *offsets = PyArray_DATA(py_offsets);
+    complex float *data = PyArray_DATA(py_data),
+                     *Y = PyArray_DATA(py_Y),
+                     *X = PyArray_DATA(py_X);
+
+    float alpha_r = (float) PyComplex_RealAsDouble( py_alpha ),
+          alpha_i = (float) PyComplex_ImagAsDouble( py_alpha ),
+           beta_r = (float) PyComplex_RealAsDouble( py_beta  ),
+           beta_i = (float) PyComplex_ImagAsDouble( py_beta  );
+    complex float alpha = alpha_r + I * alpha_i,
+                   beta =  beta_r + I *  beta_i;
+
+    custom_ccc_diamm(adjoint, M, N, K, ndiag, offsets, data, L,
+        alpha, X, ldx, beta, Y, ldy);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+py_selmm(PyObject *self, PyObject *args)
+{
+    PyObject *py_alpha, *py_beta;
+    unsigned int adjoint, ldx, ldy, M, N, K;
+    PyArrayObject *py_Y, *py_colind, *py_X;
+    if (!PyArg_ParseTuple(args, "piiiOOOiOOi",
+        &adjoint, &M, &N, &K, &py_colind,
+        &py_alpha, &py_X, &ldx, &py_beta, &py_Y, &ldy))
+        return NULL;
+
+    int *colInds = PyArray_DATA(py_colind);
+    complex float *Y = PyArray_DATA(py_Y),
+                  *X = PyArray_DATA(py_X);
+
+    float alpha_r = (float) PyComplex_RealAsDouble( py_alpha ),
+          alpha_i = (float) PyComplex_ImagAsDouble( py_alpha ),
+           beta_r = (float) PyComplex_RealAsDouble( py_beta  ),
+           beta_i = (float) PyComplex_ImagAsDouble( py_beta  );
+    complex float alpha = alpha_r + I * alpha_i,
+                   beta =  beta_r + I *  beta_i;
+
+    custom_ccc_selmm(adjoint, M, N, K, colInds, alpha, X, ldx, beta, Y, ldy);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject*
+py_sepdiagmm(PyObject *self, PyObject *args)
+{
+    PyObject *py_alpha, *py_beta;
+    unsigned int adjoint, ldx, ldy, N0, N1, N2, N, h0, h1, h2;
+    PyArrayObject *py_Y, *py_d0, *py_d1, *py_d2, *py_X;
+    if (!PyArg_ParseTuple(args, "piiiiiiiOOOOOiOOi",
+        &adjoint, &N0, &N1, &N2, &N, &h0, &h1, &h2, &py_d0, &py_d1, &py_d2,
+        &py_alpha, &py_X, &ldx, &py_beta, &py_Y, &ldy))
+        return NULL;
+
+    complex float *d0 = PyArray_DATA(py_d0),
+                  *d1 = PyArray_DATA(py_d1),
+                  *d2 = PyArray_DATA(py_d2),
+                   *Y = PyArray_DATA(py_Y),
+                   *X = PyArray_DATA(py_X);
+
+    float alpha_r = (float) PyComplex_RealAsDouble( py_alpha ),
+          alpha_i = (float) PyComplex_ImagAsDouble( py_alpha ),
+           beta_r = (float) PyComplex_RealAsDouble( py_beta  ),
+           beta_i = (float) PyComplex_ImagAsDouble( py_beta  );
+    complex float alpha = alpha_r + I * alpha_i,
+                   beta =  beta_r + I *  beta_i;
+
+    custom_ccc_sepdiagmm(adjoint, N0, N1, N2, N, h0, h1, h2, d0, d1, d2, alpha, X, ldx, beta, Y, ldy);
+
+    Py_RETURN_NONE;
+}
+
 static PyObject*
 py_inspect(PyObject *self, PyObject *args)
 {
@@ -259,11 +1128,24 @@ py_max(PyObject *self, PyObject *args)
     Py_RETURN_NONE;
 }
 
+static PyObject*
+py_simd(PyObject *self, PyObject *args)
+{
+    return Py_BuildValue("s", simd_isa);
+}
+
 static PyMethodDef _customcpuMethods[] = {
     { "onemm", py_onemm, METH_VARARGS, NULL },
     { "csrmm", py_csrmm, METH_VARARGS, NULL },
+    { "csr16mm", py_csr16mm, METH_VARARGS, NULL },
+    { "lutmm", py_lutmm, METH_VARARGS, NULL },
+    { "bsrmm", py_bsrmm, METH_VARARGS, NULL },
+    { "diamm", py_diamm, METH_VARARGS, NULL },
+    { "selmm", py_selmm, METH_VARARGS, NULL },
+    { "sepdiagmm", py_sepdiagmm, METH_VARARGS, NULL },
     { "max", py_max, METH_VARARGS, NULL },
     { "inspect", py_inspect, METH_VARARGS, NULL },
+    { "simd", py_simd, METH_NOARGS, NULL },
     {NULL, NULL, 0, NULL} /* Sentinel */
 };
 
@@ -275,5 +1157,6 @@ PyMODINIT_FUNC
 PyInit__customcpu(void)
 {
     import_array();
+    select_kernels();
     return PyModule_Create(&_customcpu);
 }
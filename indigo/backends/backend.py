@@ -1,11 +1,13 @@
 import logging
 import abc, time
+import functools
+import weakref
 import numpy as np
 import scipy.sparse as spp
 from contextlib import contextmanager
 
 import indigo.operators as op
-from indigo.util import profile
+from indigo.util import profile, sparsity_key
 
 log = logging.getLogger(__name__)
 
@@ -18,6 +20,7 @@ class Backend(object):
 
     def __init__(self, device_id=0):
         profile._backend = self
+        self._patterns = weakref.WeakValueDictionary()
 
     class dndarray(object):
         """
@@ -260,13 +263,19 @@ class Backend(object):
         return nbytes
 
     @contextmanager
-    def scratch(self, shape=None, nbytes=None):
+    def scratch(self, shape=None, nbytes=None, dtype=np.dtype('complex64')):
         assert not (shape is not None and nbytes is not None), \
             "Specify either shape or nbytes to backend.scratch()."
         if nbytes is not None:
             shape = (nbytes//np.dtype('complex64').itemsize,)
         size = np.prod(shape)
-        if hasattr(self, '_scratch'):
+        if np.dtype(dtype).kind != 'c':
+            # the reserved scratch space is complex-typed
+            log.debug("dynamically allocating %s scratch space in shape %s", np.dtype(dtype), shape)
+            mem = self.zero_array(shape, dtype=dtype)
+            yield mem
+            del mem
+        elif hasattr(self, '_scratch'):
             pos = self._scratch_pos
             total = self._scratch.size
             assert pos + size <= total, "Not enough scratch memory (wanted %d MB, but only have %d MB available of %d MB total)." % (size/1e6, (total-pos)/1e6, total/1e6)
@@ -289,6 +298,10 @@ class Backend(object):
         assert isinstance(M, spp.spmatrix)
         return op.SpMatrix(self, M, **kwargs)
 
+    def Permutation(self, perm, dtype=np.dtype('complex64'), **kwargs):
+        """ A := the permutation matrix with A[perm[i], i] = 1, never folded into a neighbour """
+        return op.Permutation(self, perm, dtype=dtype, **kwargs)
+
     def DenseMatrix(self, M, **kwargs):
         """ A := M """
         assert isinstance(M, np.ndarray)
@@ -300,10 +313,21 @@ class Backend(object):
         v = np.require(v, requirements='F')
         if v.ndim > 1:
             v = v.flatten(order='A')
-        dtype = kwargs.get('dtype', np.dtype('complex64'))
+        dtype = kwargs.pop('dtype', np.dtype('complex64'))
         M = spp.diags( v, offsets=0 ).astype(dtype)
         return self.SpMatrix(M, **kwargs)
 
+    def SeparableDiag(self, factors, dtype=np.dtype('complex64'), **kwargs):
+        """
+        A := diag(f_{d-1} (KRON) ... (KRON) f_0) for one vector f_i per grid
+        axis, axis 0 varying fastest. Stored as the vectors alone on backends
+        that implement `csepdiagmm`, as a Diag otherwise.
+        """
+        if getattr(self.csepdiagmm, '__isabstractmethod__', False):
+            v = functools.reduce(lambda d, f: np.kron(f, d), factors[1:], np.ravel(factors[0]))
+            return self.Diag(v, dtype=dtype, **kwargs)
+        return op.SeparableDiag(self, factors, dtype=dtype, **kwargs)
+
     def Adjoint(self, A, **kwargs):
         """ C := A^H """
         return op.Adjoint(self, A, **kwargs)
@@ -330,6 +354,10 @@ class Backend(object):
         """ A := FFT{ . } """
         return op.UnscaledFFT(self, shape, dtype, **kwargs)
 
+    def RealFFT(self, shape, dtype=np.dtype('complex64'), **kwargs):
+        """ A := RFFT{ . }, real to half-spectrum complex """
+        return op.RealFFT(self, shape, dtype=dtype, **kwargs)
+
     def Eye(self, n, dtype=np.dtype('complex64'), **kwargs):
         """ A := I_n """
         return op.Eye(self, n, dtype=dtype, **kwargs)
@@ -346,22 +374,20 @@ class Backend(object):
 
     def FFT(self, shape, dtype, **kwargs):
         """ Unitary FFT """
-        n = np.prod(shape)
-        s = np.ones(n, order='F', dtype=dtype) / np.sqrt(n)
-        S = self.Diag(s, name='scale')
         F = self.UnscaledFFT(shape, dtype, **kwargs)
+        s = np.ones(np.prod(shape), order='F', dtype=dtype) / np.sqrt(F.ft_size)
+        S = self.Diag(s, name='scale')
         return S*F
 
     def FFTc(self, ft_shape, dtype, normalize=True, **kwargs):
-        """ Centered, Unitary FFT """
-        mod_slice = [ slice(d) for d in ft_shape ]
-        idx = np.mgrid[mod_slice]
-        mod = 0
-        for i in range(len(ft_shape)):
-            c = ft_shape[i] // 2
-            mod += (idx[i] - c / 2.0) * (c / ft_shape[i])
-        mod = np.exp(1j * 2.0 * np.pi * mod).astype(dtype)
-        M = self.Diag(mod, name='mod')
+        """
+        Centered, Unitary FFT. A single CenteredFFT on backends that
+        implement `csepdiagmm`, M*F*M otherwise.
+        """
+        if not getattr(self.csepdiagmm, '__isabstractmethod__', False):
+            return op.CenteredFFT(self, ft_shape, normalize=normalize, dtype=dtype, **kwargs)
+        mod = op.CenteredFFT.modulation(ft_shape, kwargs.get('axes'))
+        M = self.SeparableDiag(mod, dtype=dtype, name='mod')
         if normalize:
             F = self.FFT(ft_shape, dtype=dtype, **kwargs)
         else:
@@ -379,7 +405,7 @@ class Backend(object):
                 slc.append(slice(n))
             pass
         x = np.arange( np.prod(M), dtype=int ).reshape(M, order='F')
-        rows = x[slc].flatten(order='F')
+        rows = x[tuple(slc)].flatten(order='F')
         cols = np.arange(rows.size)
         ones = np.ones_like(cols)
         shape = np.prod(M), np.prod(N)
@@ -389,18 +415,71 @@ class Backend(object):
     def Crop(self, M, N, dtype=np.dtype('complex64'), **kwargs):
         return self.Zpad(N, M, dtype=dtype, **kwargs).H
 
-    def Interp(self, N, coord, width, table, dtype=np.dtype('complex64'), **kwargs):
-        assert len(N) == 3
+    def Interp(self, N, coord, width, table, dtype=np.dtype('complex64'), quantize=False, max_bytes=None, **kwargs):
+        """
+        Interpolation from a grid of shape N onto the points `coord`, in
+        1, 2 or 3 dimensions. With `quantize` (3D only), kernel distances are
+        rounded to 256 levels per axis so the matrix can be stored as table
+        indices (see `lut_matrix`) on backends that implement `clutmm`. The
+        matrix is built directly in `dtype`, a block of points at a time.
+        `max_bytes` bounds the memory allocated while building the host
+        matrix and later uploading it in that default storage: MemoryError
+        is raised up front if the matrix, its scratch and its device copy
+        cannot fit.
+        """
         ndim  = coord.shape[0]
+        assert len(N) == ndim and 1 <= ndim <= 3
         npts = np.prod( coord.shape[1:] )
-        coord = coord.reshape((ndim,-1), order='F')
-
-        from indigo.interp import interp_mat
-        M = interp_mat(npts, N, width, table, coord, 1).astype(dtype)
+        reshaped = coord.reshape((ndim,-1), order='F')
+        copied = 0 if np.shares_memory(reshaped, coord) else reshaped.nbytes
+        coord = reshaped
+
+        from indigo.interp import interp_layout, interp_mat, interp_lut
+        use_lut = quantize and not getattr(self.clutmm, '__isabstractmethod__', False)
+        if max_bytes is not None:
+            nnz, idx_dtype = interp_layout(npts, N, width, coord, merge=not quantize)
+            host = nnz * (idx_dtype.itemsize + np.dtype(dtype).itemsize + 3*quantize) + (npts + 1) * idx_dtype.itemsize
+            if quantize and not use_lut and min(N) < 2 * width + 1:
+                host *= 2 # merging wrapped taps may copy the arrays
+            if np.dtype(dtype) != np.complex64:
+                host += nnz * 8 # SpMatrix converts the values
+            upload = (self.lut_matrix if use_lut else self.csr_matrix).upload_nbytes((npts, np.prod(N)), nnz, idx_dtype)
+            if copied + host + upload > max_bytes:
+                raise MemoryError("interpolation matrix with %d nonzeros needs %d bytes "
+                    "and %d more to upload, more than the limit of %d" % (nnz, host, upload, max_bytes - copied))
+            max_bytes -= copied
+
+        if quantize:
+            M, lut, levels = interp_lut(npts, N, width, table, coord, dtype=dtype, max_bytes=max_bytes)
+            if not use_lut:
+                M.sum_duplicates()
+                return self.SpMatrix(M, **kwargs)
+            S = self.SpMatrix(M, **kwargs)
+            S._lut, S._format = (lut, levels), 'lut'
+            return S
+
+        M = interp_mat(npts, N, width, table, coord, 1, dtype=dtype, max_bytes=max_bytes)
 
         return self.SpMatrix(M, **kwargs)
 
-    def NUFFT(self, M, N, coord, width=3, n=128, oversamp=None, dtype=np.dtype('complex64'), **kwargs):
+    def Gridding(self, N, coord, width, table, dtype=np.dtype('complex64'), **kwargs):
+        """ Matrix-free Interp: kernel weights are computed on the fly. """
+        assert len(N) == 3
+        return op.Gridding(self, N, coord, width, table, dtype=dtype, **kwargs)
+
+    def NUFFT(self, M, N, coord, width=3, n=128, oversamp=None, osf_max=None, tune=False, dtype=np.dtype('complex64'), matrix_free=False, reorder=False, **kwargs):
+        """
+        Non-uniform FFT from an image of shape N onto the points `coord`.
+        The oversampled grid is N*oversamp, or with `osf_max` the size
+        between N*oversamp and N*osf_max that `indigo.fftshape.fft_shape`
+        expects to transform fastest; `tune` times candidate grids on this
+        backend first and caches the results on disk.
+        With `matrix_free`, interpolation uses `Gridding` instead of an
+        interpolation matrix. With `reorder`, interpolation visits the points
+        in Morton order over the oversampled grid for better locality, and a
+        `Permutation`, which realization keeps separate, restores the
+        caller's ordering.
+        """
         assert len(M) == 3
         assert len(N) == 3
         assert M[1:] == coord.shape[1:]
@@ -413,35 +492,69 @@ class Backend(object):
         #   432 x 270 x 640   mkl-batch: 168.62 ms  231.57 gflop/s  back-to-back: 118.31 ms  330.05 gflop/s
         #   1.40  1.30  1.33
 
-        if isinstance(oversamp, tuple):
-            omin = min(oversamp)
-        else:
-            omin = oversamp
-            oversamp = (omin, omin, omin)
+        if not isinstance(oversamp, tuple):
+            oversamp = (oversamp, oversamp, oversamp)
 
         import scipy.signal as signal
-        from indigo.noncart import rolloff3
+        from indigo.noncart import rolloff
         ndim  = coord.shape[0]
         npts  = np.prod( coord.shape[1:] )
 
-        oN = list(N)
-        for i in range(3):
-            oN[i] *= oversamp[i]
-        oN = tuple(int(on) for on in oN)
+        if osf_max is None:
+            oN = list(N)
+            for i in range(3):
+                oN[i] *= oversamp[i]
+            oN = tuple(int(on) for on in oN)
+        else:
+            from indigo.fftshape import fft_shape
+            oN = fft_shape(self, N, oversamp, osf_max, measure=tune)
+        # the grid may oversample each axis differently from `oversamp`
+        osf = [on / n for on, n in zip(oN, N)]
+        log.info("NUFFT: %s image on a %s grid, oversampling %s", tuple(N), oN,
+            ', '.join('%.3f' % o for o in osf))
 
         Z = self.Zpad(oN, N, dtype=dtype, name='zpad')
         F = self.FFTc(oN, dtype=dtype, name='fft')
 
+        # one kernel table serves all axes, so size it for the coarsest one
+        omin = min(osf)
         beta = np.pi * np.sqrt(((width * 2. / omin) * (omin- 0.5)) ** 2 - 0.8)
         kb = signal.kaiser(2 * n + 1, beta)[n:]
-        G = self.Interp(oN, coord, width, kb, dtype=np.float32, name='interp')
+        if reorder:
+            from indigo.interp import morton_order
+            coord = coord.reshape((ndim,-1), order='F')
+            order = morton_order(oN, coord)
+            coord = coord[:,order]
+        if matrix_free:
+            G = self.Gridding(oN, coord, width, kb, dtype=dtype, name='interp')
+        else:
+            G = self.Interp(oN, coord, width, kb, dtype=dtype, name='interp')
+        if reorder:
+            G = self.Permutation(order, dtype=dtype, name='reorder') * G
 
-        r = rolloff3(omin, width, beta, N)
-        R = self.Diag(r, name='apod')
+        r = rolloff(osf, width, beta, N)
+        R = self.SeparableDiag(r, dtype=dtype, name='apod')
 
         return G*F*Z*R
 
-    def Convolution(self, kernel, normalize=True, name='noname'):
+    def Convolution(self, kernel, normalize=True, real=False, name='noname'):
+        """
+        Circular convolution with `kernel`, centered on the middle of its
+        grid. With `real`, the kernel must be real-valued and the operator
+        maps real vectors to real vectors through RealFFTs, about halving
+        the FFT work and storage.
+        """
+        if real:
+            assert np.isrealobj(kernel) or not np.any(kernel.imag), "real Convolution expected a real kernel"
+            R = self.RealFFT(kernel.shape, name='%s.convF' % name)
+            axes = tuple(range(kernel.ndim))
+            centered = np.roll(np.real(kernel), [-(n // 2) for n in kernel.shape], axis=axes)
+            k = np.fft.rfftn(centered, axes=axes[::-1])
+            # R.H halves the coefficients off the axis-0 edges; undo that
+            k[1:(kernel.shape[0]+1)//2] *= 2
+            k /= kernel.size**1.5 if normalize else 1
+            K = self.Diag(k, name='%s.convK' % name)
+            return R.H * K * R
         F = self.FFTc(kernel.shape, name='%s.convF' % name, normalize=normalize, dtype=np.complex64)
         K = self.Diag(F * kernel, name='%s.convK' % name)
         I = self.Eye(F.shape[0])
@@ -495,22 +608,69 @@ class Backend(object):
     # -----------------------------------------------------------------------
 
     @abc.abstractmethod
-    def fftn(self, y, x):
+    def fftn(self, y, x, alpha=1, beta=0, axes=None):
+        """
+        Peform an unscaled multidimensional forward FFT on x:
+        y = alpha * FFT(x) + beta * y, along `axes` of x, all but the
+        last (batch) axis by default.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def ifftn(self, y, x, alpha=1, beta=0, axes=None):
         """
-        Peform an unscaled multidimensional forward FFT on x.
+        Peform an unscaled multidimensional inverse FFT on x:
+        y = alpha * IFFT(x) + beta * y, along `axes` of x, all but the
+        last (batch) axis by default.
         """
         raise NotImplementedError()
 
     @abc.abstractmethod
-    def ifftn(self, y, x):
+    def rfftn(self, y, x, alpha=1, beta=0):
         """
-        Peform an unscaled multidimensional inverse FFT on x.
+        Peform an unscaled multidimensional forward FFT on real x, keeping
+        the n0//2+1 nonredundant coefficients along axis 0:
+        y = alpha * RFFT(x) + beta * y.
         """
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def irfftn(self, y, x, alpha=1, beta=0):
+        """
+        Peform an unscaled multidimensional inverse FFT on the half
+        spectrum x, producing real y of the shape given by y:
+        y = alpha * IRFFT(x) + beta * y.
+        """
+        raise NotImplementedError()
+
+    def _fft_accumulate(self, transform, y, x, alpha=1, beta=0):
+        """
+        y = alpha * transform(x) + beta * y for a `transform(y, x, alpha)`
+        that can only overwrite its output.
+        """
+        if beta == 0:
+            return transform(y, x, alpha)
+        with self.scratch(shape=y.shape, dtype=y.dtype) as tmp:
+            transform(tmp, x, alpha)
+            self.axpby(beta, y, 1, tmp)
+
     def _fft_workspace_size(self, x_shape):
         return 0
 
+    # sparse storage formats and the kernels that multiply them
+    _format_kernels = dict(csr='ccsrmm', csr16='ccsr16mm', lut='clutmm',
+        dia='cdiamm', bsr='cbsrmm', sel='cselmm')
+
+    def native_formats(self):
+        """
+        Sparse storage formats this backend has a kernel of its own for, by
+        default all those whose kernel it implements. Backends leave out
+        formats whose kernel is only a fallback, so that `SelectFormats`
+        never chooses them; they still work when set explicitly.
+        """
+        return { fmt for fmt, kernel in self._format_kernels.items()
+                 if not getattr(getattr(self, kernel), '__isabstractmethod__', False) }
+
     @abc.abstractmethod
     def ccsrmm(self, y, A_shape, A_indx, A_ptr, A_vals, x, alpha=1, beta=0, adjoint=False, exwrite=False):
         """
@@ -518,6 +678,22 @@ class Backend(object):
         """
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def ccsr16mm(self, y, A_shape, A_base, A_delta, A_ptr, A_vals, x, alpha=1, beta=0, adjoint=False, exwrite=False):
+        """
+        Computes Y[:] = A * X for a CSR matrix whose column indices are
+        stored as per-row bases plus 16-bit deltas.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def clutmm(self, y, A_shape, A_indx, A_ptr, A_lut, A_table, x, alpha=1, beta=0, adjoint=False, exwrite=False):
+        """
+        Computes Y[:] = A * X for a CSR matrix whose nonzero i has the value
+        prod_a A_table[A_lut[i*d+a]] for d = A_lut.size // nnz axes.
+        """
+        raise NotImplementedError()
+
     @abc.abstractmethod
     def cdiamm(self, y, shape, offsets, data, x, alpha=1.0, beta=0.0, adjoint=True):
         """
@@ -525,6 +701,40 @@ class Backend(object):
         """
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def cbsrmm(self, y, A_shape, A_blocksize, A_indx, A_ptr, A_vals, x, alpha=1, beta=0, adjoint=False):
+        """
+        Computes Y[:] = A * X for a block-sparse A.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def cselmm(self, y, A_shape, A_indx, x, alpha=1, beta=0, adjoint=False):
+        """
+        Computes Y[:] = A * X for a selection matrix A, given as one
+        column index per row (-1 for empty rows).
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def cgridmm(self, y, N, width, table, coord, bins, x, alpha=1, beta=0, adjoint=False):
+        """
+        Computes Y[:] = G * X for the matrix-free interpolation G from a grid
+        of shape N onto the points `coord`, with `bins` from
+        `indigo.interp.grid_bins`.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def csepdiagmm(self, y, factors, x, alpha=1, beta=0, adjoint=False, shift=None):
+        """
+        Computes Y[:] = A * X for A = diag(f2 (KRON) f1 (KRON) f0), given
+        the three vectors `factors` = (f0, f1, f2). With `shift`, three
+        flags, X is first rolled by half along each flagged axis, which
+        must have even length (an fftshift); X must then not be Y.
+        """
+        raise NotImplementedError()
+
     @abc.abstractmethod
     def onemm(self, y, x, alpha=1, beta=0):
         """
@@ -532,9 +742,38 @@ class Backend(object):
         """
         raise NotImplementedError()
 
+    class sparsity_pattern(object):
+        """
+        Device-resident row pointers and column indices of a CSR matrix,
+        shared by all csr_matrix instances with the same pattern.
+        """
+        def __init__(self, backend, A, index_base=0, name='mat'):
+            shift = lambda a: a + index_base if index_base else a
+            self.rowPtrs = backend.copy_array(shift(A.indptr), name=name+".rowPtrs")
+            self.colInds = backend.copy_array(shift(A.indices), name=name+".colInds")
+            self.name = name
+            self.key = None   # (index_base,) + sparsity_key(A), set by _sparsity_pattern
+            self.stats = None # (row_frac, col_frac, exwrite), set by the first user
+
+    def _sparsity_pattern(self, A, index_base=0, name='mat'):
+        """
+        Returns the device index arrays for CSR matrix `A`, uploading them
+        only if no live matrix already has the same sparsity pattern.
+        """
+        key = (index_base,) + sparsity_key(A)
+        pattern = self._patterns.get(key)
+        if pattern is None:
+            pattern = self.sparsity_pattern(self, A, index_base, name)
+            pattern.key = key
+            self._patterns[key] = pattern
+        else:
+            log.debug("matrix %s shares its sparsity pattern with %s", name, pattern.name)
+        return pattern
+
     class csr_matrix(object):
         """
-        A device-resident sparse matrix in CSR format.
+        A device-resident sparse matrix in CSR format. Matrices with identical
+        sparsity patterns share their row pointers and column indices.
         """
         _index_base = 0
 
@@ -546,12 +785,37 @@ class Backend(object):
                 A = A.tocsr()
             A = self._type_correct(A)
             self._backend = backend
-            self.rowPtrs = backend.copy_array(A.indptr + self._index_base, name=name+".rowPtrs")
-            self.colInds = backend.copy_array(A.indices + self._index_base, name=name+".colInds")
+            self._share_pattern(A, name)
             self.values  = backend.copy_array(A.data, name=name+".data")
             self.shape = A.shape
             self.dtype = A.dtype
 
+        @classmethod
+        def upload_nbytes(cls, shape, nnz, idx_dtype):
+            """
+            Upper bound on the bytes allocated while uploading a complex64
+            CSR matrix of this shape with `nnz` nonzeros and `idx_dtype`
+            indices: its device arrays plus the largest transient host
+            buffer, either the shifted index arrays of a one-based backend
+            or the column counts of `_inspect`.
+            """
+            rows, cols = shape
+            idx = np.dtype(idx_dtype).itemsize
+            scratch = max(nnz, rows + 1) * idx if cls._index_base else 0
+            return nnz * (idx + 8) + (rows + 1) * idx + max(scratch, 4 * cols)
+
+        def _share_pattern(self, A, name):
+            """ Looks up the device index arrays and inspection results for `A`'s pattern. """
+            self._pattern = self._backend._sparsity_pattern(A, self._index_base, name)
+            self.rowPtrs = self._pattern.rowPtrs
+            self.colInds = self._pattern.colInds
+            if self._pattern.stats is None:
+                self._inspect(A, name)
+                self._pattern.stats = (self._row_frac, self._col_frac, self._exwrite)
+            else:
+                self._row_frac, self._col_frac, self._exwrite = self._pattern.stats
+
+        def _inspect(self, A, name):
             # fraction of nonzero rows/columns
             try:
                 from indigo.backends._customcpu import inspect
@@ -564,6 +828,7 @@ class Backend(object):
             except ImportError:
                 self._row_frac = 1.0
                 self._col_frac = 1.0
+                self._exwrite = False
                 log.debug("skipping exwrite inspection. Is CustomCPU backend available?")
 
         def forward(self, y, x, alpha=1, beta=0):
@@ -593,8 +858,106 @@ class Backend(object):
             return self.values.size
 
         def _type_correct(self, A):
-            return A.astype(np.complex64)
+            return A.astype(np.complex64, copy=False)
 
+    class csr16_matrix(csr_matrix):
+        """
+        A device-resident sparse matrix in CSR format with compressed column
+        indices: each row stores its first column as a 32-bit base and each
+        nonzero a 16-bit offset from it, 10 rather than 12 bytes per nonzero.
+        Every row must span fewer than 2**16 columns.
+        """
+        def __init__(self, backend, A, name='mat'):
+            """
+            Create a matrix from the given `scipy.sparse.spmatrix`.
+            """
+            A = spp.csr_matrix(A, dtype=np.complex64)
+            A.sort_indices()
+            assert self.row_span(A) < 2**16, "row spans too many columns for 16-bit deltas"
+            nonempty = np.diff(A.indptr) > 0
+            base = np.zeros(A.shape[0], dtype=np.uint32)
+            base[nonempty] = A.indices[A.indptr[:-1][nonempty]]
+            delta = A.indices - np.repeat(base, np.diff(A.indptr))
+            self._backend = backend
+            self.rowPtrs  = backend.copy_array(A.indptr.astype(np.int32), name=name+".rowPtrs")
+            self.rowBase  = backend.copy_array(base, name=name+".rowBase")
+            self.colDelta = backend.copy_array(delta.astype(np.uint16), name=name+".colDelta")
+            self.values   = backend.copy_array(A.data, name=name+".data")
+            self.shape = A.shape
+            self.dtype = A.dtype
+            self._inspect(A, name)
+
+        @staticmethod
+        def row_span(A):
+            """ Largest difference between the last and first column of a row of CSR matrix `A`. """
+            b, e = A.indptr[:-1], A.indptr[1:]
+            nonempty = e > b
+            if not nonempty.any():
+                return 0
+            cols = A.indices.astype(np.int64)
+            first = np.minimum.reduceat(cols, b[nonempty])
+            last  = np.maximum.reduceat(cols, b[nonempty])
+            return int((last - first).max())
+
+        def forward(self, y, x, alpha=1, beta=0):
+            """ y[:] = A * x """
+            self._backend.ccsr16mm(y, self.shape, self.rowBase, self.colDelta,
+                self.rowPtrs, self.values, x, alpha=alpha, beta=beta, adjoint=False, exwrite=True)
+
+        def adjoint(self, y, x, alpha=1, beta=0):
+            """ y[:] = A.H * x """
+            self._backend.ccsr16mm(y, self.shape, self.rowBase, self.colDelta,
+                self.rowPtrs, self.values, x, alpha=alpha, beta=beta, adjoint=True, exwrite=self._exwrite)
+
+        @property
+        def nbytes(self):
+            return self.rowPtrs.nbytes + self.rowBase.nbytes + self.colDelta.nbytes + self.values.nbytes
+
+
+    class lut_matrix(csr_matrix):
+        """
+        A device-resident interpolation matrix in CSR format whose values are
+        products of kernel table lookups, one per axis: each nonzero stores a
+        uint8 table index per axis instead of a complex64 value, 7 rather than
+        12 bytes per nonzero in 3D. See `indigo.interp.interp_lut`.
+        """
+        def __init__(self, backend, A, lut, table, name='mat'):
+            """
+            Create a matrix from CSR matrix `A` and the table indices `lut`
+            of its nonzeros, in CSR order.
+            """
+            assert isinstance(A, spp.csr_matrix)
+            assert lut.shape[0] == A.nnz
+            self._backend = backend
+            self._share_pattern(A, name)
+            self.lut   = backend.copy_array(np.require(lut, np.uint8, 'C').reshape(-1), name=name+".lut")
+            self.table = backend.copy_array(np.require(table, np.float32), name=name+".table")
+            self.shape = A.shape
+            self.dtype = np.dtype('complex64')
+
+        @classmethod
+        def upload_nbytes(cls, shape, nnz, idx_dtype):
+            """ Like `csr_matrix.upload_nbytes`, with three uint8 table indices per nonzero instead of a value. """
+            csr = super(Backend.lut_matrix, cls).upload_nbytes(shape, nnz, idx_dtype)
+            return csr - (8 - 3) * nnz + 256 * 4
+
+        def forward(self, y, x, alpha=1, beta=0):
+            """ y[:] = A * x """
+            self._backend.clutmm(y, self.shape, self.colInds, self.rowPtrs, self.lut, self.table,
+                x, alpha=alpha, beta=beta, adjoint=False, exwrite=True)
+
+        def adjoint(self, y, x, alpha=1, beta=0):
+            """ y[:] = A.H * x """
+            self._backend.clutmm(y, self.shape, self.colInds, self.rowPtrs, self.lut, self.table,
+                x, alpha=alpha, beta=beta, adjoint=True, exwrite=self._exwrite)
+
+        @property
+        def nbytes(self):
+            return self.rowPtrs.nbytes + self.colInds.nbytes + self.lut.nbytes + self.table.nbytes
+
+        @property
+        def nnz(self):
+            return self.colInds.size
 
     class dia_matrix(object):
         """
@@ -632,6 +995,103 @@ class Backend(object):
         def nnz(self):
             return self.data.size
 
+    class bsr_matrix(object):
+        """
+        A device-resident sparse matrix in BSR format. Stores one row pointer
+        and one column index per dense block rather than per nonzero.
+        """
+        _index_base = 0
+        _square_blocks = False # True if the kernel only takes r-by-r blocks
+
+        def __init__(self, backend, A, blocksize=None, name='mat'):
+            """
+            Create a matrix from the given `scipy.sparse.spmatrix`.
+            """
+            if not isinstance(A, spp.bsr_matrix) or \
+                (blocksize is not None and A.blocksize != tuple(blocksize)):
+                A = spp.bsr_matrix(A, blocksize=blocksize)
+            A = A.astype(np.complex64)
+            A.sort_indices()
+            self._backend = backend
+            self.rowPtrs = backend.copy_array(A.indptr + self._index_base, name=name+".rowPtrs")
+            self.colInds = backend.copy_array(A.indices + self._index_base, name=name+".colInds")
+            self.values  = backend.copy_array(self._block_layout(A.data), name=name+".data")
+            self.shape = A.shape
+            self.blocksize = A.blocksize
+            self.dtype = A.dtype
+            self._row_frac = 1
+            self._col_frac = 1
+            self._exwrite = False
+
+        def forward(self, y, x, alpha=1, beta=0):
+            """ y[:] = A * x """
+            self._backend.cbsrmm(y, self.shape, self.blocksize,
+                self.colInds, self.rowPtrs, self.values,
+                x, alpha=alpha, beta=beta, adjoint=False)
+
+        def adjoint(self, y, x, alpha=1, beta=0):
+            """ y[:] = A.H * x """
+            self._backend.cbsrmm(y, self.shape, self.blocksize,
+                self.colInds, self.rowPtrs, self.values,
+                x, alpha=alpha, beta=beta, adjoint=True)
+
+        @property
+        def nbytes(self):
+            return self.rowPtrs.nbytes + self.colInds.nbytes + self.values.nbytes
+
+        @property
+        def nnz(self):
+            return self.values.size
+
+        def _block_layout(self, data):
+            """ Flattens (nblocks, R, C) block data into device order: row-major blocks. """
+            return np.ascontiguousarray(data).reshape(-1)
+
+    class sel_matrix(object):
+        """
+        A device-resident selection matrix: every row has at most one entry,
+        equal to one, and no two rows select the same column. Only the
+        selected column of each row is stored, or -1 for empty rows.
+        """
+        def __init__(self, backend, A, name='mat'):
+            """
+            Create a matrix from the given `scipy.sparse.spmatrix`.
+            """
+            A = A.tocsr(copy=True)
+            A.sum_duplicates()
+            counts = np.diff(A.indptr)
+            assert counts.max(initial=0) <= 1, "selection rows must have at most one entry"
+            assert np.all(A.data == 1), "selection entries must be one"
+            cols = np.full(A.shape[0], -1, dtype=np.int32)
+            cols[counts == 1] = A.indices
+            assert np.unique(A.indices).size == A.indices.size, "selection columns must be distinct"
+            self._backend = backend
+            self.colInds = backend.copy_array(cols, name=name+".colInds")
+            self.shape = A.shape
+            self.dtype = np.dtype('complex64')
+            self._nnz = A.nnz
+            self._row_frac = A.nnz / max(A.shape[0], 1)
+            self._col_frac = A.nnz / max(A.shape[1], 1)
+            self._exwrite = True
+
+        def forward(self, y, x, alpha=1, beta=0):
+            """ y[:] = A * x """
+            self._backend.cselmm(y, self.shape, self.colInds,
+                x, alpha=alpha, beta=beta, adjoint=False)
+
+        def adjoint(self, y, x, alpha=1, beta=0):
+            """ y[:] = A.H * x """
+            self._backend.cselmm(y, self.shape, self.colInds,
+                x, alpha=alpha, beta=beta, adjoint=True)
+
+        @property
+        def nbytes(self):
+            return self.colInds.nbytes
+
+        @property
+        def nnz(self):
+            return self._nnz
+
     # -----------------------------------------------------------------------
     # Algorithms
     # -----------------------------------------------------------------------
@@ -485,17 +485,35 @@ class CudaBackend(Backend):
         plan, workSize = self._get_or_create_plan(x_shape)
         return workSize
 
-    def fftn(self, y, x):
+    def _cufft(self, y, x, alpha=1, direction=None):
         plan, workSize = self._get_or_create_plan(x.shape)
         with self.scratch(nbytes=workSize) as tmp:
             self.cufftSetWorkArea(plan, tmp)
-            self.cufftExecC2C(plan, x, y, CudaBackend.CUFFT_FORWARD)
+            self.cufftExecC2C(plan, x, y, direction)
+        if alpha != 1:
+            self.scale(y, alpha)
 
-    def ifftn(self, y, x):
-        plan, workSize = self._get_or_create_plan(x.shape)
-        with self.scratch(nbytes=workSize) as tmp:
-            self.cufftSetWorkArea(plan, tmp)
-            self.cufftExecC2C(plan, x, y, CudaBackend.CUFFT_INVERSE)
+    @staticmethod
+    def _fft_batch_shape(x, axes):
+        """
+        Reshapes `x` so that transforms along leading `axes` batch over the
+        remaining ones; other axis subsets need strided plans.
+        """
+        if axes is None:
+            return x
+        if tuple(axes) != tuple(range(len(axes))):
+            raise NotImplementedError("cuFFT transforms only along leading axes, got %s" % (axes,))
+        return x.reshape( x.shape[:len(axes)] + (-1,) )
+
+    def fftn(self, y, x, alpha=1, beta=0, axes=None):
+        x, y = self._fft_batch_shape(x, axes), self._fft_batch_shape(y, axes)
+        transform = lambda y, x, alpha: self._cufft(y, x, alpha, CudaBackend.CUFFT_FORWARD)
+        self._fft_accumulate(transform, y, x, alpha, beta)
+
+    def ifftn(self, y, x, alpha=1, beta=0, axes=None):
+        x, y = self._fft_batch_shape(x, axes), self._fft_batch_shape(y, axes)
+        transform = lambda y, x, alpha: self._cufft(y, x, alpha, CudaBackend.CUFFT_INVERSE)
+        self._fft_accumulate(transform, y, x, alpha, beta)
 
     # -----------------------------------------------------------------------
     # Cusparse
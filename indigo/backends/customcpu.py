@@ -1,24 +1,197 @@
 import numpy as np
 from ctypes import cdll
 
+from indigo.backends.backend import Backend
 from indigo.backends.mkl import MklBackend
 from indigo.backends import _customcpu
 
+def merge_path_partition(rowPtrs, nparts):
+    """
+    Split the rows of a CSR matrix into `nparts` contiguous ranges of equal
+    merge-path length, i.e. rows plus nonzeros, so that threads share the
+    work evenly even when row lengths are skewed. Returns `nparts+1` row
+    boundaries as a uint32 array.
+    """
+    rowPtrs = np.asarray(rowPtrs, dtype=np.int64)
+    path = np.arange(rowPtrs.size) + (rowPtrs - rowPtrs[0])
+    diagonals = np.linspace(0, path[-1], nparts+1)
+    return np.searchsorted(path, diagonals).astype(np.uint32)
+
+
+def _strided(d):
+    """ 2D view of device array `d` that honours its leading dimension. """
+    isz = d._arr.itemsize
+    return np.lib.stride_tricks.as_strided(d._arr,
+        shape=d.shape, strides=(isz, d._leading_dim * isz))
+
+
+class _RowPartitioned(object):
+    """ Mixin for CSR-like matrices that caches their merge-path row partitions. """
+    @classmethod
+    def upload_nbytes(cls, shape, nnz, idx_dtype):
+        """ Adds the int64 merge-path buffers of the first partition to the upload bound. """
+        return super().upload_nbytes(shape, nnz, idx_dtype) + 4 * 8 * (shape[0] + 1)
+
+    def _partition(self, nparts):
+        """ Row partition for `nparts` threads, computed once per thread count. """
+        if nparts not in self._partitions:
+            self._partitions[nparts] = merge_path_partition(self.rowPtrs._arr, nparts)
+        return self._partitions[nparts]
+
+
 class CustomCpuBackend(MklBackend):
 
-    class csr_matrix(MklBackend.csr_matrix):
+    class csr_matrix(_RowPartitioned, MklBackend.csr_matrix):
         _index_base = 0
 
+        def __init__(self, backend, A, name='mat'):
+            super(CustomCpuBackend.csr_matrix, self).__init__(backend, A, name=name)
+            self._partitions = dict()
+            self._partition(backend.get_max_threads())
+
         def _type_correct(self, A):
             return A
 
-    def ccsrmm(self, Y, A_shape, A_indx, A_ptr, A_vals, X, alpha, beta, adjoint=False, exwrite=False):
+        def forward(self, y, x, alpha=1, beta=0):
+            """ y[:] = A * x """
+            assert x.dtype == np.dtype("complex64"), "Bad dtype: expected compelx64, got %s" % x.dtype
+            assert y.dtype == np.dtype("complex64"), "Bad dtype: expected compelx64, got %s" % y.dtype
+            part = self._partition(self._backend.get_max_threads())
+            self._backend.ccsrmm(y,
+                self.shape, self.colInds, self.rowPtrs, self.values,
+                x, alpha=alpha, beta=beta, adjoint=False, exwrite=True, partition=part)
+
+        def adjoint(self, y, x, alpha=1, beta=0):
+            """ y[:] = A.H * x """
+            assert x.dtype == np.dtype("complex64"), "Bad dtype: expected compelx64, got %s" % x.dtype
+            assert y.dtype == np.dtype("complex64"), "Bad dtype: expected compelx64, got %s" % y.dtype
+            part = self._partition(self._backend.get_max_threads())
+            self._backend.ccsrmm(y,
+                self.shape, self.colInds, self.rowPtrs, self.values,
+                x, alpha=alpha, beta=beta, adjoint=True, exwrite=self._exwrite, partition=part)
+
+    def ccsrmm(self, Y, A_shape, A_indx, A_ptr, A_vals, X, alpha, beta, adjoint=False, exwrite=False, partition=None):
         ldx = X._leading_dim
         ldy = Y._leading_dim
         (M, K), N = A_shape, X.shape[1]
+        if partition is None:
+            partition = merge_path_partition(A_ptr._arr, self.get_max_threads())
         _customcpu.csrmm(adjoint, M, N, K, alpha,
             A_vals._arr, A_indx._arr, A_ptr._arr,
-            X._arr, ldx, beta, Y._arr, ldy, exwrite)
+            X._arr, ldx, beta, Y._arr, ldy, exwrite, partition)
+
+    class csr16_matrix(_RowPartitioned, Backend.csr16_matrix):
+
+        def __init__(self, backend, A, name='mat'):
+            super(CustomCpuBackend.csr16_matrix, self).__init__(backend, A, name=name)
+            self._partitions = dict()
+            self._partition(backend.get_max_threads())
+
+        def forward(self, y, x, alpha=1, beta=0):
+            """ y[:] = A * x """
+            part = self._partition(self._backend.get_max_threads())
+            self._backend.ccsr16mm(y, self.shape, self.rowBase, self.colDelta,
+                self.rowPtrs, self.values, x, alpha=alpha, beta=beta,
+                adjoint=False, exwrite=True, partition=part)
+
+        def adjoint(self, y, x, alpha=1, beta=0):
+            """ y[:] = A.H * x """
+            part = self._partition(self._backend.get_max_threads())
+            self._backend.ccsr16mm(y, self.shape, self.rowBase, self.colDelta,
+                self.rowPtrs, self.values, x, alpha=alpha, beta=beta,
+                adjoint=True, exwrite=self._exwrite, partition=part)
+
+    def ccsr16mm(self, Y, A_shape, A_base, A_delta, A_ptr, A_vals, X, alpha=1, beta=0, adjoint=False, exwrite=False, partition=None):
+        ldx = X._leading_dim
+        ldy = Y._leading_dim
+        (M, K), N = A_shape, X.shape[1]
+        if partition is None:
+            partition = merge_path_partition(A_ptr._arr, self.get_max_threads())
+        _customcpu.csr16mm(adjoint, M, N, K, alpha,
+            A_vals._arr, A_base._arr, A_delta._arr, A_ptr._arr,
+            X._arr, ldx, beta, Y._arr, ldy, exwrite, partition)
+
+    class lut_matrix(_RowPartitioned, Backend.lut_matrix):
+
+        def __init__(self, backend, A, lut, table, name='mat'):
+            super(CustomCpuBackend.lut_matrix, self).__init__(backend, A, lut, table, name=name)
+            self._partitions = dict()
+            self._partition(backend.get_max_threads())
+
+        def forward(self, y, x, alpha=1, beta=0):
+            """ y[:] = A * x """
+            part = self._partition(self._backend.get_max_threads())
+            self._backend.clutmm(y, self.shape, self.colInds, self.rowPtrs, self.lut, self.table,
+                x, alpha=alpha, beta=beta, adjoint=False, exwrite=True, partition=part)
+
+        def adjoint(self, y, x, alpha=1, beta=0):
+            """ y[:] = A.H * x """
+            part = self._partition(self._backend.get_max_threads())
+            self._backend.clutmm(y, self.shape, self.colInds, self.rowPtrs, self.lut, self.table,
+                x, alpha=alpha, beta=beta, adjoint=True, exwrite=self._exwrite, partition=part)
+
+    def clutmm(self, Y, A_shape, A_indx, A_ptr, A_lut, A_table, X, alpha=1, beta=0, adjoint=False, exwrite=False, partition=None):
+        ldx = X._leading_dim
+        ldy = Y._leading_dim
+        (M, K), N = A_shape, X.shape[1]
+        D = A_lut.size // max(A_indx.size, 1)
+        if partition is None:
+            partition = merge_path_partition(A_ptr._arr, self.get_max_threads())
+        _customcpu.lutmm(adjoint, M, N, K, D, alpha,
+            A_lut._arr, A_table._arr, A_indx._arr, A_ptr._arr,
+            X._arr, ldx, beta, Y._arr, ldy, exwrite, partition)
+
+    class bsr_matrix(Backend.bsr_matrix):
+        _index_base = 0
+
+    def cbsrmm(self, Y, A_shape, A_blocksize, A_indx, A_ptr, A_vals, X, alpha=1, beta=0, adjoint=False):
+        ldx = X._leading_dim
+        ldy = Y._leading_dim
+        (R, C), N = A_blocksize, X.shape[1]
+        MB, KB = A_shape[0] // R, A_shape[1] // C
+        _customcpu.bsrmm(adjoint, MB, N, KB, R, C, alpha,
+            A_vals._arr, A_indx._arr, A_ptr._arr,
+            X._arr, ldx, beta, Y._arr, ldy)
+
+    class dia_matrix(Backend.dia_matrix):
+        """
+        Diagonal storage in numpy's layout; unlike MklBackend.dia_matrix, no
+        conjugated or negated-offset copy is needed.
+        """
+        pass
+
+    def native_formats(self):
+        # unlike MklBackend, DIA has its own kernel here
+        return super().native_formats() | {'dia'}
+
+    def cdiamm(self, y, shape, offsets, data, x, alpha=1.0, beta=0.0, adjoint=False):
+        ldx = x._leading_dim
+        ldy = y._leading_dim
+        (M, K), N = shape, x.shape[1]
+        L, ndiag = data.shape
+        _customcpu.diamm(adjoint, M, N, K, ndiag,
+            offsets._arr.astype(np.int32, copy=False), data._arr, L,
+            alpha, x._arr, ldx, beta, y._arr, ldy)
+
+    def cselmm(self, y, A_shape, A_indx, x, alpha=1, beta=0, adjoint=False):
+        ldx = x._leading_dim
+        ldy = y._leading_dim
+        (M, K), N = A_shape, x.shape[1]
+        _customcpu.selmm(adjoint, M, N, K, A_indx._arr,
+            alpha, x._arr, ldx, beta, y._arr, ldy)
+
+    def csepdiagmm(self, y, factors, x, alpha=1, beta=0, adjoint=False, shift=None):
+        ldx = x._leading_dim
+        ldy = y._leading_dim
+        f0, f1, f2 = (f._arr for f in factors)
+        h0, h1, h2 = (f.size // 2 if s else 0 for f, s in zip((f0, f1, f2), shift or (0, 0, 0)))
+        _customcpu.sepdiagmm(adjoint, f0.size, f1.size, f2.size, x.shape[1], h0, h1, h2,
+            f0, f1, f2, alpha, x._arr, ldx, beta, y._arr, ldy)
+
+    def cgridmm(self, y, N, width, table, coord, bins, x, alpha=1, beta=0, adjoint=False):
+        from indigo.interp import grid_mm
+        grid_mm(_strided(y), N, width, table._arr, coord._arr, tuple(a._arr for a in bins),
+            _strided(x), alpha=alpha, beta=beta, adjoint=adjoint)
 
     def onemm(self, y, x, alpha, beta):
         ldx = x._leading_dim
@@ -1,6 +1,9 @@
 import logging
 import os, sys, time
+import itertools
 from ctypes import *
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import scipy.sparse as spp
@@ -14,12 +17,19 @@ log = logging.getLogger(__name__)
 dll_ext = '.dylib' if sys.platform == 'darwin' else '.so'
 libmkl_rt = cdll.LoadLibrary('libmkl_rt' + dll_ext)
 
+# DftiSetValue is variadic; strides must be passed as pointers to MKL_LONG arrays
+_DftiSetValuePtr = libmkl_rt['DftiSetValue']
+_DftiSetValuePtr.argtypes = [c_void_p, c_uint, c_void_p]
+_DftiSetValuePtr.restype = c_long
+
 class MklBackend(Backend):
 
     def __init__(self, device_id=0):
         super(MklBackend, self).__init__()
         log.debug('mkl_get_version() reports: %s', self.get_version())
-        self._fft_descs = dict()
+        self._fft_plans = OrderedDict()
+        self._fft_choices = {}
+        self._pool, self._pool_size = None, 0
 
     def wrap(fn):
         libfn = getattr(libmkl_rt, fn.__name__)
@@ -56,8 +66,7 @@ class MklBackend(Backend):
             while arr.ctypes.get_data() % self._align != 0:
                 arr = arr[1:]
             arr = arr[:np.prod(shape)]
-            arr = np.asfortranarray(arr.reshape(shape))
-            return arr
+            return arr.reshape(shape, order='F')
 
         def _free(self):
             del self._arr_orig
@@ -105,6 +114,9 @@ class MklBackend(Backend):
         """ y += alpha * x """
         assert isinstance(x, self.dndarray)
         assert isinstance(y, self.dndarray)
+        if np.dtype(y.dtype) == np.float32:
+            self.cblas_saxpby( y.size, alpha, x._arr, 1, beta, y._arr, 1 )
+            return
         alpha = np.array(alpha, dtype=np.complex64)
         beta  = np.array( beta, dtype=np.complex64)
         self.cblas_caxpby( y.size, alpha, x._arr, 1, beta, y._arr, 1 )
@@ -113,6 +125,8 @@ class MklBackend(Backend):
         """ returns x^T * y """
         assert isinstance(x, self.dndarray)
         assert isinstance(y, self.dndarray)
+        if np.dtype(x.dtype) == np.float32:
+            return self.cblas_sdot( x.size, x._arr, 1, y._arr, 1 )
         dotc = np.array(0, dtype=np.complex64)
         self.cblas_cdotc_sub( x.size, x._arr, 1, y._arr, 1, dotc )
         return dotc.real
@@ -120,12 +134,18 @@ class MklBackend(Backend):
     def norm2(self, x):
         """ returns ||x||_2"""
         assert isinstance(x, self.dndarray)
-        res = self.cblas_scnrm2( x.size, x._arr, 1 )
+        if np.dtype(x.dtype) == np.float32:
+            res = self.cblas_snrm2( x.size, x._arr, 1 )
+        else:
+            res = self.cblas_scnrm2( x.size, x._arr, 1 )
         return res**2
 
     def scale(self, x, alpha):
         """ x *= alpha """
         assert isinstance(x, self.dndarray)
+        if np.dtype(x.dtype) == np.float32:
+            self.cblas_sscal( x.size, alpha, x._arr, 1 )
+            return
         a = np.array(alpha, dtype=np.complex64)
         self.cblas_cscal( x.size, a, x._arr, 1 )
 
@@ -228,6 +248,45 @@ class MklBackend(Backend):
     ) -> c_void_p:
         pass
 
+    @wrap
+    def cblas_saxpby(
+        n : c_int,
+        a : c_float,
+        x : ndpointer(dtype=np.float32),
+        incx : c_int,
+        b : c_float,
+        y : ndpointer(dtype=np.float32),
+        incy : c_int,
+    ) -> c_void_p:
+        pass
+
+    @wrap
+    def cblas_sdot(
+        n    : c_int,
+        x    : ndpointer(dtype=np.float32),
+        incx : c_int,
+        y    : ndpointer(dtype=np.float32),
+        incy : c_int,
+    ) -> c_float:
+        pass
+
+    @wrap
+    def cblas_snrm2(
+        n : c_int,
+        x    : ndpointer(dtype=np.float32),
+        incx : c_int,
+    ) -> c_float:
+        pass
+
+    @wrap
+    def cblas_sscal(
+        n    : c_int,
+        a    : c_float,
+        x    : ndpointer(dtype=np.float32),
+        incx : c_int,
+    ) -> c_void_p:
+        pass
+
     @wrap
     def cblas_cdotc_sub(
         n    : c_int,
@@ -271,6 +330,11 @@ class MklBackend(Backend):
     # they could change so we're living on the edge here
     DFTI_SINGLE = 35
     DFTI_COMPLEX = 32
+    DFTI_REAL = 33
+    DFTI_CONJUGATE_EVEN_STORAGE = 10
+    DFTI_COMPLEX_COMPLEX = 39
+    DFTI_INPUT_STRIDES = 12
+    DFTI_OUTPUT_STRIDES = 13
     DFTI_INPUT_DISTANCE = 14
     DFTI_OUTPUT_DISTANCE = 15
     DFTI_NUMBER_OF_TRANSFORMS = 7
@@ -278,37 +342,364 @@ class MklBackend(Backend):
     DFTI_INPLACE = 43
     DFTI_NOT_INPLACE = 44
 
-    def _get_or_create_fft_desc(self, x):
-        key = (x.shape, x.dtype)
-        if key not in self._fft_descs:
-            dims, batch = x.shape[:-1][::-1], x.shape[-1]
-            ndim = len(dims)
-            if ndim == 1:
-                lengths = c_long(dims[0])
+    DFTI_THREAD_LIMIT = 27
+
+    # ways to run a batch of transforms; see _get_or_create_fft_plan
+    _fft_strategies = ('batched', 'loop', 'split')
+
+    # most FFT plans kept alive at once; the least recently used is freed
+    _fft_cache_size = 32
+
+    def _create_fft_desc(self, dims, batch, distances, inplace=False, threads=None, strides=None):
+        ndim = len(dims)
+        if ndim == 1:
+            lengths = c_long(dims[0])
+        else:
+            lengths = (c_long*ndim)(*dims)
+        desc = self.DFTI_DESCRIPTOR_HANDLE()
+        self.DftiCreateDescriptor( byref(desc),
+            self.DFTI_SINGLE, self.DFTI_COMPLEX, ndim, lengths )
+        self.DftiSetValue( desc, self.DFTI_NUMBER_OF_TRANSFORMS, batch )
+        self.DftiSetValue( desc, self.DFTI_PLACEMENT,
+            self.DFTI_INPLACE if inplace else self.DFTI_NOT_INPLACE )
+        if strides is not None:
+            _DftiSetValuePtr( desc, self.DFTI_INPUT_STRIDES, (c_long*(ndim+1))(*strides[0]) )
+            _DftiSetValuePtr( desc, self.DFTI_OUTPUT_STRIDES, (c_long*(ndim+1))(*strides[1]) )
+        self.DftiSetValue( desc, self.DFTI_INPUT_DISTANCE, distances[0] )
+        self.DftiSetValue( desc, self.DFTI_OUTPUT_DISTANCE, distances[1] )
+        self.DftiSetValue( desc, self.DFTI_THREAD_LIMIT, threads or self.get_max_threads() )
+        self.DftiCommitDescriptor( desc )
+        return desc
+
+    def _create_fft_plan(self, strategy, dims, batch, distances, inplace=False):
+        """
+        Descriptors for one way of running `batch` transforms of shape `dims`:
+        'batched' is a single descriptor for all of them, 'loop' runs them
+        one after another, and 'split' runs them concurrently from several
+        threads, each transform limited to a share of the MKL threads.
+        """
+        if strategy == 'batched':
+            descs = [ self._create_fft_desc(dims, batch, distances, inplace) ]
+        elif strategy == 'loop':
+            descs = [ self._create_fft_desc(dims, 1, distances, inplace) ]
+        elif strategy == 'split':
+            nthreads = self.get_max_threads()
+            nparts = min(batch, nthreads)
+            descs = [ self._create_fft_desc(dims, 1, distances, inplace, threads=nthreads // nparts)
+                      for part in range(nparts) ]
+        return strategy, descs
+
+    def _create_rfft_desc(self, dims, batch, distances, forward=True):
+        """
+        Real-to-complex (`forward`) or complex-to-real descriptor for `batch`
+        transforms of shape `dims`, in MKL's row-major order, with the last
+        dimension halved in the complex domain.
+        """
+        ndim = len(dims)
+        half = dims[:-1] + (dims[-1]//2+1,)
+        def strides(shape):
+            return [0] + [int(np.prod(shape[i+1:])) for i in range(ndim)]
+        real, cplx = strides(dims), strides(half)
+        instrides, outstrides = (real, cplx) if forward else (cplx, real)
+        if ndim == 1:
+            lengths = c_long(dims[0])
+        else:
+            lengths = (c_long*ndim)(*dims)
+        desc = self.DFTI_DESCRIPTOR_HANDLE()
+        self.DftiCreateDescriptor( byref(desc),
+            self.DFTI_SINGLE, self.DFTI_REAL, ndim, lengths )
+        self.DftiSetValue( desc, self.DFTI_CONJUGATE_EVEN_STORAGE, self.DFTI_COMPLEX_COMPLEX )
+        self.DftiSetValue( desc, self.DFTI_NUMBER_OF_TRANSFORMS, batch )
+        self.DftiSetValue( desc, self.DFTI_PLACEMENT, self.DFTI_NOT_INPLACE )
+        _DftiSetValuePtr( desc, self.DFTI_INPUT_STRIDES, (c_long*(ndim+1))(*instrides) )
+        _DftiSetValuePtr( desc, self.DFTI_OUTPUT_STRIDES, (c_long*(ndim+1))(*outstrides) )
+        self.DftiSetValue( desc, self.DFTI_INPUT_DISTANCE, distances[0] )
+        self.DftiSetValue( desc, self.DFTI_OUTPUT_DISTANCE, distances[1] )
+        self.DftiSetValue( desc, self.DFTI_THREAD_LIMIT, self.get_max_threads() )
+        self.DftiCommitDescriptor( desc )
+        return desc
+
+    def _free_fft_plan(self, plan):
+        for desc in plan[1]:
+            self.DftiFreeDescriptor( byref(desc) )
+
+    @staticmethod
+    def _fft_distance(d):
+        """
+        Elements between consecutive transforms of `d`. Strided views keep
+        their column stride in the numpy view, since reshaping the dndarray
+        to the transform shape resets its leading dimension.
+        """
+        arr, batch = d._arr, d.shape[-1]
+        if arr.ndim > 1 and arr.shape[-1] == batch:
+            return arr.strides[-1] // arr.itemsize
+        return int(np.prod(d.shape[:-1]))
+
+    @staticmethod
+    def _fft_columns(d):
+        """ Numpy views of the individual transforms of `d`. """
+        arr, batch = d._arr, d.shape[-1]
+        if arr.ndim > 1 and arr.shape[-1] == batch:
+            return [arr[...,j] for j in range(batch)]
+        n = int(np.prod(d.shape[:-1]))
+        arr = arr.reshape(-1, order='A')
+        return [arr[j*n:(j+1)*n] for j in range(batch)]
+
+    def _get_or_create_fft_plan(self, y, x):
+        """
+        Unscaled plan for transforming `x` into `y`, cached by shape,
+        transform distances, placement and thread count. The strategy is
+        chosen by timing each applicable one on a few columns; see
+        _calibrate_fft_strategy.
+        """
+        inplace = x._arr.ctypes.data == y._arr.ctypes.data
+        dims, batch = x.shape[:-1][::-1], x.shape[-1]
+        distances = (self._fft_distance(x), self._fft_distance(y))
+        nthreads = self.get_max_threads()
+        key = (x.shape, x.dtype, distances, inplace, nthreads)
+        if key in self._fft_plans:
+            self._fft_plans.move_to_end(key)
+            return self._fft_plans[key]
+
+        strategies = list(self._fft_strategies) if batch > 1 else ['batched']
+        if nthreads == 1 and 'loop' in strategies and 'split' in strategies:
+            strategies.remove('split')
+        if len(strategies) == 1:
+            strategy = strategies[0]
+        else:
+            choice = key + (tuple(strategies),)
+            if choice not in self._fft_choices:
+                self._fft_choices[choice] = self._calibrate_fft_strategy(
+                    strategies, dims, batch, distances, inplace, x.dtype)
+            strategy = self._fft_choices[choice]
+        best = self._create_fft_plan(strategy, dims, batch, distances, inplace)
+
+        self._fft_plans[key] = best
+        while len(self._fft_plans) > self._fft_cache_size:
+            old_key, old_plan = self._fft_plans.popitem(last=False)
+            log.debug("evicting fft plan for %s", old_key[0])
+            self._free_fft_plan(old_plan)
+        return best
+
+    def _calibrate_fft_strategy(self, strategies, dims, batch, distances, inplace, dtype, repeats=3):
+        """
+        Fastest of `strategies` for `batch` transforms of shape `dims`, by the
+        best of `repeats` timed runs on min(batch, get_max_threads()) columns,
+        and never fewer than two, which is as many as the 'split' strategy
+        runs at once.
+        """
+        k = min(batch, max(self.get_max_threads(), 2))
+        u = self.zero_array((distances[0], k), dtype=dtype)
+        v = u if inplace else self.zero_array((distances[1], k), dtype=dtype)
+        best, best_time = None, None
+        for strategy in strategies:
+            plan = self._create_fft_plan(strategy, dims, k, distances, inplace)
+            self._run_fft_plan(plan, v, u, forward=True) # warm up
+            elapsed = float('inf')
+            for r in range(repeats):
+                start = time.perf_counter()
+                self._run_fft_plan(plan, v, u, forward=True)
+                elapsed = min(elapsed, time.perf_counter() - start)
+            self._free_fft_plan(plan)
+            log.debug("fft %s x %d, %s: %.2f ms", dims[::-1], k, strategy, elapsed*1000)
+            if best is None or elapsed < best_time:
+                best, best_time = strategy, elapsed
+        log.debug("fft %s x %d: using %s transforms", dims[::-1], batch, best)
+        return best
+
+    def _fft_strides(self, d):
+        """ Element strides of the axes of `d`, the last one being the batch. """
+        return tuple(int(s) for s in np.cumprod((1,) + d.shape[:-2])) + (self._fft_distance(d),)
+
+    def _get_or_create_fft_axes_plan(self, y, x, axes):
+        """
+        Plan for transforming `x` into `y` along `axes` only. The transformed
+        axes are described to MKL by their strides, and the other axes, batch
+        included, are merged wherever their strides line up. The largest
+        merged group becomes the descriptor's batch; the plan lists the
+        offsets of the transforms over any groups that remain.
+        """
+        inplace = x._arr.ctypes.data == y._arr.ctypes.data
+        sx, sy = self._fft_strides(x), self._fft_strides(y)
+        key = (x.shape, axes, sx, sy, inplace, self.get_max_threads())
+        if key in self._fft_plans:
+            self._fft_plans.move_to_end(key)
+            return self._fft_plans[key]
+
+        groups = []
+        for a, n in enumerate(x.shape):
+            if a in axes:
+                continue
+            if groups and groups[-1][0] * groups[-1][1] == sx[a] \
+                      and groups[-1][0] * groups[-1][2] == sy[a]:
+                count, gx, gy = groups.pop()
+                groups.append( (count * n, gx, gy) )
             else:
-                lengths = (c_long*ndim)(*dims)
-            desc = self.DFTI_DESCRIPTOR_HANDLE()
-            self.DftiCreateDescriptor( byref(desc),
-                self.DFTI_SINGLE, self.DFTI_COMPLEX, ndim, lengths )
-            self.DftiSetValue( desc, self.DFTI_NUMBER_OF_TRANSFORMS, batch )
-            self.DftiSetValue( desc, self.DFTI_PLACEMENT, self.DFTI_NOT_INPLACE )
-            self.DftiSetValue( desc, self.DFTI_INPUT_DISTANCE, np.prod(dims) )
-            self.DftiSetValue( desc, self.DFTI_OUTPUT_DISTANCE, np.prod(dims) )
-            self.DftiCommitDescriptor( desc )
-            self._fft_descs[key] = desc
-        return self._fft_descs[key]
-
-    def fftn(self, y, x):
-        desc = self._get_or_create_fft_desc( x )
-        self.DftiComputeForward( desc, x, y )
-
-    def ifftn(self, y, x):
-        desc = self._get_or_create_fft_desc( x )
-        self.DftiComputeBackward( desc, x, y )
+                groups.append( (n, sx[a], sy[a]) )
+        batch, dx, dy = groups.pop( int(np.argmax([g[0] for g in groups])) )
+        offsets = [ (sum(i * g[1] for i, g in zip(idx, groups)),
+                     sum(i * g[2] for i, g in zip(idx, groups)))
+                    for idx in itertools.product(*(range(g[0]) for g in groups)) ]
+
+        dims = tuple(x.shape[a] for a in reversed(axes))
+        strides = ( [0] + [sx[a] for a in reversed(axes)],
+                    [0] + [sy[a] for a in reversed(axes)] )
+        desc = self._create_fft_desc(dims, batch, (dx, dy), inplace, strides=strides)
+        log.debug("fft %s along %s: %d x %d transforms", x.shape, axes, len(offsets), batch)
+        plan = ('strided', [desc], offsets)
+        self._fft_plans[key] = plan
+        while len(self._fft_plans) > self._fft_cache_size:
+            old_key, old_plan = self._fft_plans.popitem(last=False)
+            log.debug("evicting fft plan for %s", old_key[0])
+            self._free_fft_plan(old_plan)
+        return plan
+
+    def _run_fft_axes_plan(self, plan, y, x, forward=True):
+        strategy, descs, offsets = plan
+        compute = self.DftiComputeForward if forward else self.DftiComputeBackward
+        if len(offsets) == 1:
+            compute( descs[0], x, y )
+            return
+        def flat(d):
+            arr, isz = d._arr, d._arr.itemsize
+            extent = (d.shape[-1] - 1) * self._fft_distance(d) + int(np.prod(d.shape[:-1]))
+            return np.lib.stride_tricks.as_strided(arr, shape=(extent,), strides=(isz,))
+        def at(arr, offset):
+            v = arr[offset:]
+            return self.dndarray( self, (v.size,1), x.dtype, own=False, data=v )
+        xf, yf = flat(x), flat(y)
+        for xo, yo in offsets:
+            compute( descs[0], at(xf, xo), at(yf, yo) )
+
+    def _get_or_create_rfft_plan(self, y, x, forward=True):
+        """
+        Single batched descriptor for a real-to-complex (`forward`) or
+        complex-to-real transform of `x` into `y`, cached with the complex
+        plans.
+        """
+        real = x if forward else y
+        dims, batch = real.shape[:-1][::-1], real.shape[-1]
+        distances = (self._fft_distance(x), self._fft_distance(y))
+        key = (real.shape, 'r2c' if forward else 'c2r', distances, self.get_max_threads())
+        if key in self._fft_plans:
+            self._fft_plans.move_to_end(key)
+            return self._fft_plans[key]
+        plan = ('batched', [self._create_rfft_desc(dims, batch, distances, forward)])
+        self._fft_plans[key] = plan
+        while len(self._fft_plans) > self._fft_cache_size:
+            old_key, old_plan = self._fft_plans.popitem(last=False)
+            log.debug("evicting fft plan for %s", old_key[0])
+            self._free_fft_plan(old_plan)
+        return plan
+
+    def _run_fft_plan(self, plan, y, x, forward=True):
+        strategy, descs = plan
+        compute = self.DftiComputeForward if forward else self.DftiComputeBackward
+        if strategy == 'batched':
+            compute( descs[0], x, y )
+            return
+        xs, ys = self._fft_columns(x), self._fft_columns(y)
+        def column(arr):
+            return self.dndarray( self, (arr.size,1), x.dtype, own=False, data=arr )
+        def run(desc, cols):
+            for j in cols:
+                compute( desc, column(xs[j]), column(ys[j]) )
+        if strategy == 'loop':
+            run(descs[0], range(len(xs)))
+        else:
+            nparts = len(descs)
+            list(self._thread_pool().map(run, descs, [range(p, len(xs), nparts) for p in range(nparts)]))
+
+    def _thread_pool(self):
+        """ Pool of get_max_threads() workers, rebuilt if that count changes. """
+        nthreads = self.get_max_threads()
+        if self._pool_size != nthreads:
+            if self._pool is not None:
+                self._pool.shutdown()
+            self._pool = ThreadPoolExecutor(max_workers=nthreads)
+            self._pool_size = nthreads
+        return self._pool
+
+    def _fft(self, y, x, forward=True, axes=None):
+        if axes is None:
+            plan = self._get_or_create_fft_plan( y, x )
+            self._run_fft_plan( plan, y, x, forward=forward )
+        else:
+            plan = self._get_or_create_fft_axes_plan( y, x, tuple(axes) )
+            self._run_fft_axes_plan( plan, y, x, forward=forward )
+
+    def _fft_accumulate(self, transform, y, x, alpha=1, beta=0):
+        """
+        y = alpha * transform(x) + beta * y for an unscaled `transform(y, x)`.
+        The plans carry no scale, so one plan serves every alpha: with beta=0
+        alpha is a scal pass over y, and otherwise the transform goes to
+        scratch and ?axpby applies alpha and beta in a single pass.
+        """
+        if beta == 0:
+            transform(y, x)
+            if alpha != 1:
+                for col in self._fft_blas_columns(y, y):
+                    self.scale(col, alpha)
+            return
+        with self.scratch(shape=y.shape, dtype=y.dtype) as tmp:
+            transform(tmp, x)
+            for col, t in zip(self._fft_blas_columns(y, y), self._fft_blas_columns(tmp, y)):
+                self.axpby(beta, col, alpha, t)
+
+    def _fft_blas_columns(self, d, like):
+        """
+        `d` as unit-stride vectors for BLAS: all of it at once, or a column
+        at a time if the columns of `like` are strided.
+        """
+        if self._fft_distance(like) == int(np.prod(like.shape[:-1])):
+            return [d]
+        return [ self.dndarray( self, (col.size,1), d.dtype, own=False, data=col )
+                 for col in self._fft_columns(d) ]
+
+    def fftn(self, y, x, alpha=1, beta=0, axes=None):
+        transform = lambda y, x: self._fft(y, x, forward=True, axes=axes)
+        self._fft_accumulate(transform, y, x, alpha, beta)
+
+    def ifftn(self, y, x, alpha=1, beta=0, axes=None):
+        transform = lambda y, x: self._fft(y, x, forward=False, axes=axes)
+        self._fft_accumulate(transform, y, x, alpha, beta)
+
+    def _rfft(self, y, x, forward=True):
+        plan = self._get_or_create_rfft_plan( y, x, forward )
+        self._run_fft_plan( plan, y, x, forward=forward )
+
+    def rfftn(self, y, x, alpha=1, beta=0):
+        transform = lambda y, x: self._rfft(y, x, forward=True)
+        self._fft_accumulate(transform, y, x, alpha, beta)
+
+    def irfftn(self, y, x, alpha=1, beta=0):
+        assert complex(alpha).imag == 0, "complex-to-real FFT expected real alpha, got %s" % alpha
+        transform = lambda y, x: self._rfft(y, x, forward=False)
+        if len(y.shape) <= 2:
+            return self._fft_accumulate(transform, y, x, alpha, beta)
+        with self.scratch(shape=x.shape) as tmp:
+            tmp.copy(x)
+            self._hermitian_edges(tmp, y.shape[0])
+            self._fft_accumulate(transform, y, tmp, alpha, beta)
+
+    @staticmethod
+    def _hermitian_edges(x, n0):
+        """
+        Makes the planes of half spectrum `x` that are their own mirror image
+        along axis 0 Hermitian over the remaining axes. NumPy's irfftn does
+        this implicitly, whereas MKL's result depends on the discarded parts.
+        """
+        X = x._arr.reshape(x.shape, order='F')
+        axes = tuple(range(X.ndim-2))
+        for e in sorted({0, n0 // 2} if n0 % 2 == 0 else {0}):
+            P = X[e]
+            mirror = np.roll(np.flip(P, axes), 1, axes)
+            P[:] = (P + np.conj(mirror)) / 2
 
     def __del__(self):
-        for desc in self._fft_descs.values():
-            self.DftiFreeDescriptor( byref(desc) )
+        for plan in self._fft_plans.values():
+            self._free_fft_plan(plan)
+        self._fft_plans.clear()
 
     @wrap
     def DftiErrorMessage(
@@ -438,6 +829,69 @@ class MklBackend(Backend):
                 descrA, A_vals, A_indx, A_ptrb, A_ptre,
                 x, ldx, beta, y, ldy)
 
+    # -----------------------------------------------------------------------
+    # BSRMM Routines
+    # -----------------------------------------------------------------------
+    class bsr_matrix(Backend.bsr_matrix):
+        '''
+        Block storage format for MKL backends.
+
+        With one-based indexing, MKL expects the entries of each block in
+        column-major order, whereas scipy stores them row-major. MKL also
+        only supports square blocks.
+        '''
+        _index_base = 1
+        _square_blocks = True
+
+        def __init__(self, backend, A, blocksize=None, name='mat'):
+            super().__init__(backend, A, blocksize=blocksize, name=name)
+            R, C = self.blocksize
+            assert R == C, "MKL only supports square blocks, got %dx%d" % (R, C)
+
+        def _block_layout(self, data):
+            return np.ascontiguousarray(data.transpose((0,2,1))).reshape(-1)
+
+    @wrap
+    def mkl_cbsrmm(
+        transA   : c_char*1,
+        m        : ndpointer(dtype=np.int32,     ndim=0),
+        n        : ndpointer(dtype=np.int32,     ndim=0),
+        k        : ndpointer(dtype=np.int32,     ndim=0),
+        lb       : ndpointer(dtype=np.int32,     ndim=0),
+        alpha    : ndpointer(dtype=np.dtype('complex64'), ndim=1),
+        matdescA : c_char * 6,
+        val      : dndarray,
+        indx     : dndarray,
+        pntrb    : dndarray,
+        pntre    : dndarray,
+        b        : dndarray,
+        ldb      : ndpointer(dtype=np.int32,     ndim=0),
+        beta     : ndpointer(dtype=np.dtype('complex64'), ndim=1),
+        c        : dndarray,
+        ldc      : ndpointer(dtype=np.int32,     ndim=0),
+    ) -> c_void_p :
+        pass
+
+    def cbsrmm(self, y, A_shape, A_blocksize, A_indx, A_ptr, A_vals, x, alpha=1, beta=0, adjoint=False):
+        transA = create_string_buffer(b'C' if adjoint else b'N', size=1)
+
+        ldx = np.array(x._leading_dim, dtype=np.int32)
+        ldy = np.array(y._leading_dim, dtype=np.int32)
+
+        lb    = A_blocksize[0]
+        m     = np.array(A_shape[0] // lb, dtype=np.int32)
+        n     = np.array(x.shape[1],       dtype=np.int32)
+        k     = np.array(A_shape[1] // lb, dtype=np.int32)
+        lb    = np.array(lb,               dtype=np.int32)
+        alpha = np.array([alpha],          dtype=np.dtype('complex64'))
+        beta  = np.array([beta],           dtype=np.dtype('complex64'))
+
+        descrA = create_string_buffer(b'G_NF__', size=6)
+
+        self.mkl_cbsrmm(transA, m, n, k, lb, alpha,
+            descrA, A_vals, A_indx, A_ptr[:-1], A_ptr[1:],
+            x, ldx, beta, y, ldy)
+
     # -----------------------------------------------------------------------
     # DIAMM Routines
     # -----------------------------------------------------------------------
@@ -476,6 +930,11 @@ class MklBackend(Backend):
             A2 = spp.dia_matrix( (np.conj(A.data), -A.offsets ), shape=A.shape[::-1])
             super().__init__(backend, A2, name=name)
 
+    def native_formats(self):
+        # cdiamm goes through mkl_cdiamm, which MKL deprecated along with the
+        # rest of its NIST-style sparse BLAS; DIA stays usable when asked for
+        return super().native_formats() - {'dia'}
+
     def cdiamm(self, y, shape, offsets, data, x, alpha=1.0, beta=0.0, adjoint=False):
         transA = create_string_buffer(b'N' if adjoint else b'C', size=1)
         ldx = np.array(x._leading_dim, dtype=np.int32)
@@ -501,4 +960,5 @@ class MklBackend(Backend):
     @staticmethod
     def max(val, arr):
         from indigo.backends._customcpu import max as fastmax
-        fastmax(arr.size*2, val, arr._arr)
+        n = arr.size * (2 if np.dtype(arr.dtype).kind == 'c' else 1)
+        fastmax(n, val, arr._arr)
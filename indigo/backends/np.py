@@ -1,15 +1,49 @@
+import os
 from ctypes import *
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import scipy.sparse as spp
+from scipy.linalg import blas
 from numpy.ctypeslib import ndpointer
 
+try:
+    import scipy.fft as fft # threaded, and keeps single precision
+    _fft_workers = True
+except ImportError: # scipy < 1.4
+    import numpy.fft as fft
+    _fft_workers = False
+
+try: # unscaled inverses, numpy >= 1.20 and scipy >= 1.6
+    fft.ifftn(np.zeros(1, dtype=np.complex64), norm='forward')
+    _fft_norm_forward = True
+except ValueError:
+    _fft_norm_forward = False
+
+try:
+    from scipy.sparse import _sparsetools
+except ImportError: # scipy < 0.14
+    from scipy.sparse import sparsetools as _sparsetools
+
 from indigo.backends.backend import Backend
 
 class NumpyBackend(Backend):
 
+    # nonzeros (times columns) per thread below which SpMM stays serial
+    _spmm_grain = 1 << 16
+
     def __init__(self, device_id=0):
         super(NumpyBackend, self).__init__()
+        self._pool, self._pool_size = None, 0
+
+    def get_max_threads(self):
+        """ $OMP_NUM_THREADS if set, otherwise the number of usable cores. """
+        n = os.environ.get('OMP_NUM_THREADS')
+        if n:
+            return int(n)
+        if hasattr(os, 'sched_getaffinity'):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
 
     # -----------------------------------------------------------------------
     # Arrays
@@ -54,8 +88,30 @@ class NumpyBackend(Backend):
         """ y = beta*y + alpha*x """
         assert isinstance(x, self.dndarray)
         assert isinstance(y, self.dndarray)
-        x = x._arr.reshape(y._arr.shape, order='F')
-        y._arr[:] = beta * y._arr + alpha * x
+        Y = y._arr
+        X = x._arr.reshape(Y.shape, order='F')
+        if beta == 0:
+            np.multiply(X, alpha, out=Y)
+            return
+        if beta != 1:
+            Y *= beta
+        if alpha == 1:
+            Y += X
+        elif alpha == -1:
+            Y -= X
+        elif alpha != 0:
+            self._axpy(Y, alpha, X)
+
+    @staticmethod
+    def _axpy(Y, alpha, X):
+        """ Y += alpha * X, through BLAS when both are contiguous in the same order. """
+        order = 'F' if Y.flags.f_contiguous else 'C'
+        Yv, Xv = Y.reshape(-1, order=order), X.reshape(-1, order=order)
+        if Y.dtype == X.dtype and np.may_share_memory(Yv, Y) and np.may_share_memory(Xv, X):
+            axpy = blas.get_blas_funcs('axpy', (Yv,))
+            axpy(Xv, Yv, a=alpha)
+        else:
+            Y += alpha * X
 
     def dot(self, x, y):
         """ returns x^T * y """
@@ -93,53 +149,293 @@ class NumpyBackend(Backend):
     # OneMM Routines
     # -----------------------------------------------------------------------
     def onemm(self, y, x, alpha, beta):
-        y._arr[:] = beta * y._arr + alpha * \
-            np.broadcast_to(x._arr.sum(axis=0, keepdims=True), y.shape)
+        X = x._arr.reshape( x.shape, order='F' )
+        Y = y._arr.reshape( y.shape, order='F' )
+        s = X.sum(axis=0, keepdims=True)
+        s *= alpha
+        if beta == 0:
+            Y[...] = s
+        else:
+            if beta != 1:
+                Y *= beta
+            Y += s
 
     # -----------------------------------------------------------------------
     # FFT Routines
     # -----------------------------------------------------------------------
-    def fftn(self, y, x):
+    def _fft_kwargs(self):
+        return dict(workers=self.get_max_threads()) if _fft_workers else dict()
+
+    @staticmethod
+    def _ifft_unscaled(alpha, shape):
+        """
+        Keyword arguments and factor that leave an inverse transform of
+        `shape` unscaled: norm='forward' where supported, otherwise the
+        transform size folded into `alpha`.
+        """
+        if _fft_norm_forward:
+            return dict(norm='forward'), alpha
+        return dict(), alpha * int(np.prod(shape))
+
+    @staticmethod
+    def _fft_accumulate_into(Y, F, alpha, beta):
+        """ Y = alpha * F + beta * Y, reusing the transform's output F. """
+        if alpha != 1:
+            F *= alpha
+        if beta == 0:
+            Y[...] = F
+        else:
+            if beta != 1:
+                Y *= beta
+            Y += F
+
+    def fftn(self, y, x, alpha=1, beta=0, axes=None):
+        X = x._arr.reshape( x.shape, order='F' )
+        Y = y._arr.reshape( y.shape, order='F' )
+        axes = axes or tuple(range(X.ndim-1))
+        F = fft.fftn(X, axes=axes, **self._fft_kwargs())
+        self._fft_accumulate_into(Y, F, alpha, beta)
+
+    def ifftn(self, y, x, alpha=1, beta=0, axes=None):
         X = x._arr.reshape( x.shape, order='F' )
         Y = y._arr.reshape( y.shape, order='F' )
-        ndim = X.ndim-1
-        axes = tuple(range(ndim))
-        Y[:] = np.fft.fftn(X, axes=axes)
+        axes = axes or tuple(range(X.ndim-1))
+        norm, alpha = self._ifft_unscaled(alpha, [X.shape[a] for a in axes])
+        F = fft.ifftn(X, axes=axes, **norm, **self._fft_kwargs())
+        self._fft_accumulate_into(Y, F, alpha, beta)
 
-    def ifftn(self, y, x):
+    def rfftn(self, y, x, alpha=1, beta=0):
         X = x._arr.reshape( x.shape, order='F' )
         Y = y._arr.reshape( y.shape, order='F' )
-        ndim = X.ndim-1
-        axes = tuple(range(ndim))
-        scale = np.prod( X.shape[:ndim] )
-        Y[:] = np.fft.ifftn(X, axes=axes) * scale
+        # rfftn halves the last of `axes`; ours is axis 0
+        axes = tuple(reversed(range(X.ndim-1)))
+        F = fft.rfftn(X, axes=axes, **self._fft_kwargs())
+        self._fft_accumulate_into(Y, F, alpha, beta)
+
+    def irfftn(self, y, x, alpha=1, beta=0):
+        X = x._arr.reshape( x.shape, order='F' )
+        Y = y._arr.reshape( y.shape, order='F' )
+        axes = tuple(reversed(range(Y.ndim-1)))
+        s = [Y.shape[a] for a in axes]
+        norm, alpha = self._ifft_unscaled(alpha, s)
+        F = fft.irfftn(X, s=s, axes=axes, **norm, **self._fft_kwargs())
+        self._fft_accumulate_into(Y, F, alpha, beta)
 
     # -----------------------------------------------------------------------
     # CSRMM Routine
     # -----------------------------------------------------------------------
+    class csr_matrix(Backend.csr_matrix):
+        """
+        Keeps a scipy view of the device arrays, plus the conjugate transpose
+        built on first adjoint, so products don't rebuild either per call.
+        """
+        def __init__(self, backend, A, name='mat'):
+            super(NumpyBackend.csr_matrix, self).__init__(backend, A, name=name)
+            self._A = spp.csr_matrix((self.values._arr, self.colInds._arr,
+                self.rowPtrs._arr), shape=self.shape)
+            self._AH = None
+
+        def forward(self, y, x, alpha=1, beta=0):
+            """ y[:] = A * x """
+            assert x.dtype == np.dtype("complex64"), "Bad dtype: expected complex64, got %s" % x.dtype
+            assert y.dtype == np.dtype("complex64"), "Bad dtype: expected complex64, got %s" % y.dtype
+            self._backend._spmm(y, self._A, x, alpha, beta)
+
+        def adjoint(self, y, x, alpha=1, beta=0):
+            """ y[:] = A.H * x """
+            assert x.dtype == np.dtype("complex64"), "Bad dtype: expected complex64, got %s" % x.dtype
+            assert y.dtype == np.dtype("complex64"), "Bad dtype: expected complex64, got %s" % y.dtype
+            if self._AH is None:
+                self._AH = self._A.conj().T.tocsr()
+            self._backend._spmm(y, self._AH, x, alpha, beta)
+
+    def _thread_pool(self):
+        """ Pool of get_max_threads() workers, rebuilt if that count changes. """
+        nthreads = self.get_max_threads()
+        if self._pool_size != nthreads:
+            if self._pool is not None:
+                self._pool.shutdown()
+            self._pool = ThreadPoolExecutor(max_workers=nthreads)
+            self._pool_size = nthreads
+        return self._pool
+
+    def _row_blocks(self, indptr, work):
+        """
+        Splits the rows of `indptr` into at most get_max_threads() ranges of
+        similar nonzero counts, each worth at least `_spmm_grain` of `work`.
+        """
+        nrows, nnz = len(indptr) - 1, indptr[-1]
+        nblocks = min(self.get_max_threads(), work // self._spmm_grain, nrows)
+        if nblocks <= 1:
+            return [(0, nrows)]
+        bounds = np.searchsorted(indptr, np.linspace(0, nnz, nblocks+1)[1:-1])
+        bounds = np.unique(np.r_[0, bounds, nrows])
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _spmm(self, y, A, x, alpha, beta):
+        """
+        y = alpha * A * x + beta * y for a scipy csr, bsr or dia matrix `A`,
+        accumulating into y with scipy's matvec kernels. Several columns go
+        through csr and bsr matrices in one pass, on row-major copies of x
+        and y. Those kernels release the GIL, so csr and bsr matrices are
+        split into row blocks that run concurrently.
+        """
+        X = x._arr.reshape( x.shape, order='F' )
+        Y = y._arr.reshape( y.shape, order='F' )
+        if beta == 0:
+            Y[...] = 0
+        if alpha == 0:
+            if beta not in (0, 1):
+                Y *= beta
+            return
+        if beta not in (0, alpha):
+            Y *= beta / alpha # so one final scaling by alpha yields beta * Y
+        (M, N), K = A.shape, X.shape[1]
+        if A.format == 'csr':
+            blocks = self._row_blocks(A.indptr, A.nnz * K)
+            matvec = lambda X, Y, r0, r1: _sparsetools.csr_matvec(r1-r0, N,
+                A.indptr[r0:r1+1], A.indices, A.data, X, Y[r0:r1])
+            matvecs = lambda X, Y, r0, r1: _sparsetools.csr_matvecs(r1-r0, N, K,
+                A.indptr[r0:r1+1], A.indices, A.data, X.ravel(), Y[r0:r1].ravel())
+        elif A.format == 'bsr':
+            R, C = A.blocksize
+            blocks = self._row_blocks(A.indptr, A.data.size * K)
+            matvec = lambda X, Y, r0, r1: _sparsetools.bsr_matvec(r1-r0, N // C, R, C,
+                A.indptr[r0:r1+1], A.indices, A.data.ravel(), X, Y[r0*R:r1*R])
+            matvecs = lambda X, Y, r0, r1: _sparsetools.bsr_matvecs(r1-r0, N // C, K, R, C,
+                A.indptr[r0:r1+1], A.indices, A.data.ravel(), X.ravel(), Y[r0*R:r1*R].ravel())
+        elif A.format == 'dia':
+            blocks = [(0, M)]
+            matvec = lambda X, Y, r0, r1: _sparsetools.dia_matvec(M, N,
+                len(A.offsets), A.data.shape[1], A.offsets, A.data, X, Y)
+            matvecs = None
+        else:
+            raise NotImplementedError(A.format)
+        if K > 1 and matvecs is not None:
+            Xc, Yc = np.ascontiguousarray(X), np.ascontiguousarray(Y)
+            run = lambda block: matvecs(Xc, Yc, *block)
+        else:
+            Yc = Y
+            def run(block):
+                for k in range(K):
+                    matvec(X[:,k], Y[:,k], *block)
+        if len(blocks) == 1:
+            run(blocks[0])
+        else:
+            list(self._thread_pool().map(run, blocks))
+        if Yc is not Y:
+            np.multiply(Yc, alpha, out=Y)
+        elif alpha != 1:
+            Y *= alpha
+
     def ccsrmm(self, y, A_shape, A_indx, A_ptr, A_vals, x, alpha, beta, adjoint=False, exwrite=False):
         A = spp.csr_matrix((A_vals._arr, A_indx._arr, A_ptr._arr), shape=A_shape)
-        X = x._arr.reshape( x.shape, order='F')
-        Y = y._arr.reshape( y.shape, order='F')
-        if adjoint:
-            Y[:] = alpha * (A.H @ X) + beta * Y
-        else:
-            Y[:] = alpha * (A @ X) + beta * Y
+        self._spmm(y, A.conj().T.tocsr() if adjoint else A, x, alpha, beta)
+
+    def ccsr16mm(self, y, A_shape, A_base, A_delta, A_ptr, A_vals, x, alpha=1, beta=0, adjoint=False, exwrite=False):
+        ptr = A_ptr._arr
+        cols = np.repeat(A_base._arr, np.diff(ptr)) + A_delta._arr
+        A = spp.csr_matrix((A_vals._arr, cols, ptr), shape=A_shape)
+        self._spmm(y, A.conj().T.tocsr() if adjoint else A, x, alpha, beta)
+
+    def clutmm(self, y, A_shape, A_indx, A_ptr, A_lut, A_table, x, alpha=1, beta=0, adjoint=False, exwrite=False):
+        cols = A_indx._arr
+        vals = A_table._arr[ A_lut._arr.reshape((cols.size, A_lut.size // max(cols.size, 1))) ].prod(axis=1)
+        A = spp.csr_matrix((vals, cols, A_ptr._arr), shape=A_shape)
+        self._spmm(y, A.conj().T.tocsr() if adjoint else A, x, alpha, beta)
+
+    class dia_matrix(Backend.dia_matrix):
+        """
+        Keeps a scipy view of the device arrays, plus the conjugate transpose
+        built on first adjoint, so products don't rebuild either per call.
+        """
+        def __init__(self, backend, A, name='mat'):
+            super(NumpyBackend.dia_matrix, self).__init__(backend, A, name=name)
+            self._A = spp.dia_matrix((self.data._arr.T, self.offsets._arr), shape=self.shape)
+            self._AH = None
+
+        def forward(self, y, x, alpha=1, beta=0):
+            """ y[:] = A * x """
+            self._backend._spmm(y, self._A, x, alpha, beta)
+
+        def adjoint(self, y, x, alpha=1, beta=0):
+            """ y[:] = A.H * x """
+            if self._AH is None:
+                self._AH = self._A.conj().T.todia()
+            self._backend._spmm(y, self._AH, x, alpha, beta)
 
     def cdiamm(self, y, shape, offsets, data, x, alpha=1.0, beta=0.0, adjoint=True):
         A = spp.dia_matrix((data._arr.T, offsets._arr), shape=shape)
+        self._spmm(y, A.conj().T.todia() if adjoint else A, x, alpha, beta)
+
+    class bsr_matrix(Backend.bsr_matrix):
+        """
+        Keeps a scipy view of the device arrays, plus the conjugate transpose
+        built on first adjoint, so products don't rebuild either per call.
+        """
+        def __init__(self, backend, A, blocksize=None, name='mat'):
+            super(NumpyBackend.bsr_matrix, self).__init__(backend, A, blocksize=blocksize, name=name)
+            data = self.values._arr.reshape((-1,) + tuple(self.blocksize))
+            self._A = spp.bsr_matrix((data, self.colInds._arr, self.rowPtrs._arr), shape=self.shape)
+            self._AH = None
+
+        def forward(self, y, x, alpha=1, beta=0):
+            """ y[:] = A * x """
+            self._backend._spmm(y, self._A, x, alpha, beta)
+
+        def adjoint(self, y, x, alpha=1, beta=0):
+            """ y[:] = A.H * x """
+            if self._AH is None:
+                self._AH = self._A.conj().T.tobsr()
+            self._backend._spmm(y, self._AH, x, alpha, beta)
+
+    def cbsrmm(self, y, A_shape, A_blocksize, A_indx, A_ptr, A_vals, x, alpha=1, beta=0, adjoint=False):
+        data = A_vals._arr.reshape((-1,) + tuple(A_blocksize))
+        A = spp.bsr_matrix((data, A_indx._arr, A_ptr._arr), shape=A_shape)
+        self._spmm(y, A.conj().T.tobsr() if adjoint else A, x, alpha, beta)
+
+    def cselmm(self, y, A_shape, A_indx, x, alpha=1, beta=0, adjoint=False):
+        cols = A_indx._arr
+        rows = np.flatnonzero(cols >= 0)
         X = x._arr.reshape( x.shape, order='F' )
         Y = y._arr.reshape( y.shape, order='F' )
         if adjoint:
-            Y[:] = alpha * (A.H @ X) + beta * Y
+            Y *= beta
+            Y[cols[rows]] += alpha * X[rows]
+        else:
+            Y *= beta
+            Y[rows] += alpha * X[cols[rows]]
+
+    def csepdiagmm(self, y, factors, x, alpha=1, beta=0, adjoint=False, shift=None):
+        f0, f1, f2 = (np.conj(f._arr) if adjoint else f._arr for f in factors)
+        grid = (f0.size, f1.size, f2.size, x.shape[1])
+        X = x._arr.reshape( x.shape, order='F' ).reshape( grid, order='F' )
+        if shift is not None:
+            X = np.fft.fftshift(X, axes=[a for a in range(3) if shift[a]])
+        Y = y._arr.reshape( y.shape, order='F' ).reshape( grid, order='F' )
+        f12 = alpha * np.multiply.outer(f1, f2)[None,:,:,None]
+        if beta == 0:
+            np.multiply(X, f0[:,None,None,None], out=Y)
+            Y *= f12
         else:
-            Y[:] = alpha * (A @ X) + beta * Y
+            Y *= beta
+            Y += X * f0[:,None,None,None] * f12
+
+    def cgridmm(self, y, N, width, table, coord, bins, x, alpha=1, beta=0, adjoint=False):
+        from indigo.interp import grid_mm
+        X = x._arr.reshape( x.shape, order='F' )
+        Y = y._arr.reshape( y.shape, order='F' )
+        grid_mm(Y, N, width, table._arr, coord._arr, tuple(a._arr for a in bins),
+            X, alpha=alpha, beta=beta, adjoint=adjoint)
 
     # -----------------------------------------------------------------------
     # Misc Routines
     # -----------------------------------------------------------------------
     @staticmethod
     def max(val, arr):
-        mr = np.maximum(arr._arr.real, val)
-        mi = np.maximum(arr._arr.imag, val)
-        arr._arr[:] = mr + 1j * mi
+        if np.dtype(arr.dtype).kind != 'c':
+            np.maximum(arr._arr, val, out=arr._arr)
+            return
+        A = arr._arr
+        np.maximum(A.real, val, out=A.real)
+        np.maximum(A.imag, val, out=A.imag)
@@ -180,6 +180,175 @@ def test_fft(backend, batch, x, y, z):
     np.testing.assert_allclose(v, v_act / (x*y*z), atol=1e-6)
 
 
+@pytest.mark.parametrize("backend,batch,x,y,z",
+    product( BACKENDS, [1,3], [6,7], [4,5], [1,3] )
+)
+def test_rfft(backend, batch, x, y, z):
+    b = backend()
+    if getattr(b.rfftn, '__isabstractmethod__', False):
+        pytest.skip("backend does not implement real FFTs")
+    N, H = (x, y, z), (x//2+1, y, z)
+    ax = (2,1,0)
+    v = np.require(np.random.rand(*N, batch), dtype=np.float32, requirements='F')
+    w = indigo.util.rand64c(*H, batch)
+
+    w_d = b.zero_array(H + (batch,), dtype=np.complex64)
+    b.rfftn(w_d, b.copy_array(v))
+    np.testing.assert_allclose(w_d.to_host(), np.fft.rfftn(v, axes=ax), rtol=1e-4, atol=1e-4)
+
+    v_d = b.zero_array(N + (batch,), dtype=np.float32)
+    w_d = b.copy_array(w)
+    b.irfftn(v_d, w_d)
+    v_exp = np.fft.irfftn(w, s=N[::-1], axes=ax) * (x*y*z)
+    np.testing.assert_allclose(v_d.to_host(), v_exp, rtol=1e-4, atol=1e-4)
+    np.testing.assert_equal(w_d.to_host(), w)
+
+
+@pytest.mark.parametrize("backend,axes,inplace",
+    product( BACKENDS, [(0,),(1,),(2,),(0,1),(1,2),(0,2)], [False,True] )
+)
+def test_fft_axes(backend, axes, inplace):
+    b = backend()
+    N = (7, 6, 5, 3)
+    v = indigo.util.rand64c(*N)
+    n = np.prod([N[a] for a in axes])
+
+    v_d = b.copy_array(v)
+    u_d = v_d if inplace else b.zero_array(N, dtype=v.dtype)
+    try:
+        b.fftn(u_d, v_d, axes=axes)
+    except NotImplementedError:
+        pytest.skip("backend does not transform along axes %s" % (axes,))
+    np.testing.assert_allclose(u_d.to_host(), np.fft.fftn(v, axes=axes), rtol=1e-4, atol=1e-4)
+
+    v_d = b.copy_array(v)
+    u_d = v_d if inplace else b.zero_array(N, dtype=v.dtype)
+    b.ifftn(u_d, v_d, axes=axes)
+    np.testing.assert_allclose(u_d.to_host(), np.fft.ifftn(v, axes=axes) * n, rtol=1e-4, atol=1e-4)
+
+
+def test_numpy_fft_threads(monkeypatch):
+    from indigo.backends.np import NumpyBackend
+    monkeypatch.setenv('OMP_NUM_THREADS', '3')
+    b = NumpyBackend()
+    assert b.get_max_threads() == 3
+    v = indigo.util.rand64c(16, 12, 4)
+    u_d = b.zero_array(v.shape, dtype=v.dtype)
+    b.fftn(u_d, b.copy_array(v), alpha=2)
+    assert u_d.to_host().dtype == np.complex64
+    np.testing.assert_allclose(u_d.to_host(), 2*np.fft.fftn(v, axes=(0,1)), rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("norm_forward", [False,True])
+def test_numpy_ifft_norm(monkeypatch, norm_forward):
+    import indigo.backends.np
+    monkeypatch.setattr(indigo.backends.np, '_fft_norm_forward', norm_forward)
+    b = indigo.backends.np.NumpyBackend()
+    v = indigo.util.rand64c(6, 5, 2)
+    u_d = b.zero_array(v.shape, dtype=v.dtype)
+    b.ifftn(u_d, b.copy_array(v), alpha=2)
+    np.testing.assert_allclose(u_d.to_host(), 60*np.fft.ifftn(v, axes=(0,1)), rtol=1e-4, atol=1e-4)
+    r = indigo.util.rand64c(6, 5, 2).real.astype(np.float32, order='F')
+    c_d = b.zero_array((4, 5, 2), dtype=np.complex64)
+    b.rfftn(c_d, b.copy_array(r))
+    r_d = b.zero_array(r.shape, dtype=r.dtype)
+    b.irfftn(r_d, c_d)
+    np.testing.assert_allclose(r_d.to_host(), 30*r, rtol=1e-4, atol=1e-4)
+
+
+def test_numpy_spmatrix_cache():
+    from indigo.backends.np import NumpyBackend
+    b = NumpyBackend()
+    M, N, K = 22, 33, 4
+    A = indigo.util.randM(M, N, 0.5)
+    A_d = b.csr_matrix(b, A)
+    assert np.shares_memory(A_d._A.data, A_d.values._arr)
+    x = indigo.util.rand64c(M, K)
+    y = indigo.util.rand64c(N, K)
+    y_d = b.copy_array(y)
+    A_d.adjoint(y_d, b.copy_array(x), alpha=2, beta=0.5)
+    AH = A_d._AH
+    A_d.adjoint(y_d, b.copy_array(x), alpha=0, beta=1)
+    assert A_d._AH is AH
+    np.testing.assert_allclose(y_d.to_host(), 0.5*y + 2*(A.H @ x), rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("nthreads,K,adjoint",
+    product( [1,3,8], [1,5], [False,True] )
+)
+def test_numpy_spmm_threads(monkeypatch, nthreads, K, adjoint):
+    from indigo.backends.np import NumpyBackend
+    monkeypatch.setenv('OMP_NUM_THREADS', str(nthreads))
+    b = NumpyBackend()
+    b._spmm_grain = 1
+    M, N = 37, 29
+    A = indigo.util.randM(M, N, 0.3)
+    A_d = b.csr_matrix(b, A)
+    blocks = b._row_blocks(A_d._A.indptr, A.nnz)
+    assert blocks[0][0] == 0 and blocks[-1][1] == M and len(blocks) <= nthreads
+    A = A.H if adjoint else A
+    x = indigo.util.rand64c(A.shape[1], K)
+    y = indigo.util.rand64c(A.shape[0], K)
+    y_d = b.copy_array(y)
+    (A_d.adjoint if adjoint else A_d.forward)(y_d, b.copy_array(x), alpha=1.5, beta=0.5)
+    np.testing.assert_allclose(y_d.to_host(), 0.5*y + 1.5*(A @ x), rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("backend,strategy,inplace,batch",
+    product( BACKENDS, ['batched','loop','split'], [False,True], [1,3] )
+)
+def test_fft_strategy(backend, strategy, inplace, batch):
+    b = backend()
+    if not hasattr(b, '_fft_strategies'):
+        pytest.skip("backend does not choose an FFT batching strategy")
+    b._fft_strategies = (strategy,)
+    N = (7, 6, 5, batch)
+    v = indigo.util.rand64c(*N)
+    ax = (0,1,2)
+
+    v_d = b.copy_array(v)
+    u_d = v_d if inplace else b.zero_array(N, dtype=v.dtype)
+    b.fftn(u_d, v_d)
+    np.testing.assert_allclose(u_d.to_host(), np.fft.fftn(v, axes=ax), rtol=1e-4, atol=1e-4)
+
+    v_d = b.copy_array(v)
+    u_d = v_d if inplace else b.zero_array(N, dtype=v.dtype)
+    b.ifftn(u_d, v_d)
+    np.testing.assert_allclose(u_d.to_host(), np.fft.ifftn(v, axes=ax) * 210, rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_fft_plan_cache(backend):
+    b = backend()
+    if not hasattr(b, '_fft_cache_size'):
+        pytest.skip("backend does not cache FFT plans")
+    b._fft_cache_size = 2
+    for n in (4, 5, 6, 4):
+        v = indigo.util.rand64c(n, 3, 2)
+        u_d = b.zero_array(v.shape, dtype=v.dtype)
+        b.fftn(u_d, b.copy_array(v))
+        np.testing.assert_allclose(u_d.to_host(), np.fft.fftn(v, axes=(0,1)), rtol=1e-4, atol=1e-4)
+    assert [key[0] for key in b._fft_plans] == [(6,3,2), (4,3,2)]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_fft_plan_per_scale(backend):
+    b = backend()
+    if not hasattr(b, '_calibrate_fft_strategy'):
+        pytest.skip("backend does not calibrate FFT strategies")
+    calls = []
+    calibrate = b._calibrate_fft_strategy
+    b._calibrate_fft_strategy = lambda *args: calls.append(args) or calibrate(*args)
+    v = indigo.util.rand64c(6, 5, 3)
+    for alpha, beta in ((1, 0), (2, 0), (0.5, 0), (0.5, 0.5), (1j, 1)):
+        w = indigo.util.rand64c(*v.shape)
+        u_d = b.copy_array(w)
+        b.fftn(u_d, b.copy_array(v), alpha=alpha, beta=beta)
+        np.testing.assert_allclose(u_d.to_host(), alpha * np.fft.fftn(v, axes=(0,1)) + beta * w, rtol=1e-4, atol=1e-4)
+    assert len(calls) == 1
+    assert len(b._fft_plans) == 1
+
+
 @pytest.mark.parametrize("backend,M,N,K,density",
     product( BACKENDS, [23,45], [45,23], [1,8,9,17], [0.01,0.1,0.5] )
 )
@@ -210,6 +379,32 @@ def test_csr_matrix(backend, M, N, K, density):
     np.testing.assert_allclose(y_exp, y_act, atol=1e-5)
 
 
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_csr_matrix_shared_pattern(backend):
+    import gc
+    b = backend()
+    A = indigo.util.randM(30, 20, 0.2)
+    B = A.copy()
+    B.data = indigo.util.rand64c(B.nnz)
+    C = indigo.util.randM(30, 20, 0.2)
+
+    A_d, B_d, C_d = [b.csr_matrix(b, M, name=n) for M, n in zip((A,B,C), 'ABC')]
+    assert A_d.rowPtrs is B_d.rowPtrs and A_d.colInds is B_d.colInds
+    assert A_d.values is not B_d.values
+    assert A_d.colInds is not C_d.colInds
+
+    for M, M_d in ((A, A_d), (B, B_d)):
+        x = indigo.util.rand64c(20,3)
+        y_d = b.zero_array((30,3), np.complex64)
+        M_d.forward(y_d, b.copy_array(x))
+        np.testing.assert_allclose(y_d.to_host(), M @ x, atol=1e-5)
+
+    del A_d, B_d, C_d, M_d
+    gc.collect()
+    assert len(b._patterns) == 0
+
+
+
 @pytest.mark.parametrize("backend,M,N,K,alpha,beta,stack",
     product( BACKENDS, [23,45], [1,8,9,17], [18,19], [0.0,0.5,1.0,1.5], [0.0,0.5,1.0,1.5], [1,2,5] )
 )
@@ -330,6 +525,29 @@ def test_blas_axpby(backend, n, alpha, alpha_i, beta):
     np.testing.assert_allclose(y_exp, y_act, atol=1e-6)
 
 
+@pytest.mark.parametrize("backend,n",
+    product(BACKENDS, [10,23,129,144])
+)
+def test_blas_real(backend, n):
+    b = backend()
+    x = np.require(np.random.rand(n) - 0.5, dtype=np.float32, requirements='F')
+    y = np.require(np.random.rand(n) - 0.5, dtype=np.float32, requirements='F')
+    x_d = b.copy_array(x)
+    y_d = b.copy_array(y)
+
+    np.testing.assert_allclose(b.dot(x_d, y_d), np.dot(x, y), rtol=1e-4)
+    np.testing.assert_allclose(b.norm2(x_d), np.dot(x, x), rtol=1e-4)
+
+    b.axpby(0.5, y_d, -2, x_d)
+    np.testing.assert_allclose(y_d.to_host(), 0.5*y - 2*x, rtol=1e-5, atol=1e-6)
+
+    b.scale(x_d, 1.5)
+    np.testing.assert_allclose(x_d.to_host(), 1.5*x, rtol=1e-5)
+
+    b.max(0, x_d)
+    np.testing.assert_allclose(x_d.to_host(), np.maximum(1.5*x, 0), rtol=1e-5)
+
+
 @pytest.mark.parametrize("backend,m,n,k,alpha,beta,forward",
     product(BACKENDS, [10,23,129,144],
                       [10,23,129,144],
@@ -375,6 +593,23 @@ def test_iter_cg(backend, m):
     b.cg(M, y, x, maxiter=2)
 
 
+@pytest.mark.parametrize("backend,m",
+    product(BACKENDS, [10,23,129,144])
+)
+def test_iter_cg_real(backend, m):
+    b = backend()
+    if getattr(b.rfftn, '__isabstractmethod__', False):
+        pytest.skip("backend does not implement real FFTs")
+    R = b.RealFFT((m,))
+    x = np.zeros((m,1), dtype=np.float32)
+    y = np.require(np.random.rand(m,1), dtype=np.float32)
+
+    # R.H * R has two distinct eigenvalues, m/2 and m
+    A = R.H * R
+    b.cg(A, y, x, maxiter=2)
+    np.testing.assert_allclose(A * x, y, rtol=1e-4, atol=1e-5)
+
+
 @pytest.mark.parametrize("backend,m",
     product(BACKENDS, [10,23,129,144])
 )
@@ -521,3 +756,233 @@ def test_csymm(backend, m, k, alpha, beta, forward, left):
 
     y_act = y_d.to_host()
     np.testing.assert_allclose(y_exp, y_act, atol=1e-5)
+
+
+@pytest.mark.parametrize("backend,MB,KB,N,R,density,alpha,beta",
+    product( BACKENDS, [5,11], [7,12], [1,8,9], [2,3,4], [0.1,0.5], [0,0.5,1.0], [0,0.5,1.0] )
+)
+def test_bsr_matrix(backend, MB, KB, N, R, density, alpha, beta):
+    b = backend()
+    if getattr(b.cbsrmm, '__isabstractmethod__', False):
+        pytest.skip("backed <%s> doesn't implement cbsrmm" % backend.__name__)
+    A = indigo.util.randM(MB, KB, density)
+    A = spp.kron(A, indigo.util.rand64c(R,R)).tobsr(blocksize=(R,R))
+    A_d = b.bsr_matrix(b, A)
+    M, K = A.shape
+
+    # forward
+    x = indigo.util.rand64c(K,N)
+    y = indigo.util.rand64c(M,N)
+    x_d = b.copy_array(x)
+    y_d = b.copy_array(y)
+    A_d.forward(y_d, x_d, alpha=alpha, beta=beta)
+    y_exp = beta * y + alpha * (A @ x)
+    np.testing.assert_allclose(y_d.to_host(), y_exp, atol=1e-4)
+
+    # adjoint
+    x = indigo.util.rand64c(M,N)
+    y = indigo.util.rand64c(K,N)
+    x_d = b.copy_array(x)
+    y_d = b.copy_array(y)
+    A_d.adjoint(y_d, x_d, alpha=alpha, beta=beta)
+    y_exp = beta * y + alpha * (A.getH() @ x)
+    np.testing.assert_allclose(y_d.to_host(), y_exp, atol=1e-4)
+
+
+@pytest.mark.parametrize("backend,MB,R,N,alpha,beta",
+    product( BACKENDS, [5,11], [4,6,8,16,20], [1,3], [0.5,1.0], [0,0.5] )
+)
+def test_bsr_matrix_tall(backend, MB, R, N, alpha, beta):
+    b = backend()
+    if getattr(b.cbsrmm, '__isabstractmethod__', False) or b.bsr_matrix._square_blocks:
+        pytest.skip("backed <%s> doesn't take non-square blocks" % backend.__name__)
+    K = 13
+    A = spp.vstack([indigo.util.randM(MB, K, 0.3) for r in range(R)]).tocsr()
+    A = A[np.arange(MB*R).reshape(R, MB).T.ravel()].tobsr(blocksize=(R,1))
+    A_d = b.bsr_matrix(b, A)
+
+    x = indigo.util.rand64c(K,N)
+    y = indigo.util.rand64c(MB*R,N)
+    y_d = b.copy_array(y)
+    A_d.forward(y_d, b.copy_array(x), alpha=alpha, beta=beta)
+    np.testing.assert_allclose(y_d.to_host(), beta * y + alpha * (A @ x), atol=1e-4)
+
+    x = indigo.util.rand64c(MB*R,N)
+    y = indigo.util.rand64c(K,N)
+    y_d = b.copy_array(y)
+    A_d.adjoint(y_d, b.copy_array(x), alpha=alpha, beta=beta)
+    np.testing.assert_allclose(y_d.to_host(), beta * y + alpha * (A.getH() @ x), atol=1e-4)
+
+
+@pytest.mark.parametrize("backend,shift,adjoint,beta",
+    product( BACKENDS, list(product([0,1],[0,1],[0,1]))[1:], [False,True], [0,0.5] )
+)
+def test_sepdiag_shift(backend, shift, adjoint, beta):
+    b = backend()
+    if getattr(b.csepdiagmm, '__isabstractmethod__', False):
+        pytest.skip("backed <%s> doesn't implement csepdiagmm" % backend.__name__)
+    N, B = (6, 4, 10), 3
+    factors = [indigo.util.rand64c(n) for n in N]
+    x = indigo.util.rand64c(np.prod(N), B)
+    y = indigo.util.rand64c(np.prod(N), B)
+    d = np.kron(factors[2], np.kron(factors[1], factors[0]))
+    axes = [a for a in range(3) if shift[a]]
+    X = np.fft.fftshift(x.reshape(N + (B,), order='F'), axes=axes).reshape((-1,B), order='F')
+    y_exp = 2 * (np.conj(d) if adjoint else d)[:,None] * X + beta * y
+
+    x_d = b.copy_array(x)
+    y_d = b.copy_array(y)
+    b.csepdiagmm(y_d, [b.copy_array(f) for f in factors], x_d, alpha=2, beta=beta, adjoint=adjoint, shift=shift)
+    np.testing.assert_allclose(y_d.to_host(), y_exp, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("backend,M,K,N,alpha,beta",
+    product( BACKENDS, [1,23,45], [23,45], [1,8,9], [0,0.5,1.0], [0,0.5,1.0] )
+)
+def test_sel_matrix(backend, M, K, N, alpha, beta):
+    b = backend()
+    if getattr(b.cselmm, '__isabstractmethod__', False):
+        pytest.skip("backed <%s> doesn't implement cselmm" % backend.__name__)
+    nsel = min(M, K) // 2 + 1
+    rows = np.random.choice(M, nsel, replace=False)
+    cols = np.random.choice(K, nsel, replace=False)
+    A = spp.csr_matrix( (np.ones(nsel), (rows, cols)), shape=(M,K), dtype=np.complex64 )
+    A_d = b.sel_matrix(b, A)
+    assert A_d.nnz == nsel
+
+    # forward
+    x = indigo.util.rand64c(K,N)
+    y = indigo.util.rand64c(M,N)
+    x_d = b.copy_array(x)
+    y_d = b.copy_array(y)
+    A_d.forward(y_d, x_d, alpha=alpha, beta=beta)
+    np.testing.assert_allclose(y_d.to_host(), beta * y + alpha * (A @ x), atol=1e-5)
+
+    # adjoint
+    x = indigo.util.rand64c(M,N)
+    y = indigo.util.rand64c(K,N)
+    x_d = b.copy_array(x)
+    y_d = b.copy_array(y)
+    A_d.adjoint(y_d, x_d, alpha=alpha, beta=beta)
+    np.testing.assert_allclose(y_d.to_host(), beta * y + alpha * (A.H @ x), atol=1e-5)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_sel_matrix_keeps_input(backend):
+    b = backend()
+    if getattr(b.cselmm, '__isabstractmethod__', False):
+        pytest.skip("backed <%s> doesn't implement cselmm" % backend.__name__)
+    # row 0 selects column 2 through two duplicate halves
+    A = spp.csr_matrix( (np.array([0.5, 0.5, 1], dtype=np.complex64),
+        np.array([2, 2, 0]), np.array([0, 2, 3, 3])), shape=(3,3) )
+    A_d = b.sel_matrix(b, A)
+    assert A_d.nnz == 2
+    assert A.nnz == 3 and not A.has_canonical_format
+
+
+@pytest.mark.parametrize("backend,M,K,N,alpha,beta",
+    product( BACKENDS, [1,23,300], [23,70000], [1,8,9], [0,0.5,1.0], [0,0.5,1.0] )
+)
+def test_csr16_matrix(backend, M, K, N, alpha, beta):
+    b = backend()
+    if getattr(b.ccsr16mm, '__isabstractmethod__', False):
+        pytest.skip("backed <%s> doesn't implement ccsr16mm" % backend.__name__)
+    # clustered columns: each row spans at most 2**16-1 columns from a random start
+    rowCounts = np.random.randint(0, 5, M)
+    starts = np.random.randint(0, K, M)
+    colInds = np.concatenate([ (s + np.random.randint(0, 2**16, c)) % K if K > 2**16 else
+        np.random.randint(0, K, c) for s, c in zip(starts, rowCounts) ]).astype(np.int32)
+    rowPtrs = np.concatenate( [np.array([0]), np.cumsum(rowCounts)] )
+    A = spp.csr_matrix( (indigo.util.rand64c(*colInds.shape), colInds, rowPtrs), shape=(M,K) )
+    if b.csr16_matrix.row_span(A) >= 2**16:
+        with pytest.raises(AssertionError):
+            b.csr16_matrix(b, A)
+        return
+    A_d = b.csr16_matrix(b, A)
+    assert A_d.colDelta.dtype == np.uint16
+
+    # forward
+    x = indigo.util.rand64c(K,N)
+    y = indigo.util.rand64c(M,N)
+    x_d = b.copy_array(x)
+    y_d = b.copy_array(y)
+    A_d.forward(y_d, x_d, alpha=alpha, beta=beta)
+    np.testing.assert_allclose(y_d.to_host(), beta * y + alpha * (A @ x), atol=1e-4)
+
+    # adjoint
+    x = indigo.util.rand64c(M,N)
+    y = indigo.util.rand64c(K,N)
+    x_d = b.copy_array(x)
+    y_d = b.copy_array(y)
+    A_d.adjoint(y_d, x_d, alpha=alpha, beta=beta)
+    np.testing.assert_allclose(y_d.to_host(), beta * y + alpha * (A.H @ x), atol=1e-4)
+
+
+
+@pytest.mark.parametrize("backend,M,K,N,D,alpha,beta",
+    product( BACKENDS, [1,23,150], [1,9,300], [1,3,5], [1,3], [1,0.5+0.5j], [0,0.5] )
+)
+def test_lut_matrix(backend, M, K, N, D, alpha, beta):
+    b = backend()
+    if getattr(b.clutmm, '__isabstractmethod__', False):
+        pytest.skip("backed <%s> doesn't implement clutmm" % backend.__name__)
+    A_h = spp.csr_matrix(indigo.util.randM(M, K, 0.2))
+    lut = np.random.randint(0, 256, (A_h.nnz, D)).astype(np.uint8)
+    table = np.random.rand(256).astype(np.float32)
+    A = spp.csr_matrix( (table[lut].prod(axis=1), A_h.indices, A_h.indptr), shape=(M,K) )
+    A_d = b.lut_matrix(b, A, lut, table)
+    assert A_d.lut.nbytes == A.nnz * D
+
+    # forward
+    x = indigo.util.rand64c(K,N)
+    y = indigo.util.rand64c(M,N)
+    x_d = b.copy_array(x)
+    y_d = b.copy_array(y)
+    A_d.forward(y_d, x_d, alpha=alpha, beta=beta)
+    np.testing.assert_allclose(y_d.to_host(), beta * y + alpha * (A @ x), rtol=1e-4, atol=1e-4)
+
+    # adjoint
+    x = indigo.util.rand64c(M,N)
+    y = indigo.util.rand64c(K,N)
+    x_d = b.copy_array(x)
+    y_d = b.copy_array(y)
+    A_d.adjoint(y_d, x_d, alpha=alpha, beta=beta)
+    np.testing.assert_allclose(y_d.to_host(), beta * y + alpha * (A.H @ x), rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("M,K,nparts",
+    product( [1,37,200], [1,8], [1,3,8,64] )
+)
+def test_merge_path_csrmm(M, K, nparts):
+    try:
+        from indigo.backends.customcpu import CustomCpuBackend, merge_path_partition
+    except ImportError:
+        pytest.skip("CustomCpu backend not available")
+    b = CustomCpuBackend()
+
+    # skewed row lengths: a few dense rows among many short ones
+    rowCounts = np.random.randint(0, 3, M)
+    rowCounts[::17] = 50
+    rowPtrs = np.concatenate( [np.array([0]), np.cumsum(rowCounts)] )
+    colInds = np.random.randint(0, 60, rowPtrs[-1])
+    A = spp.csr_matrix( (indigo.util.rand64c(*colInds.shape), colInds, rowPtrs), shape=(M,60) )
+
+    part = merge_path_partition(A.indptr, nparts)
+    assert part.size == nparts+1 and part[0] == 0 and part[-1] == M
+    assert np.all(np.diff(part.astype(int)) >= 0)
+    work = np.diff(np.arange(M+1) + A.indptr)
+    loads = [work[part[p]:part[p+1]].sum() for p in range(nparts)]
+    assert max(loads) <= (M + A.nnz) / nparts + work.max()
+
+    A_d = b.csr_matrix(b, A)
+    x = indigo.util.rand64c(60,K)
+    y_d = b.zero_array((M,K), np.complex64)
+    b.ccsrmm(y_d, A.shape, A_d.colInds, A_d.rowPtrs, A_d.values, b.copy_array(x),
+        alpha=1, beta=0, partition=part)
+    np.testing.assert_allclose(y_d.to_host(), A @ x, atol=1e-3)
+
+    x = indigo.util.rand64c(M,K)
+    y_d = b.zero_array((60,K), np.complex64)
+    b.ccsrmm(y_d, A.shape, A_d.colInds, A_d.rowPtrs, A_d.values, b.copy_array(x),
+        alpha=1, beta=0, adjoint=True, partition=part)
+    np.testing.assert_allclose(y_d.to_host(), A.getH() @ x, atol=1e-3)
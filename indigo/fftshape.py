@@ -0,0 +1,157 @@
+"""
+Choice of FFT-friendly grid sizes and batch sizes.
+
+Neighbouring grid sizes can differ by tens of percent in FFT throughput.
+`fft_shape` picks, per axis, a size inside an oversampling window: sizes
+are ranked by the `fft_cost` heuristic, or by measured times when the
+backend's timing table (a JSON file, see `table_path`) covers the window.
+`fft_batch` picks how many columns of a given shape to transform at once
+from the same table, which `benchmark.py --fftsearch` fills in.
+"""
+import os
+import json
+import logging
+import itertools
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def prime_factors(n):
+    """ Prime factors of `n`, with multiplicity, in increasing order. """
+    p = 2
+    while p * p <= n:
+        while n % p == 0:
+            n //= p
+            yield p
+        p += 1
+    if n > 1:
+        yield n
+
+
+def fft_cost(n):
+    """
+    Heuristic relative cost of a length-`n` FFT: `n` times the sum of its
+    prime factors, i.e. one radix-p pass per factor. Factors above 7 count
+    double since FFT libraries handle them with slower generic kernels.
+    """
+    return n * sum(p if p <= 7 else 2 * p for p in prime_factors(n))
+
+
+def fft_sizes(n, osf_min, osf_max):
+    """
+    Sizes in [n*osf_min, n*osf_max], cheapest first by `fft_cost`. The
+    window always holds at least ceil(n*osf_min).
+    """
+    lo = int(np.ceil(n * osf_min - 1e-9))
+    hi = max(lo, int(np.floor(n * osf_max + 1e-9)))
+    return sorted(range(lo, hi+1), key=lambda m: (fft_cost(m), m))
+
+
+def shape_key(shape):
+    return 'x'.join(str(int(s)) for s in shape)
+
+
+def table_path(backend):
+    """
+    Location of the timing table for `backend`: $INDIGO_FFT_TABLE if set,
+    otherwise one file per backend type and thread count under
+    ~/.cache/indigo/fft.
+    """
+    path = os.environ.get('INDIGO_FFT_TABLE')
+    if path:
+        return path
+    name = '%s-%dt.json' % (type(backend).__name__, backend.get_max_threads())
+    return os.path.join(os.path.expanduser('~'), '.cache', 'indigo', 'fft', name)
+
+
+def load_table(backend, path=None):
+    """
+    Timing table for `backend`, mapping `shape_key(shape)` to a dict of
+    {batch: seconds} for one batched transform. Empty if there is none.
+    """
+    path = path or table_path(backend)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+
+def save_table(backend, table, path=None):
+    """ Writes `table` for `backend`, replacing any existing file atomically. """
+    path = path or table_path(backend)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = '%s.%d' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(table, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def measure_fft(backend, shape, batch=1, trials=3):
+    """ Best wall-clock seconds of `trials` forward FFTs of `shape` on `backend`. """
+    from indigo.util import Timer
+    F = backend.UnscaledFFT(tuple(shape), dtype=np.dtype('complex64'), batch=batch)
+    x = backend.rand_array((F.shape[1], batch))
+    y = backend.zero_array((F.shape[0], batch), dtype=np.complex64)
+    F.eval(y, x)
+    timer = Timer()
+    for trial in range(trials):
+        backend.barrier()
+        with timer:
+            F.eval(y, x)
+            backend.barrier()
+    return timer.min
+
+
+def per_transform(entry):
+    """ Seconds per transform of a table entry, over all measured batches. """
+    return min(t / int(batch) for batch, t in entry.items())
+
+
+def fft_batch(backend, shape, path=None):
+    """
+    Batch size with the least measured time per transform of `shape` in
+    `backend`'s timing table, or None unless the table compares several.
+    """
+    entry = load_table(backend, path).get(shape_key(shape), dict())
+    if len(entry) < 2:
+        return None
+    return int(min(entry, key=lambda batch: (entry[batch] / int(batch), int(batch))))
+
+
+def fft_shape(backend, N, osf_min, osf_max, measure=False, ncandidates=2, path=None):
+    """
+    Grid shape with N[i]*osf_min[i] <= shape[i] <= N[i]*osf_max[i] that is
+    expected to transform fastest on `backend`. Shapes timed in the
+    backend's table rank by measured time; otherwise each axis takes its
+    cheapest size by `fft_cost`. With `measure`, the `ncandidates` cheapest
+    sizes per axis are timed first and recorded in the table.
+    """
+    ndim = len(N)
+    if np.isscalar(osf_min):
+        osf_min = (osf_min,) * ndim
+    if np.isscalar(osf_max):
+        osf_max = (osf_max,) * ndim
+    candidates = [fft_sizes(n, lo, hi) for n, lo, hi in zip(N, osf_min, osf_max)]
+    table = load_table(backend, path)
+
+    if measure:
+        missing = [shape for shape in itertools.product(*(c[:ncandidates] for c in candidates))
+                   if shape_key(shape) not in table]
+        for shape in missing:
+            t = measure_fft(backend, shape)
+            log.debug("fft %s: %.2f ms", shape_key(shape), t * 1000)
+            table.setdefault(shape_key(shape), dict())['1'] = t
+        if missing:
+            save_table(backend, table, path)
+
+    windows = [set(c) for c in candidates]
+    timed = []
+    for key, entry in table.items():
+        shape = tuple(int(s) for s in key.split('x'))
+        if len(shape) == ndim and all(s in w for s, w in zip(shape, windows)):
+            timed.append( (per_transform(entry), shape) )
+    if timed:
+        return min(timed)[1]
+    return tuple(c[0] for c in candidates)
@@ -2,7 +2,7 @@ import numba as nb
 import math
 import numpy as np
 import scipy.sparse as sparse
-__all__ = ['interp_mat', 'interp_funs']
+__all__ = ['interp_mat', 'interp_funs', 'interp_lut', 'interp_layout', 'grid_bins', 'grid_mm', 'morton_order']
 
 
 @nb.jit(nopython=True, cache=True)
@@ -16,52 +16,240 @@ def lin_interp(table, x):
 
 
 @nb.jit(nopython=True, cache=True)
-def _interp3_mat(m, N, width, table, coord):
+def _taps(table, width, p, n, idx, wts):
+    """ Fills grid indices and kernel weights along one axis, returns the tap count. """
+    t = 0
+    for g in range(math.ceil(p - width), math.floor(p + width)):
+        idx[t] = g % n
+        wts[t] = lin_interp(table, abs(g - p) / width)
+        t += 1
+    return t
 
-    row = np.empty(m * int(2 * width + 1)**3, dtype=np.int64)
-    col = np.empty(m * int(2 * width + 1)**3, dtype=np.int64)
-    ker = np.empty(m * int(2 * width + 1)**3, dtype=np.float64)
 
-    c = 0
-    for i in range(m):
+@nb.jit(nopython=True, cache=True)
+def _ntaps(p, width, n, merge):
+    """ Tap count along one axis; with `merge`, taps that wrap onto the same grid point count once. """
+    t = max(math.floor(p + width) - math.ceil(p - width), 0)
+    return min(t, n) if merge else t
+
+
+@nb.jit(nopython=True, cache=True)
+def _sorted_taps(table, width, p, n, idx, wts):
+    """ Like `_taps`, but ordered by grid index, with the weights of wrapped taps summed. """
+    t = _taps(table, width, p, n, idx, wts)
+    for a in range(1, t):
+        j, w = idx[a], wts[a]
+        b = a - 1
+        while b >= 0 and idx[b] > j:
+            idx[b + 1], wts[b + 1] = idx[b], wts[b]
+            b -= 1
+        idx[b + 1], wts[b + 1] = j, w
+    u = 0
+    for a in range(t):
+        if u > 0 and idx[u - 1] == idx[a]:
+            wts[u - 1] += wts[a]
+        else:
+            idx[u], wts[u] = idx[a], wts[a]
+            u += 1
+    return u
+
+
+@nb.jit(nopython=True, cache=True, parallel=True)
+def _interp_nnz(m, N, width, coord, merge):
+    """ Nonzero count of the interpolation matrix: one row per point, one nonzero per tap. """
+    ndim = coord.shape[0]
+    nnz = 0
+    for i in nb.prange(m):
+        c = 1
+        for a in range(ndim):
+            c *= _ntaps(N[a] * coord[a, i] + (N[a] // 2), width, N[a], merge)
+        nnz += c
+    return nnz
+
+
+@nb.jit(nopython=True, cache=True, parallel=True)
+def _interp_rowptr(lo, hi, N, width, coord, merge, counts, indptr):
+    """ Fills indptr[lo+1:hi+1] from indptr[lo], counting taps into `counts`. """
+    ndim = coord.shape[0]
+    for i in nb.prange(hi - lo):
+        c = 1
+        for a in range(ndim):
+            c *= _ntaps(N[a] * coord[a, lo + i] + (N[a] // 2), width, N[a], merge)
+        counts[i] = c
+    for i in range(hi - lo):
+        indptr[lo + i + 1] = indptr[lo + i] + counts[i]
 
-        pos = (N[0] * coord[0, i] + (N[0] // 2),
-               N[1] * coord[1, i] + (N[1] // 2),
-               N[2] * coord[2, i] + (N[2] // 2))
 
-        start = (math.ceil(pos[0] - width),
-                 math.ceil(pos[1] - width),
-                 math.ceil(pos[2] - width))
-        
-        end = (math.floor(pos[0] + width),
-               math.floor(pos[1] + width),
-               math.floor(pos[2] + width))
+@nb.jit(nopython=True, cache=True, parallel=True)
+def _interp1_mat(m, N, width, table, coord, indptr, col, ker):
+    ntaps = int(2 * width) + 2
+    for i in nb.prange(m):
+        ix = np.empty(ntaps, np.int64); wx = np.empty(ntaps, np.float64)
+        nx = _sorted_taps(table, width, N[0] * coord[0, i] + (N[0] // 2), N[0], ix, wx)
+        c = indptr[i]
+        for tx in range(nx):
+            col[c] = ix[tx]
+            ker[c] = wx[tx]
+            c += 1
 
-        for z in range(start[2], end[2]):
 
-            wz = lin_interp(table, abs(z - pos[2]) / width)
-            jz = (z % N[2]) * N[1] * N[0]
+@nb.jit(nopython=True, cache=True, parallel=True)
+def _interp2_mat(m, N, width, table, coord, indptr, col, ker):
+    ntaps = int(2 * width) + 2
+    for i in nb.prange(m):
+        ix = np.empty(ntaps, np.int64); wx = np.empty(ntaps, np.float64)
+        iy = np.empty(ntaps, np.int64); wy = np.empty(ntaps, np.float64)
+        nx = _sorted_taps(table, width, N[0] * coord[0, i] + (N[0] // 2), N[0], ix, wx)
+        ny = _sorted_taps(table, width, N[1] * coord[1, i] + (N[1] // 2), N[1], iy, wy)
+        c = indptr[i]
+        for ty in range(ny):
+            jy = iy[ty] * N[0]
+            for tx in range(nx):
+                col[c] = ix[tx] + jy
+                ker[c] = wy[ty] * wx[tx]
+                c += 1
 
-            for y in range(start[1], end[1]):
 
-                wy = wz * lin_interp(table, abs(y - pos[1]) / width)
-                jy = (y % N[1]) * N[0] + jz
+@nb.jit(nopython=True, cache=True, parallel=True)
+def _interp3_mat(m, N, width, table, coord, indptr, col, ker):
+    ntaps = int(2 * width) + 2
+    for i in nb.prange(m):
+        ix = np.empty(ntaps, np.int64); wx = np.empty(ntaps, np.float64)
+        iy = np.empty(ntaps, np.int64); wy = np.empty(ntaps, np.float64)
+        iz = np.empty(ntaps, np.int64); wz = np.empty(ntaps, np.float64)
+        nx = _sorted_taps(table, width, N[0] * coord[0, i] + (N[0] // 2), N[0], ix, wx)
+        ny = _sorted_taps(table, width, N[1] * coord[1, i] + (N[1] // 2), N[1], iy, wy)
+        nz = _sorted_taps(table, width, N[2] * coord[2, i] + (N[2] // 2), N[2], iz, wz)
+        c = indptr[i]
+        for tz in range(nz):
+            jz = iz[tz] * N[1] * N[0]
+            for ty in range(ny):
+                jy = iy[ty] * N[0] + jz
+                wzy = wz[tz] * wy[ty]
+                for tx in range(nx):
+                    col[c] = ix[tx] + jy
+                    ker[c] = wzy * wx[tx]
+                    c += 1
 
-                for x in range(start[0], end[0]):
 
-                    w = wy * lin_interp(table, abs(x - pos[0]) / width)
-                    j = (x % N[0]) + jy
+@nb.jit(nopython=True, cache=True)
+def _sorted_levels(width, p, n, nlevels, idx, lvl):
+    """ Like `_sorted_taps`, but with kernel distances quantized to `nlevels` levels. """
+    t = 0
+    for g in range(math.ceil(p - width), math.floor(p + width)):
+        idx[t] = g % n
+        lvl[t] = round(abs(g - p) / width * (nlevels - 1))
+        t += 1
+    for a in range(1, t):
+        j, q = idx[a], lvl[a]
+        b = a - 1
+        while b >= 0 and idx[b] > j:
+            idx[b + 1], lvl[b + 1] = idx[b], lvl[b]
+            b -= 1
+        idx[b + 1], lvl[b + 1] = j, q
+    return t
 
-                    row[c] = i
-                    col[c] = j
-                    ker[c] = w
 
+@nb.jit(nopython=True, cache=True, parallel=True)
+def _interp3_lut(m, N, width, coord, levels, indptr, col, lut, ker):
+    nlevels = len(levels)
+    ntaps = int(2 * width) + 2
+    for i in nb.prange(m):
+        ix = np.empty(ntaps, np.int64); qx = np.empty(ntaps, np.int64)
+        iy = np.empty(ntaps, np.int64); qy = np.empty(ntaps, np.int64)
+        iz = np.empty(ntaps, np.int64); qz = np.empty(ntaps, np.int64)
+        nx = _sorted_levels(width, N[0] * coord[0, i] + (N[0] // 2), N[0], nlevels, ix, qx)
+        ny = _sorted_levels(width, N[1] * coord[1, i] + (N[1] // 2), N[1], nlevels, iy, qy)
+        nz = _sorted_levels(width, N[2] * coord[2, i] + (N[2] // 2), N[2], nlevels, iz, qz)
+        c = indptr[i]
+        for tz in range(nz):
+            jz = iz[tz] * N[1] * N[0]
+            for ty in range(ny):
+                jy = iy[ty] * N[0] + jz
+                for tx in range(nx):
+                    col[c] = ix[tx] + jy
+                    lut[c, 0] = qx[tx]
+                    lut[c, 1] = qy[ty]
+                    lut[c, 2] = qz[tz]
+                    ker[c] = levels[qx[tx]] * levels[qy[ty]] * levels[qz[tz]]
                     c += 1
-    return row[:c], col[:c], ker[:c]
 
 
-def interp_mat(m, N, width, table, coord, backend):
+def interp_layout(m, N, width, coord, merge=True):
+    """
+    Returns the nonzero count of the (m x prod(N)) interpolation matrix and
+    the index dtype of its CSR arrays, without allocating them. With
+    `merge`, taps that wrap onto the same grid point (grids narrower than
+    the kernel) count once, as in `interp_mat`; `interp_lut` keeps them.
+    """
+    N = tuple(int(n) for n in N)
+    nnz = int(_interp_nnz(m, N, width, coord, merge))
+    idx_dtype = np.dtype(np.int32 if max(int(np.prod(N)), nnz) < 2**31 else np.int64)
+    return nnz, idx_dtype
+
+
+def _csr_plan(m, N, width, coord, merge, bytes_per_nnz, max_bytes, block):
+    """
+    Returns the nonzero count, index dtype and points per block for building
+    an interpolation matrix whose nonzeros take `bytes_per_nnz` besides their
+    column index. Building needs the final CSR arrays plus an int64 tap count
+    per point of a block; blocks shrink to keep that within `max_bytes`, down
+    to 1024 points, below which MemoryError is raised.
+    """
+    nnz, idx_dtype = interp_layout(m, N, width, coord, merge)
+    nbytes = nnz * (idx_dtype.itemsize + bytes_per_nnz) + (m + 1) * idx_dtype.itemsize
+    block = max(1, min(m, block))
+    if max_bytes is not None:
+        block = min(block, (max_bytes - nbytes) // 8)
+        if block < min(m, 1024):
+            raise MemoryError("interpolation matrix with %d nonzeros needs %d bytes "
+                "plus scratch, more than the limit of %d" % (nnz, nbytes, max_bytes))
+    return nnz, idx_dtype, block
+
+
+def interp_lut(m, N, width, table, coord, nlevels=256, dtype=np.float32, max_bytes=None, block=1 << 16):
+    """
+    Builds the interpolation matrix of `interp_mat` with each kernel distance
+    quantized to one of `nlevels` (at most 256) levels per axis. Returns the
+    CSR matrix, the per-nonzero uint8 level of each axis in CSR order, and
+    the float32 kernel value at each level; every nonzero equals the product
+    of its three levels' kernel values. Points are processed in blocks and
+    peak memory is bounded as in `interp_mat`. Taps that wrap around onto
+    the same grid point (grids narrower than the kernel) are kept as
+    duplicate, unsorted entries.
+    """
+    assert coord.shape[0] == 3
+    assert nlevels <= 256
+    N = tuple(int(n) for n in N)
+    dtype = np.dtype(dtype)
+    levels = np.array([lin_interp(table, q / (nlevels - 1)) for q in range(nlevels)], dtype=np.float32)
+    nnz, idx_dtype, block = _csr_plan(m, N, width, coord, False, 3 + dtype.itemsize, max_bytes, block)
+    indptr = np.zeros(m + 1, dtype=idx_dtype)
+    col = np.empty(nnz, dtype=idx_dtype)
+    lut = np.empty((nnz, 3), dtype=np.uint8)
+    vals = np.empty(nnz, dtype=dtype)
+    counts = np.empty(block, dtype=np.int64)
+    for lo in range(0, m, block):
+        hi = min(m, lo + block)
+        _interp_rowptr(lo, hi, N, width, coord, False, counts, indptr)
+        _interp3_lut(hi - lo, N, width, coord[:, lo:hi], levels, indptr[lo:hi+1], col, lut, vals)
 
+    M = sparse.csr_matrix((vals, col, indptr), shape=(m, int(np.prod(N))))
+    M.has_sorted_indices = min(N) >= 2 * width + 1
+    return M, lut, levels
+
+
+def interp_mat(m, N, width, table, coord, backend, dtype=np.float64, max_bytes=None, block=1 << 16):
+    """
+    Builds the (m x prod(N)) interpolation matrix from a grid of shape N onto
+    the points `coord`, as CSR with sorted column indices and values of type
+    `dtype`; taps that wrap onto the same grid point are summed. Points are
+    processed `block` at a time: their row pointers, then their taps in
+    parallel, are written straight into the final CSR arrays, so peak memory
+    is those arrays plus an int64 per point of a block. Blocks shrink to keep
+    that within `max_bytes`, and MemoryError is raised before allocating
+    anything large if it cannot fit. Indices are int32 when they fit.
+    """
     ndim = coord.shape[0]
 
     if ndim == 1:
@@ -74,7 +262,155 @@ def interp_mat(m, N, width, table, coord, backend):
         raise ValueError('Number of dimensions can only be 1, 2 or 3, got %r',
                          ndim)
 
-    row, col, ker = _interp_mat(m, N, width, table, coord)
-    
-    return sparse.coo_matrix((ker, (row, col)),
-                             shape=(m, np.prod(N, dtype=np.int)))
+    N = tuple(int(n) for n in N)
+    dtype = np.dtype(dtype)
+    nnz, idx_dtype, block = _csr_plan(m, N, width, coord, True, dtype.itemsize, max_bytes, block)
+    indptr = np.zeros(m + 1, dtype=idx_dtype)
+    col = np.empty(nnz, dtype=idx_dtype)
+    ker = np.empty(nnz, dtype=dtype)
+    counts = np.empty(block, dtype=np.int64)
+    for lo in range(0, m, block):
+        hi = min(m, lo + block)
+        _interp_rowptr(lo, hi, N, width, coord, True, counts, indptr)
+        _interp_mat(hi - lo, N, width, table, coord[:, lo:hi], indptr[lo:hi+1], col, ker)
+
+    M = sparse.csr_matrix((ker, col, indptr), shape=(m, int(np.prod(N))))
+    M.has_sorted_indices = True
+    return M
+
+
+@nb.jit(nopython=True, cache=True, parallel=True)
+def _grid3_forward(N, width, table, coord, X, Y, alpha, beta, chunk):
+    """
+    Y[i,:] = beta * Y[i,:] + alpha * sum of kernel-weighted grid values X
+    around point i. The kernel is separable, so each point needs only 3*2w
+    table lookups, and the sum is factored as sum_z wz sum_y wy sum_x wx X
+    in single precision.
+    """
+    m, ncols = Y.shape
+    ntaps = int(2 * width) + 2
+    for c in nb.prange((m + chunk - 1) // chunk):
+        ix = np.empty(ntaps, np.int64); wx = np.empty(ntaps, np.float32)
+        iy = np.empty(ntaps, np.int64); wy = np.empty(ntaps, np.float32)
+        iz = np.empty(ntaps, np.int64); wz = np.empty(ntaps, np.float32)
+        for i in range(c * chunk, min(m, (c + 1) * chunk)):
+            nx = _taps(table, width, N[0] * coord[0, i] + (N[0] // 2), N[0], ix, wx)
+            ny = _taps(table, width, N[1] * coord[1, i] + (N[1] // 2), N[1], iy, wy)
+            nz = _taps(table, width, N[2] * coord[2, i] + (N[2] // 2), N[2], iz, wz)
+            x0 = ix[0] if nx > 0 else 0
+            xrun = nx > 0 and ix[nx - 1] == x0 + nx - 1 # x taps do not wrap
+            for k in range(ncols):
+                acc = np.complex64(0)
+                for tz in range(nz):
+                    jz = iz[tz] * N[1] * N[0]
+                    accz = np.complex64(0)
+                    for ty in range(ny):
+                        jy = iy[ty] * N[0] + jz
+                        accy = np.complex64(0)
+                        if xrun:
+                            for tx in range(nx):
+                                accy += wx[tx] * X[x0 + jy + tx, k]
+                        else:
+                            for tx in range(nx):
+                                accy += wx[tx] * X[ix[tx] + jy, k]
+                        accz += wy[ty] * accy
+                    acc += wz[tz] * accz
+                if beta == 0:
+                    Y[i, k] = alpha * acc
+                else:
+                    Y[i, k] = beta * Y[i, k] + alpha * acc
+
+
+@nb.jit(nopython=True, cache=True, parallel=True)
+def _grid3_adjoint(N, width, table, coord, order, bin_ptr, bin_color, X, Y, alpha):
+    """
+    Y += alpha * spreading of the sample values X onto the grid. Points are
+    grouped into z-slabs at least 2*width thick; slabs of one color never
+    touch the same grid planes, so each color is spread in parallel. As in
+    `_grid3_forward`, per-axis weights are applied one axis at a time.
+    """
+    ncols = X.shape[1]
+    nbins = bin_ptr.size - 1
+    ntaps = int(2 * width) + 2
+    for color in range(3):
+        for b in nb.prange(nbins):
+            if bin_color[b] != color:
+                continue
+            ix = np.empty(ntaps, np.int64); wx = np.empty(ntaps, np.float32)
+            iy = np.empty(ntaps, np.int64); wy = np.empty(ntaps, np.float32)
+            iz = np.empty(ntaps, np.int64); wz = np.empty(ntaps, np.float32)
+            for p in range(bin_ptr[b], bin_ptr[b + 1]):
+                i = order[p]
+                nx = _taps(table, width, N[0] * coord[0, i] + (N[0] // 2), N[0], ix, wx)
+                ny = _taps(table, width, N[1] * coord[1, i] + (N[1] // 2), N[1], iy, wy)
+                nz = _taps(table, width, N[2] * coord[2, i] + (N[2] // 2), N[2], iz, wz)
+                x0 = ix[0] if nx > 0 else 0
+                xrun = nx > 0 and ix[nx - 1] == x0 + nx - 1 # x taps do not wrap
+                for k in range(ncols):
+                    v = alpha * X[i, k]
+                    for tz in range(nz):
+                        jz = iz[tz] * N[1] * N[0]
+                        vz = wz[tz] * v
+                        for ty in range(ny):
+                            jy = iy[ty] * N[0] + jz
+                            vy = wy[ty] * vz
+                            if xrun:
+                                for tx in range(nx):
+                                    Y[x0 + jy + tx, k] += wx[tx] * vy
+                            else:
+                                for tx in range(nx):
+                                    Y[ix[tx] + jy, k] += wx[tx] * vy
+
+
+def morton_order(N, coord, tile=8):
+    """
+    Permutation that sorts the points `coord` on a grid of shape N by the
+    Morton (Z-order) index of the `tile`-wide grid tile they fall in, so
+    that consecutive points touch nearby grid cells. Points in the same
+    tile keep their original order.
+    """
+    ndim = coord.shape[0]
+    code = np.zeros(coord.shape[1], dtype=np.uint64)
+    nbits = 64 // ndim
+    for a in range(ndim):
+        pos = np.floor(N[a] * coord[a].astype(np.float64) + (N[a] // 2)).astype(np.int64) % N[a]
+        t = (pos // tile).astype(np.uint64)
+        for bit in range(nbits):
+            code |= ((t >> np.uint64(bit)) & np.uint64(1)) << np.uint64(bit * ndim + a)
+    return np.argsort(code, kind='stable')
+
+
+def grid_bins(N, width, coord):
+    """
+    Groups sample points into slabs along the last grid axis for parallel
+    spreading. Returns the point permutation, slab pointers into it, and a
+    color per slab such that slabs of equal color have disjoint footprints.
+    """
+    thick = max(int(math.ceil(2 * width)), 1)
+    nbins = max(N[2] // thick, 1)
+    pos = np.floor(N[2] * coord[2].astype(np.float64) + (N[2] // 2)).astype(np.int64) % N[2]
+    bins = np.minimum(pos // thick, nbins - 1)
+    order = np.argsort(bins, kind='stable').astype(np.int64)
+    bin_ptr = np.searchsorted(bins[order], np.arange(nbins + 1)).astype(np.int64)
+    bin_color = (np.arange(nbins) % 2).astype(np.int32)
+    if nbins % 2 and nbins > 1:
+        bin_color[-1] = 2 # first and last slabs are neighbours
+    return order, bin_ptr, bin_color
+
+
+def grid_mm(Y, N, width, table, coord, bins, X, alpha=1, beta=0, adjoint=False, chunk=256):
+    """
+    Computes Y[:] = beta * Y + alpha * G * X (or G^H when `adjoint`) for the
+    matrix-free interpolation G, on host arrays of shape (rows, columns).
+    """
+    N = tuple(int(n) for n in N)
+    alpha, beta = np.complex64(alpha), np.complex64(beta)
+    if adjoint:
+        if beta == 0:
+            Y[:] = 0
+        elif beta != 1:
+            Y *= beta
+        order, bin_ptr, bin_color = bins
+        _grid3_adjoint(N, float(width), table, coord, order, bin_ptr, bin_color, X, Y, alpha)
+    else:
+        _grid3_forward(N, float(width), table, coord, X, Y, alpha, beta, chunk)
@@ -14,10 +14,20 @@ def ftkb(beta, x):
     return ret
 
 
+def rolloff(oversamp, width, beta, N):
+    """
+    Kaiser-Bessel deapodization for an image of shape N, as one 1D factor
+    per axis; the full correction is their outer product. `oversamp` is
+    one factor for all axes or one per axis.
+    """
+    if np.isscalar(oversamp):
+        oversamp = [oversamp] * len(N)
+    return [ ftkb(beta, 0.0) / ftkb(beta, (np.arange(n) - n // 2) / n * width * 2.0 / o)
+             for n, o in zip(N, oversamp) ]
+
+
 def rolloff3(oversamp, width, beta, N):
 
-    x, y, z = np.mgrid[:N[0], :N[1], :N[2]]
+    r0, r1, r2 = rolloff(oversamp, width, beta, N)
 
-    return ftkb(beta, 0.0)**3 / (ftkb(beta, (x - N[0] // 2) / N[0] * width * 2.0 / oversamp) *
-                                 ftkb(beta, (y - N[1] // 2) / N[1] * width * 2.0 / oversamp) *
-                                 ftkb(beta, (z - N[2] // 2) / N[2] * width * 2.0 / oversamp))
+    return r0[:,None,None] * r1[None,:,None] * r2[None,None,:]
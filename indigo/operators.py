@@ -7,7 +7,7 @@ import numpy as np
 import scipy.sparse as spp
 from ctypes import c_ulong
 
-from indigo.util import profile
+from indigo.util import profile, sparsity_key
 
 log = logging.getLogger(__name__)
 
@@ -49,7 +49,7 @@ class Operator(object):
         elif isinstance(other, np.ndarray):
             x = other.reshape( (self.shape[1], -1), order='F' )
             x_d = self._backend.copy_array(x)
-            y_d = self._backend.zero_array( (self.shape[0],x.shape[1]), dtype=other.dtype )
+            y_d = self._backend.zero_array( (self.shape[0],x.shape[1]), dtype=self._result_dtype(other.dtype) )
             self.eval(y_d, x_d)
             return y_d.to_host()
         elif isinstance(other, (int, float, complex)):
@@ -81,6 +81,10 @@ class Operator(object):
     def H(self):
         return Adjoint(self._backend, self, name=self._name+".H")
 
+    def _result_dtype(self, dtype, forward=True):
+        """ Dtype of A * x, or of A.H * x if not `forward`, for x of `dtype`. """
+        return dtype
+
     def dump(self):
         """
         Returns a textual representation of the operator tree.
@@ -135,6 +139,11 @@ class CompositeOperator(Operator):
     def _adopt(self, children):
         self._children = children
 
+    def _result_dtype(self, dtype, forward=True):
+        if not self._children:
+            return dtype
+        return self._children[0]._result_dtype(dtype, forward)
+
     def _dump(self, file, indent=0):
         s = super()._dump(file, indent)
         for c in self._children:
@@ -186,6 +195,9 @@ class Adjoint(CompositeOperator):
     def H(self):
         return self.child
 
+    def _result_dtype(self, dtype, forward=True):
+        return self.child._result_dtype(dtype, not forward)
+
     def _eval(self, y, x, alpha=1, beta=0, forward=True, left=True):
         self.child.eval( y, x, alpha, beta, forward=not forward, left=left)
 
@@ -197,11 +209,30 @@ class SpMatrix(Operator):
         """
         super().__init__(backend, **kwargs)
         assert isinstance(M, spp.spmatrix)
+        self._format = 'csr'   # device storage: 'csr', 'csr16', 'dia', 'bsr', 'sel' or 'lut'
+        self._blocksize = None # block shape for 'bsr' storage
+        self._nblocks = None   # stored blocks for 'bsr' storage
+        self._stack_height = None # if set, 'bsr' rows of this many stacked copies are interleaved
+        self._lut = None       # (table indices, table) for 'lut' storage
+        self._pattern_key = None # sparsity_key of the matrix, see _sparsity_key
         self._matrix = M
         self._matrix_d = None
+        self._unstack_d = None
 
         self._allow_exwrite = True
-        self._use_dia = False
+
+    @property
+    def _matrix(self):
+        return self._M
+
+    @_matrix.setter
+    def _matrix(self, M):
+        # table indices, block counts and pattern keys describe one particular matrix
+        if getattr(self, '_M', None) is not M:
+            self._lut, self._nblocks, self._pattern_key = None, None, None
+            if self._format == 'lut':
+                self._format = 'csr'
+        self._M = M
 
     @property
     def dtype(self):
@@ -219,14 +250,53 @@ class SpMatrix(Operator):
         # FIXME device matrix hasn't been realized so actually not very accurate
         return self._matrix.data.nbytes
 
+    def _sparsity_key(self):
+        """
+        `sparsity_key` of the matrix, hashed at most once per matrix: the
+        device pattern's key once the matrix is uploaded as CSR, and the
+        host matrix's before that.
+        """
+        if self._pattern_key is None:
+            pattern = getattr(self._matrix_d, '_pattern', None)
+            if pattern is not None:
+                self._pattern_key = pattern.key[1:]
+            else:
+                self._pattern_key = sparsity_key(self._matrix.tocsr())
+        return self._pattern_key
+
     def _get_or_create_device_matrix(self):
         if self._matrix_d is None:
-            self._matrix = self._matrix.astype(np.complex64)
+            self._M = self._matrix.astype(np.complex64, copy=False) # same nonzeros, so _lut still holds
             assert self._matrix.dtype == np.dtype('complex64'), 'Indigo only supports single precision complex numbers for now.'
-            if self._use_dia:
+            if self._format == 'dia':
                 log.debug("storing in DIA format: %s", self._name)
                 M = self._matrix.todia()
                 self._matrix_d = self._backend.dia_matrix(self._backend, M, self._name)
+            elif self._format == 'bsr':
+                log.debug("storing in BSR format with %dx%d blocks: %s", *self._blocksize, self._name)
+                M = self._matrix
+                if self._stack_height is not None:
+                    log.debug("interleaving rows of %d stacked copies: %s", self._stack_height, self._name)
+                    perm = self._interleaved_rows()
+                    M = M.tocsr()[perm]
+                    U = spp.csr_matrix((np.ones(perm.size, dtype=np.complex64), (perm, np.arange(perm.size))),
+                        shape=(perm.size, perm.size))
+                    if getattr(self._backend.cselmm, '__isabstractmethod__', False):
+                        self._unstack_d = self._backend.csr_matrix(self._backend, U, self._name+".unstack")
+                    else:
+                        self._unstack_d = self._backend.sel_matrix(self._backend, U, name=self._name+".unstack")
+                M = M.tobsr(blocksize=self._blocksize)
+                self._matrix_d = self._backend.bsr_matrix(self._backend, M, name=self._name)
+            elif self._format == 'csr16':
+                log.debug("storing in CSR format with 16-bit column deltas: %s", self._name)
+                self._matrix_d = self._backend.csr16_matrix(self._backend, self._matrix, name=self._name)
+            elif self._format == 'lut':
+                log.debug("storing in CSR format with table-index values: %s", self._name)
+                assert self._lut[0].shape[0] == self._matrix.nnz, "table indices don't match the matrix"
+                self._matrix_d = self._backend.lut_matrix(self._backend, self._matrix, *self._lut, name=self._name)
+            elif self._format == 'sel':
+                log.debug("storing in SEL format: %s", self._name)
+                self._matrix_d = self._backend.sel_matrix(self._backend, self._matrix, name=self._name)
             else:
                 log.debug("storing in CSR format: %s", self._name)
                 M = self._matrix.tocsr()
@@ -239,10 +309,28 @@ class SpMatrix(Operator):
                     log.debug("allowing exwrite for %s" % self._name)
         return self._matrix_d
 
+    def _interleaved_rows(self):
+        """ Row order that puts row i of each of the stacked copies next to each other. """
+        return np.arange(self.shape[0]).reshape(self._stack_height, -1).T.ravel()
+
     def _eval(self, y, x, alpha=1, beta=0, forward=True, left=True):
         if not left:
             raise NotImplementedError("Right-multiplication not implemented for {}.".format(self.__class__.__name__))
         M = self._get_or_create_device_matrix()
+        if self._stack_height is not None:
+            # the device matrix holds interleaved rows; unstack them through scratch
+            U = self._unstack_d
+            with self._backend.scratch(shape=(self.shape[0], x.shape[1])) as tmp:
+                if forward:
+                    self._eval_device(M, tmp, x, forward=True)
+                    U.forward(y, tmp, alpha=alpha, beta=beta)
+                else:
+                    U.adjoint(tmp, x)
+                    self._eval_device(M, y, tmp, alpha=alpha, beta=beta, forward=False)
+        else:
+            self._eval_device(M, y, x, alpha=alpha, beta=beta, forward=forward)
+
+    def _eval_device(self, M, y, x, alpha=1, beta=0, forward=True):
         if forward:
             read_frac, write_frac = M._col_frac, M._row_frac
         else:
@@ -255,7 +343,7 @@ class SpMatrix(Operator):
             y_part = 2
         nbytes = M.nbytes + x.nbytes*read_frac + y.nbytes*y_part
         nflops = 5 * len(self._matrix.data) * x.shape[1]
-        event = 'csrmm' if 'csr' in type(M).__name__ else 'diamm'
+        event = type(M).__name__[:3] + 'mm'
         with profile(event, xval=read_frac, yval=y_part, nbytes=nbytes, shape=x.shape, forward=forward, nflops=nflops) as p:
             if forward:
                 M.forward(y, x, alpha=alpha, beta=beta)
@@ -263,6 +351,29 @@ class SpMatrix(Operator):
                 M.adjoint(y, x, alpha=alpha, beta=beta)
 
 
+class Permutation(CompositeOperator):
+    """
+    Row permutation y[perm[i]] = x[i], stored as a child SpMatrix. It has a
+    type of its own so that realization leaves it out of products. Folding
+    it into a neighbouring matrix would undo a reordering chosen for that
+    matrix's memory access pattern.
+    """
+    def __init__(self, backend, perm, dtype=np.dtype('complex64'), **kwargs):
+        n = len(perm)
+        P = spp.csr_matrix((np.ones(n), (perm, np.arange(n))), shape=(n,n), dtype=dtype)
+        S = SpMatrix(backend, P, name=kwargs.get('name', 'perm'))
+        if not getattr(backend.cselmm, '__isabstractmethod__', False):
+            S._format = 'sel'
+        super().__init__(backend, S, **kwargs)
+
+    @property
+    def shape(self):
+        return self.child.shape
+
+    def _eval(self, y, x, alpha=1, beta=0, forward=True, left=True):
+        self.child.eval(y, x, alpha=alpha, beta=beta, forward=forward, left=left)
+
+
 class DenseMatrix(Operator):
     def __init__(self, backend, M, **kwargs):
         super().__init__(backend, **kwargs)
@@ -283,6 +394,20 @@ class DenseMatrix(Operator):
     def shape(self):
         return self._matrix.shape
 
+    def _sparsity_key(self):
+        """
+        `sparsity_key` of the matrix, hashed at most once per matrix: the
+        device pattern's key once the matrix is uploaded as CSR, and the
+        host matrix's before that.
+        """
+        if self._pattern_key is None:
+            pattern = getattr(self._matrix_d, '_pattern', None)
+            if pattern is not None:
+                self._pattern_key = pattern.key[1:]
+            else:
+                self._pattern_key = sparsity_key(self._matrix.tocsr())
+        return self._pattern_key
+
     def _get_or_create_device_matrix(self):
         if self._matrix_d is None:
             self._matrix_d = self._backend.copy_array( self._matrix )
@@ -303,21 +428,56 @@ class DenseMatrix(Operator):
 
 
 class UnscaledFFT(MatrixFreeOperator):
-    def __init__(self, backend, ft_shape, forward=True, **kwargs):
+    """
+    Unscaled FFT of vectors laid out as arrays of shape `ft_shape`, along
+    the given `axes` only, or along all of them by default. Columns are
+    transformed `batch` at a time; without a `batch`, full transforms take
+    the fastest batch size in the backend's FFT timing table, if it has
+    one (see `indigo.fftshape.fft_batch`).
+    """
+    def __init__(self, backend, ft_shape, forward=True, axes=None, **kwargs):
         self._ft_shape = ft_shape
+        self._axes = self.normalize_axes(ft_shape, axes)
         n = np.prod(self._ft_shape)
+        if kwargs.get('batch') is None and self._axes is None:
+            from indigo.fftshape import fft_batch
+            kwargs['batch'] = fft_batch(backend, ft_shape)
         super().__init__(backend, shape=(n,n), **kwargs)
 
+    @staticmethod
+    def normalize_axes(ft_shape, axes):
+        """ Sorted tuple of transformed axes, or None if that is all of them. """
+        if axes is None:
+            return None
+        axes = tuple(sorted(set(a % len(ft_shape) for a in np.atleast_1d(axes))))
+        return None if len(axes) == len(ft_shape) else axes
+
+    @property
+    def axes(self):
+        return self._axes or tuple(range(len(self._ft_shape)))
+
+    @property
+    def ft_size(self):
+        """ Number of points in each transform. """
+        return int(np.prod([self._ft_shape[a] for a in self.axes]))
+
     def _eval(self, y, x, alpha=1, beta=0, forward=True, left=True):
         if not left:
             raise NotImplementedError("Right-multiplication not implemented for {}.".format(self.__class__.__name__))
-        assert alpha == 1, "FFT expected alpha == 1, got %s" % alpha
-        assert  beta == 0, "FFT expected beta == 0, got %s" % beta
+        ncols = x.shape[1]
+        step = min(ncols, self._batch or ncols)
+        if step == ncols:
+            return self._eval_batch(y, x, alpha, beta, forward)
+        for j in range(0, ncols, step):
+            k = min(j + step, ncols)
+            self._eval_batch(y[:,j:k], x[:,j:k], alpha, beta, forward)
+
+    def _eval_batch(self, y, x, alpha, beta, forward):
         X = x.reshape( self._ft_shape + (x.shape[1],) )
         Y = y.reshape( self._ft_shape + (x.shape[1],) )
 
         lens, batch = np.prod(X.shape[:-1]), X.shape[-1]
-        nflops = batch * 5 * lens * np.log2(lens)
+        nflops = batch * 5 * lens * np.log2(self.ft_size)
 
         if isinstance(X._arr, np.ndarray):
             ptr = X._arr.ctypes.get_data()
@@ -333,9 +493,9 @@ class UnscaledFFT(MatrixFreeOperator):
 
         with profile("fft", nflops=nflops, shape=X.shape, aligned=align) as p:
             if forward:
-                self._backend.fftn(Y, X)
+                self._backend.fftn(Y, X, alpha=alpha, beta=beta, axes=self._axes)
             else:
-                self._backend.ifftn(Y, X)
+                self._backend.ifftn(Y, X, alpha=alpha, beta=beta, axes=self._axes)
 
     def _mem_usage(self, ncols):
         ncols = min(ncols, self._batch or ncols)
@@ -343,6 +503,251 @@ class UnscaledFFT(MatrixFreeOperator):
         return self._backend._fft_workspace_size(ft_shape)
 
 
+class CenteredFFT(MatrixFreeOperator):
+    """
+    Centered FFT, M*F*M for the phase modulation M of `Backend.FFTc`, and
+    unitary if `normalize`. The modulations and the scale are applied as
+    separable diagonals around an in-place FFT rather than as separate
+    operators, so no intermediate buffers are needed when beta == 0.
+    If every centered axis has even length, M is a checkerboard sign times
+    a constant and M*F*M equals F after a sign flip and an fftshift, so
+    the whole centering is a single pass that also copies x into y ahead
+    of an in-place FFT. Transforms that fold diagonals into neighbouring
+    matrices see the separate operators through `split`.
+    """
+    def __init__(self, backend, ft_shape, normalize=True, dtype=np.dtype('complex64'), axes=None, **kwargs):
+        n = np.prod(ft_shape)
+        super().__init__(backend, (n,n), dtype=dtype, **kwargs)
+        self._ft_shape = ft_shape
+        self._normalize = normalize
+        self._fft = UnscaledFFT(backend, ft_shape, dtype=dtype, axes=axes,
+            name=self._name+'.fft', batch=self._batch)
+        mod = [m.astype(dtype) for m in self.modulation(ft_shape, axes)]
+        post = list(mod)
+        if normalize:
+            post[0] = post[0] / np.sqrt(self.ft_size)
+        self._pre  = SeparableDiag(backend, mod, dtype=dtype, name=self._name+'.mod')
+        self._post = SeparableDiag(backend, post, dtype=dtype, name=self._name+'.modscale')
+
+        # for even n, the modulation is D = (-1)^k up to a factor of
+        # exp(-i pi n/4), and D*F*D = F*P*D for the roll P by n/2, so
+        # M*F*M = (-1)^(n/2) F*P*D = F*P*(-1)^(n/2) D. Rolled into place
+        # by P, that sign vector is just (-1)^k.
+        centered = [i in self.axes for i in range(len(ft_shape))]
+        self._shift = None
+        if len(ft_shape) <= 3 and all(n % 2 == 0 for n, c in zip(ft_shape, centered) if c):
+            sign = [(-1.0) ** np.arange(n) if c else np.ones(n) for n, c in zip(ft_shape, centered)]
+            if normalize:
+                sign[0] = sign[0] / np.sqrt(self.ft_size)
+            self._shift = tuple(centered) + (False,) * (3 - len(ft_shape))
+            # D*P = (-1)^(n/2) P*D, for a sign pass after the FFT instead
+            self._shift_sign = np.prod([(-1) ** (n // 2) for n, c in zip(ft_shape, centered) if c])
+            self._signscale = SeparableDiag(backend, sign, dtype=dtype, name=self._name+'.signscale')
+
+    @staticmethod
+    def modulation(ft_shape, axes=None):
+        """ Per-axis factors of the centering modulation M, ones off `axes`. """
+        mod = []
+        for i, n in enumerate(ft_shape):
+            c = n // 2
+            if axes is not None and i not in np.atleast_1d(axes) % len(ft_shape):
+                mod.append( np.ones(n) )
+                continue
+            mod.append( np.exp(1j * 2.0 * np.pi * (np.arange(n) - c / 2.0) * (c / n)) )
+        return mod
+
+    @property
+    def axes(self):
+        return self._fft.axes
+
+    @property
+    def ft_size(self):
+        return self._fft.ft_size
+
+    @property
+    def nbytes(self):
+        if self._shift is not None:
+            return self._signscale.nbytes
+        return self._pre.nbytes + self._post.nbytes
+
+    def split(self):
+        """ The same operator as post * F * pre, with the diagonals as separate operators. """
+        return self._post * self._fft * self._pre
+
+    def _mem_usage(self, ncols):
+        return self._fft._mem_usage(ncols)
+
+    def _eval(self, y, x, alpha=1, beta=0, forward=True, left=True):
+        if not left:
+            raise NotImplementedError("Right-multiplication not implemented for {}.".format(self.__class__.__name__))
+        if self._shift is not None:
+            self._eval_shifted(y, x, alpha=alpha, beta=beta, forward=forward)
+        elif beta == 0:
+            self._pre.eval(y, x, forward=forward)
+            self._fft.eval(y, y, forward=forward)
+            self._post.eval(y, y, alpha=alpha, forward=forward)
+        else:
+            with self._backend.scratch(shape=y.shape) as tmp:
+                self._pre.eval(tmp, x, forward=forward)
+                self._fft.eval(tmp, tmp, forward=forward)
+                self._post.eval(y, tmp, alpha=alpha, beta=beta, forward=forward)
+
+    def _eval_shifted(self, y, x, alpha=1, beta=0, forward=True):
+        factors = self._signscale._get_or_create_device_data()
+        nbytes = self._signscale.nbytes + 2 * y.nbytes + (0 if beta == 0 else y.nbytes)
+        if beta == 0:
+            with profile("sepdiagmm", nbytes=nbytes, shape=y.shape, forward=forward, nflops=6*y.size):
+                self._backend.csepdiagmm(y, factors, x, alpha=alpha, adjoint=not forward, shift=self._shift)
+            self._fft.eval(y, y, forward=forward)
+        else:
+            with self._backend.scratch(shape=y.shape) as tmp:
+                self._fft.eval(tmp, x, forward=forward)
+                with profile("sepdiagmm", nbytes=nbytes, shape=y.shape, forward=forward, nflops=6*y.size):
+                    self._backend.csepdiagmm(y, factors, tmp, alpha=alpha * self._shift_sign,
+                        beta=beta, adjoint=not forward, shift=self._shift)
+
+
+class RealFFT(MatrixFreeOperator):
+    """
+    Unscaled FFT of real data of shape `ft_shape`, keeping only the
+    n0//2+1 nonredundant coefficients along axis 0. Maps real vectors onto
+    complex ones of roughly half the length, with about half the work of
+    UnscaledFFT. The adjoint is with respect to the real inner product
+    Re(x^H y) used by the solvers, and maps back onto real vectors.
+    """
+    def __init__(self, backend, ft_shape, dtype=np.dtype('complex64'), **kwargs):
+        self._ft_shape = tuple(ft_shape)
+        self._half_shape = (ft_shape[0] // 2 + 1,) + tuple(ft_shape[1:])
+        m, n = np.prod(self._half_shape), np.prod(self._ft_shape)
+        super().__init__(backend, shape=(m,n), dtype=dtype, **kwargs)
+        # the inverse transform counts each coefficient off the axis-0 edges
+        # twice, once for its discarded mirror image
+        w = np.full(self._half_shape[0], 0.5)
+        w[0] = 1
+        if ft_shape[0] % 2 == 0:
+            w[-1] = 1
+        weights = [w] + [np.ones(k) for k in ft_shape[1:]]
+        self._weight = backend.SeparableDiag(weights, dtype=dtype, name=self._name+'.weight')
+
+    @property
+    def real_dtype(self):
+        return np.empty(0, dtype=self.dtype).real.dtype
+
+    def _result_dtype(self, dtype, forward=True):
+        return self.dtype if forward else self.real_dtype
+
+    def _eval(self, y, x, alpha=1, beta=0, forward=True, left=True):
+        if not left:
+            raise NotImplementedError("Right-multiplication not implemented for {}.".format(self.__class__.__name__))
+        batch = x.shape[1]
+        lens = np.prod(self._ft_shape)
+        nflops = batch * 2.5 * lens * np.log2(lens)
+        with profile("rfft", nflops=nflops, shape=self._ft_shape + (batch,)):
+            if forward:
+                X = x.reshape( self._ft_shape + (batch,) )
+                Y = y.reshape( self._half_shape + (batch,) )
+                self._backend.rfftn(Y, X, alpha=alpha, beta=beta)
+            else:
+                with self._backend.scratch(shape=x.shape) as tmp:
+                    self._weight.eval(tmp, x)
+                    X = tmp.reshape( self._half_shape + (batch,) )
+                    Y = y.reshape( self._ft_shape + (batch,) )
+                    self._backend.irfftn(Y, X, alpha=alpha, beta=beta)
+
+    def _mem_usage(self, ncols):
+        ncols = min(ncols, self._batch or ncols)
+        return self.shape[0] * ncols * self.dtype.itemsize
+
+
+class Gridding(MatrixFreeOperator):
+    """
+    Interpolation from a Cartesian grid of shape `ft_shape` onto the
+    non-Cartesian points `coord`, equivalent to `Backend.Interp` but
+    matrix-free: only the coordinates and the kernel `table` are stored and
+    the weights are recomputed on every evaluation.
+    """
+    def __init__(self, backend, ft_shape, coord, width, table, **kwargs):
+        from indigo.interp import grid_bins
+        ndim = coord.shape[0]
+        self._ft_shape = tuple(int(n) for n in ft_shape)
+        self._width = width
+        self._coord = np.require(coord.reshape((ndim,-1), order='F'), dtype=np.float32, requirements='F')
+        self._table = np.require(table, dtype=np.float64)
+        self._bins = grid_bins(self._ft_shape, width, self._coord)
+        self._data_d = None
+        shape = (self._coord.shape[1], int(np.prod(self._ft_shape)))
+        super().__init__(backend, shape=shape, **kwargs)
+
+    @property
+    def nbytes(self):
+        return self._coord.nbytes + self._table.nbytes + sum(a.nbytes for a in self._bins)
+
+    def _get_or_create_device_data(self):
+        if self._data_d is None:
+            b = self._backend
+            coord = b.copy_array(self._coord, name=self._name+'.coord')
+            table = b.copy_array(self._table, name=self._name+'.table')
+            bins = tuple(b.copy_array(a, name=self._name+'.bins') for a in self._bins)
+            self._data_d = (coord, table, bins)
+        return self._data_d
+
+    def _eval(self, y, x, alpha=1, beta=0, forward=True, left=True):
+        if not left:
+            raise NotImplementedError("Right-multiplication not implemented for {}.".format(self.__class__.__name__))
+        coord, table, bins = self._get_or_create_device_data()
+        ntaps = int(2 * self._width) ** len(self._ft_shape)
+        nflops = 8 * self.shape[0] * ntaps * x.shape[1]
+        nbytes = self.nbytes + x.nbytes + y.nbytes
+        with profile("gridmm", nbytes=nbytes, shape=x.shape, forward=forward, nflops=nflops) as p:
+            self._backend.cgridmm(y, self._ft_shape, self._width, table, coord, bins,
+                x, alpha=alpha, beta=beta, adjoint=not forward)
+
+
+class SeparableDiag(MatrixFreeOperator):
+    """
+    Diagonal matrix whose diagonal is the outer product of one vector per
+    axis of a grid, with axis 0 varying fastest. Only the vectors are
+    stored; the product is formed on the fly during evaluation.
+    """
+    def __init__(self, backend, factors, dtype=np.dtype('complex64'), **kwargs):
+        factors = [np.require(np.ravel(f), dtype=dtype, requirements='C') for f in factors]
+        self._grid_shape = tuple(f.size for f in factors)
+        # the kernels see exactly three axes: pad with ones, fold extra ones
+        while len(factors) < 3:
+            factors.append(np.ones(1, dtype=dtype))
+        while len(factors) > 3:
+            factors[-2:] = [np.kron(factors[-1], factors[-2])]
+        self._factors = factors
+        self._factors_d = None
+        n = int(np.prod(self._grid_shape))
+        super().__init__(backend, shape=(n,n), dtype=dtype, **kwargs)
+
+    @property
+    def nbytes(self):
+        return sum(f.nbytes for f in self._factors)
+
+    def diagonal(self):
+        """ The full diagonal, as a flat array in axis-0-fastest order. """
+        d0, d1, d2 = self._factors
+        return np.kron(d2, np.kron(d1, d0))
+
+    def _get_or_create_device_data(self):
+        if self._factors_d is None:
+            b = self._backend
+            self._factors_d = tuple(b.copy_array(f, name=self._name+'.factor%d' % i)
+                for i, f in enumerate(self._factors))
+        return self._factors_d
+
+    def _eval(self, y, x, alpha=1, beta=0, forward=True, left=True):
+        if not left:
+            raise NotImplementedError("Right-multiplication not implemented for {}.".format(self.__class__.__name__))
+        factors = self._get_or_create_device_data()
+        nflops = 6 * x.size
+        nbytes = self.nbytes + x.nbytes + (0 if beta == 0 else y.nbytes) + y.nbytes
+        with profile("sepdiagmm", nbytes=nbytes, shape=x.shape, forward=forward, nflops=nflops) as p:
+            self._backend.csepdiagmm(y, factors, x, alpha=alpha, beta=beta, adjoint=not forward)
+
+
 class Eye(MatrixFreeOperator):
     def __init__(self, backend, n, **kwargs):
         super().__init__(backend, shape=(n,n), **kwargs)
@@ -510,6 +915,12 @@ class Product(BinaryOperator):
         return h, w
 
 
+    def _result_dtype(self, dtype, forward=True):
+        L, R = self._children
+        if forward:
+            return L._result_dtype(R._result_dtype(dtype, True), True)
+        return R._result_dtype(L._result_dtype(dtype, False), False)
+
     def _adopt(self, children):
         L, R = children
         if L.shape[1] != R.shape[0]:
@@ -521,7 +932,8 @@ class Product(BinaryOperator):
         if not left:
             raise NotImplementedError("Right-multiplication not implemented for {}.".format(self.__class__.__name__))
         L, R = self._children
-        with self._backend.scratch(shape=(R.shape[0],x.shape[1])) as tmp:
+        dtype = R._result_dtype(x.dtype) if forward else L._result_dtype(x.dtype, False)
+        with self._backend.scratch(shape=(R.shape[0],x.shape[1]), dtype=dtype) as tmp:
             if forward:
                 R.eval(tmp, x, alpha=alpha, beta=0, forward=True, left=left)
                 L.eval(y, tmp, alpha=1,  beta=beta, forward=True, left=left)
@@ -43,6 +43,36 @@ def test_Memusage_Product(backend, L, M, N, K, density, b0, b1, b2):
     assert nbytes_exp == nbytes_act
 
 
+@pytest.mark.parametrize("backend", BACKENDS )
+def test_Memusage_shared_pattern(backend):
+    b = backend()
+    D = [ b.Diag(indigo.util.rand64c(50), name='code%d' % i) for i in range(4) ]
+    A = b.VStack(D)
+
+    nnz = 4 * 50
+    index_nbytes = 50 * 4 + 51 * 4
+    assert A.memusage() == nnz * 8 + index_nbytes
+
+
+@pytest.mark.parametrize("backend", BACKENDS )
+def test_Memusage_pattern_key_cached(backend, monkeypatch):
+    b = backend()
+    S = b.SpMatrix( indigo.util.randM(30, 20, 0.2) )
+    calls = []
+    key = indigo.operators.sparsity_key
+    monkeypatch.setattr(indigo.operators, 'sparsity_key', lambda A: calls.append(A) or key(A))
+    nbytes = S.memusage()
+    assert S.memusage() == nbytes
+    assert len(calls) == 1
+
+    # a new matrix is hashed anew; an uploaded one reuses its device pattern's key
+    S._matrix = indigo.util.randM(30, 20, 0.2)
+    S._get_or_create_device_matrix()
+    S.memusage()
+    assert len(calls) == 1
+    assert S._sparsity_key() == S._matrix_d._pattern.key[1:]
+
+
 @pytest.mark.parametrize("backend", BACKENDS )
 def test_op_has(backend):
     from indigo.operators import UnscaledFFT, SpMatrix
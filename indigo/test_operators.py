@@ -254,6 +254,103 @@ def test_UnscaledFFT_3d(backend, M, N, K, B ):
     y_act = y.to_host().reshape( (M,N,K,B), order='F' )
     npt.assert_allclose(y_act, y_exp, rtol=1e-2)
 
+@pytest.mark.parametrize("backend,B", product( BACKENDS, [1,2,3] ))
+def test_UnscaledFFT_strided(backend, B):
+    b = backend()
+    F = b.UnscaledFFT( (6,5,4), dtype=np.dtype('complex64') )
+    x = indigo.util.rand64c(F.shape[1], B)
+    y = F * x
+    # stacked operators evaluate their children on row slices of y and x
+    npt.assert_allclose( b.VStack([F, F]) * x, np.vstack([y, y]), rtol=1e-4, atol=1e-4 )
+    npt.assert_allclose( b.HStack([F, F]).H * x, np.vstack([F.H * x] * 2), rtol=1e-4, atol=1e-4 )
+
+@pytest.mark.parametrize("backend,axes,B",
+    product( BACKENDS, [(0,),(1,),(2,),(0,1),(1,2),(0,2)], [1,3] )
+)
+def test_UnscaledFFT_axes(backend, axes, B):
+    b = backend()
+    shape = (6,5,4)
+    F = b.UnscaledFFT( shape, dtype=np.dtype('complex64'), axes=axes )
+    x = indigo.util.rand64c(F.shape[1], B)
+    x_h = x.reshape( shape + (B,), order='F' )
+    n = np.prod([shape[a] for a in axes])
+
+    y_exp = np.fft.fftn( x_h, axes=axes ).reshape( x.shape, order='F' )
+    npt.assert_allclose( F * x, y_exp, rtol=1e-4, atol=1e-4 )
+    y_exp = np.fft.ifftn( x_h, axes=axes ).reshape( x.shape, order='F' ) * n
+    npt.assert_allclose( F.H * x, y_exp, rtol=1e-4, atol=1e-4 )
+
+    # strided columns
+    npt.assert_allclose( b.VStack([F, F]) * x, np.vstack([F * x] * 2), rtol=1e-4, atol=1e-4 )
+
+@pytest.mark.parametrize("backend,centered", product( BACKENDS, [False, True] ))
+def test_FFT_axes_KronI(backend, centered):
+    b = backend()
+    c64 = np.dtype('complex64')
+    FFT = b.FFTc if centered else b.FFT
+    K = b.KronI( 4, FFT((6,5), c64) )
+    F = FFT( (6,5,4), c64, axes=(0,1) )
+    x = indigo.util.rand64c(K.shape[1], 2)
+    npt.assert_allclose( F * x, K * x, rtol=1e-4, atol=1e-5 )
+    npt.assert_allclose( F.H * x, K.H * x, rtol=1e-4, atol=1e-5 )
+
+@pytest.mark.parametrize("backend,forward,alpha,beta",
+    product( BACKENDS, [True, False], [1, 0.5, 2j], [0, 1, 0.5] )
+)
+def test_UnscaledFFT_alpha_beta(backend, forward, alpha, beta):
+    b = backend()
+    F = b.UnscaledFFT( (6,5,4), dtype=np.dtype('complex64') )
+    x_h = indigo.util.rand64c(F.shape[1], 2)
+    y_h = indigo.util.rand64c(F.shape[0], 2)
+    x, y = b.copy_array(x_h), b.copy_array(y_h)
+    F.eval(y, x, alpha=alpha, beta=beta, forward=forward)
+
+    x_h = x_h.reshape( (6,5,4,2), order='F' )
+    if forward:
+        F_x = np.fft.fftn( x_h, axes=(0,1,2) )
+    else:
+        F_x = np.fft.ifftn( x_h, axes=(0,1,2) ) * (6*5*4)
+    y_exp = alpha * F_x.reshape( y_h.shape, order='F' ) + beta * y_h
+    npt.assert_allclose(y.to_host(), y_exp, rtol=1e-4, atol=1e-4)
+
+    # strided columns
+    S = b.VStack([F, F]) if forward else b.HStack([F, F])
+    y_h = indigo.util.rand64c(2*F.shape[0], 2)
+    y = b.copy_array(y_h)
+    S.eval(y, x, alpha=alpha, beta=beta, forward=forward)
+    y_exp = np.vstack([alpha * F_x.reshape( (F.shape[0], 2), order='F' )] * 2) + beta * y_h
+    npt.assert_allclose(y.to_host(), y_exp, rtol=1e-4, atol=1e-4)
+
+@pytest.mark.parametrize("backend,shape,B",
+    product( BACKENDS, [(8,),(7,),(8,5),(7,6,3),(4,3,2,3)], [1,2] )
+)
+def test_RealFFT(backend, shape, B):
+    b = backend()
+    if getattr(b.rfftn, '__isabstractmethod__', False):
+        pytest.skip("backend does not implement real FFTs")
+    R = b.RealFFT(shape)
+    axes = tuple(reversed(range(len(shape))))
+    x = np.require(np.random.rand(R.shape[1], B), dtype=np.float32)
+    y = indigo.util.rand64c(R.shape[0], B)
+
+    Rx = R * x
+    assert Rx.dtype == np.complex64
+    Rx_exp = np.fft.rfftn(x.reshape(shape + (B,), order='F'), axes=axes)
+    npt.assert_allclose(Rx, Rx_exp.reshape(R.shape[0], B, order='F'), rtol=1e-4, atol=1e-4)
+
+    # adjoint in the real inner product
+    RHy = R.H * y
+    assert RHy.dtype == np.float32
+    npt.assert_allclose(np.vdot(Rx, y).real, np.vdot(x, RHy), rtol=1e-4)
+
+    # alpha, beta
+    y_d = b.copy_array(y)
+    R.eval(y_d, b.copy_array(x), alpha=0.5, beta=2)
+    npt.assert_allclose(y_d.to_host(), 0.5*Rx + 2*y, rtol=1e-4, atol=1e-4)
+    x_d = b.copy_array(x)
+    R.H.eval(x_d, b.copy_array(y), alpha=0.5, beta=2)
+    npt.assert_allclose(x_d.to_host(), 0.5*RHy + 2*x, rtol=1e-4, atol=1e-4)
+
 @pytest.mark.parametrize("backend,M,N,B",
     product( BACKENDS, [22,23,24], [22,23,24], [1,2,3,8] )
 )
@@ -367,6 +464,125 @@ def test_CenteredFFT(backend, M, N, K, B ):
     npt.assert_allclose(y_act, y_exp, rtol=1e-2)
 
 
+@pytest.mark.parametrize("backend,axes,shape",
+    product( BACKENDS, [(0,),(1,),(0,2),(1,2)], [(6,4,10),(6,5,10)] )
+)
+def test_CenteredFFT_axes(backend, axes, shape):
+    from numpy.fft import fftshift, ifftshift, fftn
+    b = backend()
+    A = b.FFTc( shape, dtype=np.dtype('complex64'), axes=axes )
+    x = indigo.util.rand64c(np.prod(shape), 2)
+    x_h = x.reshape( shape + (2,), order='F' )
+    y_exp = fftshift( fftn( ifftshift(x_h, axes=axes), axes=axes, norm='ortho'), axes=axes)
+    npt.assert_allclose( A * x, y_exp.reshape((-1,2), order='F'), rtol=1e-4, atol=1e-4 )
+    npt.assert_allclose( A.H * (A * x), x, rtol=1e-4, atol=1e-4 )
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_fft_shape(backend, tmp_path):
+    from indigo.fftshape import fft_shape, fft_cost, load_table, save_table
+    b = backend()
+    N, path = (100, 37, 50), str(tmp_path / 'fft.json')
+    shape = fft_shape(b, N, 1.25, 1.5, path=path)
+    for n, s in zip(N, shape):
+        assert 1.25 * n <= s <= 1.5 * n
+        assert all(fft_cost(s) <= fft_cost(m) for m in range(int(np.ceil(1.25*n)), int(1.5*n)+1))
+    assert shape == (128, 48, 64)
+
+    # measured times take precedence over the heuristic
+    save_table(b, {'130x50x70': {'2': 1.0}, '128x48x64': {'1': 0.6}, '256x48x64': {'1': 0.1}}, path)
+    assert fft_shape(b, N, 1.25, 1.5, path=path) == (130, 50, 70)
+
+    shape = fft_shape(b, (4,5,6), 1.25, 1.5, measure=True, path=path)
+    table = load_table(b, path)
+    assert len(table) == 3 + 2*1*2
+    assert 'x'.join(map(str, shape)) in table
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_NUFFT_osf_max(backend, tmp_path, monkeypatch):
+    monkeypatch.setenv('INDIGO_FFT_TABLE', str(tmp_path / 'fft.json'))
+    b = backend()
+    N, M = (8, 10, 6), 85
+    coord = (np.random.rand(3, M, 1) - 0.5).astype(np.float32)
+    A = b.NUFFT( (1,M,1), N, coord, oversamp=1.25, osf_max=1.5 )
+    F, = [op for op in _leaves(A) if hasattr(op, '_ft_shape') and len(op._ft_shape) == 3]
+    assert F._ft_shape == (10, 15, 8)
+
+    # compare against the exact non-uniform DFT, up to the NUFFT's global scale
+    img = indigo.util.rand64c(*N)
+    c = coord.reshape(3, -1)
+    E = [np.exp(-2j * np.pi * np.outer(c[i], np.arange(n) - n//2)) for i, n in enumerate(N)]
+    y_exp = np.einsum('ijk,mi,mj,mk->m', img, *E)
+    def error(A):
+        y_act = np.asarray(A * img.reshape((-1,1), order='F')).ravel()
+        y_act *= np.vdot(y_act, y_exp) / np.vdot(y_act, y_act)
+        return np.linalg.norm(y_act - y_exp) / np.linalg.norm(y_exp)
+
+    # the larger grid must be at least as accurate as the requested minimum
+    A_min = b.NUFFT( (1,M,1), N, coord, oversamp=1.25 )
+    assert error(A) < min(error(A_min), 0.2)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_fft_batch(backend, tmp_path, monkeypatch):
+    from indigo.fftshape import fft_batch, save_table
+    monkeypatch.setenv('INDIGO_FFT_TABLE', str(tmp_path / 'fft.json'))
+    b = backend()
+    c64, shape = np.dtype('complex64'), (6,5,4)
+    assert fft_batch(b, shape) is None
+    save_table(b, {'6x5x4': {'1': 1.0, '2': 0.5, '4': 1.6}, '4x5x6': {'1': 1.0}})
+    assert fft_batch(b, shape) == 2
+    assert fft_batch(b, (4,5,6)) is None
+    assert b.UnscaledFFT(shape, c64, axes=(0,1))._batch is None
+
+    # the table's batch size applies to plain and centered FFTs alike
+    x = indigo.util.rand64c(np.prod(shape), 5)
+    x_h = x.reshape( shape + (5,), order='F' )
+    F = b.UnscaledFFT(shape, c64)
+    assert F._batch == 2
+    y_exp = np.fft.fftn( x_h, axes=(0,1,2) ).reshape( x.shape, order='F' )
+    npt.assert_allclose( F * x, y_exp, rtol=1e-4, atol=1e-4 )
+    A = b.FFTc(shape, c64)
+    ffts = [getattr(op, '_fft', op) for op in _leaves(A)]
+    assert [op._batch for op in ffts if isinstance(op, indigo.operators.UnscaledFFT)] == [2]
+    y_exp = np.fft.fftshift( np.fft.fftn( np.fft.ifftshift(x_h, axes=(0,1,2)), axes=(0,1,2), norm='ortho' ), axes=(0,1,2) )
+    npt.assert_allclose( A * x, y_exp.reshape( x.shape, order='F' ), rtol=1e-4, atol=1e-4 )
+
+
+def _leaves(A):
+    children = getattr(A, '_children', ())
+    return [A] if not children else [l for c in children for l in _leaves(c)]
+
+
+@pytest.mark.parametrize("backend,normalize,B,alpha,beta,N",
+    product( BACKENDS, [True,False], [1,3], [1,0.5], [0,0.5], [9,10] )
+)
+def test_CenteredFFT_alpha_beta(backend, normalize, B, alpha, beta, N):
+    from numpy.fft import fftshift, ifftshift, fftn, ifftn
+    b = backend()
+    M, K = 6, 4
+    A = b.FFTc( (M,N,K), dtype=np.dtype('complex64'), normalize=normalize )
+    ax, norm = (0,1,2), 'ortho' if normalize else 'backward'
+    scale = 1 if normalize else M*N*K
+
+    x = indigo.util.rand64c(M*N*K, B)
+    y = indigo.util.rand64c(M*N*K, B)
+    x_h = x.reshape( (M,N,K,B), order='F' )
+
+    y_d = b.copy_array(y)
+    A.eval(y_d, b.copy_array(x), alpha=alpha, beta=beta)
+    y_exp = fftshift( fftn( ifftshift(x_h, axes=ax), axes=ax, norm=norm), axes=ax)
+    y_exp = alpha * y_exp.reshape((-1,B), order='F') + beta * y
+    npt.assert_allclose(y_d.to_host(), y_exp, rtol=1e-4, atol=1e-4)
+
+    y_d = b.copy_array(y)
+    A.H.eval(y_d, b.copy_array(x), alpha=alpha, beta=beta)
+    y_exp = fftshift( ifftn( ifftshift(x_h, axes=ax), axes=ax, norm=norm), axes=ax) * scale
+    y_exp = alpha * y_exp.reshape((-1,B), order='F') + beta * y
+    npt.assert_allclose(y_d.to_host(), y_exp, rtol=1e-4, atol=1e-4)
+
+
 @pytest.mark.parametrize("backend,batch,x,y,z,px,py,pz",
     product( BACKENDS, [1,2,4,8], [3,4],[3,4],[3,4],
                                   [0,1,2],[0,1,2],[0,1,2] )
@@ -432,6 +648,192 @@ def test_interp(backend, batch, x, y, z, ro, tr):
     np.testing.assert_allclose( np.dot(Au,v), np.dot(u,AHv), atol=1e-3 )
 
 
+@pytest.mark.parametrize("backend,ndim,width",
+    product( BACKENDS, [1,2,3], [1.5,2,3] )
+)
+def test_interp_ndim(backend, ndim, width):
+    from indigo.interp import lin_interp
+    b = backend()
+    N = (9, 4, 7)[:ndim]
+    coord = np.random.rand(ndim, 6, 5) - 0.5
+    table = np.random.random(129)
+    A = b.Interp( N, coord, width, table, dtype=np.complex64 )
+    assert A._matrix.indices.dtype == np.int32
+    assert A._matrix.has_sorted_indices
+
+    # reference: product of per-axis kernel weights, accumulated densely
+    coord = coord.reshape((ndim,-1), order='F')
+    A_ref = np.zeros(A.shape)
+    for i in range(coord.shape[1]):
+        taps = []
+        for a in range(ndim):
+            p = N[a] * coord[a,i] + N[a] // 2
+            g = np.arange(np.ceil(p - width), np.floor(p + width)).astype(int)
+            taps.append([ (t % N[a], lin_interp(table, abs(t - p) / width)) for t in g ])
+        for tap in product(*taps):
+            j = np.ravel_multi_index([t[0] for t in tap], N, order='F')
+            A_ref[i,j] += np.prod([t[1] for t in tap])
+    np.testing.assert_allclose( A._matrix.toarray(), A_ref, rtol=1e-5, atol=1e-6 )
+
+
+@pytest.mark.parametrize("backend,quantize",
+    product( BACKENDS, [False, True] )
+)
+def test_interp_max_bytes(backend, quantize):
+    import tracemalloc
+    b = backend()
+    N, width = (16, 16, 16), 2
+    coord = np.random.rand(3, 5000) - 0.5
+    table = np.random.random(129)
+    A = b.Interp( N, coord, width, table, quantize=quantize )
+    A._get_or_create_device_matrix()
+    assert A.dtype == np.dtype('complex64')
+    nbytes = A._matrix.data.nbytes + A._matrix.indices.nbytes + A._matrix.indptr.nbytes
+    with pytest.raises(MemoryError):
+        b.Interp( N, coord, width, table, quantize=quantize, max_bytes=nbytes )
+
+    # the limit holds through building and uploading the matrix
+    max_bytes = 3 * nbytes
+    tracemalloc.start()
+    B = b.Interp( N, coord, width, table, quantize=quantize, max_bytes=max_bytes )
+    B._get_or_create_device_matrix()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak <= max_bytes
+    np.testing.assert_array_equal( B._matrix.indices, A._matrix.indices )
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_interp_blocks(quantize):
+    from indigo.interp import interp_mat, interp_lut, interp_layout
+    N, width = (9, 12, 4), 2.5
+    coord = np.random.rand(3, 3000) - 0.5
+    table = np.random.random(129)
+    build = interp_lut if quantize else lambda *args, **kw: (interp_mat(*args[:5], 1, **kw),)
+    A = build( 3000, N, width, table, coord, dtype=np.complex64 )[0]
+    nnz, idx_dtype = interp_layout( 3000, N, width, coord, merge=not quantize )
+    assert A.nnz == nnz and A.indices.dtype == idx_dtype
+    nbytes = nnz * (idx_dtype.itemsize + 8 + 3*quantize) + 3001 * idx_dtype.itemsize
+    with pytest.raises(MemoryError):
+        build( 3000, N, width, table, coord, dtype=np.complex64, max_bytes=nbytes + 8*1023 )
+    B = build( 3000, N, width, table, coord, dtype=np.complex64, max_bytes=nbytes + 8*1024 )[0]
+    for attr in ('indptr', 'indices', 'data'):
+        np.testing.assert_array_equal( getattr(B, attr), getattr(A, attr) )
+
+
+@pytest.mark.parametrize("backend,batch,width",
+    product( BACKENDS, [1,3], [1.5,3] )
+)
+def test_interp_quantized(backend, batch, width):
+    from indigo.analyses import Memusage
+    b = backend()
+    N = (12, 10, 16)
+    coord = (np.random.rand(3, 9, 11) - 0.5).astype(np.float32)
+    table = np.kaiser(257, 8)[128:]
+    A = b.Interp( N, coord, width, table, dtype=np.complex64 )
+    Q = b.Interp( N, coord, width, table, dtype=np.complex64, quantize=True )
+    if getattr(b.clutmm, '__isabstractmethod__', False):
+        assert Q._format == 'csr'
+    else:
+        assert Q._format == 'lut'
+        assert Memusage().measure(Q) < Memusage().measure(A)
+
+    u = indigo.util.rand64c(A.shape[1], batch)
+    v = indigo.util.rand64c(A.shape[0], batch)
+    np.testing.assert_allclose( Q * u, A * u, rtol=0.05, atol=0.05 )
+    np.testing.assert_allclose( Q * u, Q._matrix @ u, rtol=1e-4, atol=1e-4 )
+    np.testing.assert_allclose( Q.H * v, Q._matrix.H @ v, rtol=1e-4, atol=1e-4 )
+
+    # table indices don't survive a replaced matrix
+    Q._matrix = 2 * Q._matrix
+    assert Q._lut is None and Q._format == 'csr'
+
+
+@pytest.mark.parametrize("backend,batch,x,y,z,width",
+    product( BACKENDS, [1,3], [8,9], [7], [6,16], [1.5,2,3] )
+)
+def test_Gridding(backend, batch, x, y, z, width):
+    b = backend()
+    if getattr(b.cgridmm, '__isabstractmethod__', False):
+        pytest.skip("backend does not implement cgridmm")
+    N = (z, y, x)
+    coord = (np.random.rand(3, 5, 7) - 0.5).astype(np.float32)
+    table = np.random.random(129)
+    A = b.Interp( N, coord, width, table, dtype=np.complex64 )
+    G = b.Gridding( N, coord, width, table )
+    assert G.shape == A.shape
+
+    u = indigo.util.rand64c(A.shape[1], batch)
+    v = indigo.util.rand64c(A.shape[0], batch)
+    np.testing.assert_allclose( G * u, A * u, rtol=1e-4, atol=1e-4 )
+    np.testing.assert_allclose( G.H * v, A.H * v, rtol=1e-4, atol=1e-4 )
+
+    # alpha and beta
+    v_d = b.copy_array(v)
+    G.eval(v_d, b.copy_array(u), alpha=2, beta=0.5)
+    np.testing.assert_allclose( v_d.to_host(), 2 * (A * u) + 0.5 * v, rtol=1e-4, atol=1e-4 )
+    u_d = b.copy_array(u)
+    G.H.eval(u_d, b.copy_array(v), alpha=2, beta=1)
+    np.testing.assert_allclose( u_d.to_host(), 2 * (A.H * v) + u, rtol=1e-4, atol=1e-4 )
+
+
+@pytest.mark.parametrize("backend,batch,N",
+    product( BACKENDS, [1,3], [(7,),(4,5),(3,4,5),(2,3,4,3)] )
+)
+def test_SeparableDiag(backend, batch, N):
+    b = backend()
+    factors = [indigo.util.rand64c(n) for n in N]
+    D = b.SeparableDiag(factors)
+    d = np.ones(1)
+    for f in factors:
+        d = np.kron(f, d)
+    A = b.Diag(d)
+    assert D.shape == A.shape
+
+    u = indigo.util.rand64c(A.shape[1], batch)
+    v = indigo.util.rand64c(A.shape[0], batch)
+    np.testing.assert_allclose( D * u, A * u, rtol=1e-4, atol=1e-5 )
+    np.testing.assert_allclose( D.H * v, A.H * v, rtol=1e-4, atol=1e-5 )
+
+    # alpha and beta
+    v_d = b.copy_array(v)
+    D.eval(v_d, b.copy_array(u), alpha=2, beta=0.5)
+    np.testing.assert_allclose( v_d.to_host(), 2 * (A * u) + 0.5 * v, rtol=1e-4, atol=1e-5 )
+    u_d = b.copy_array(u)
+    D.H.eval(u_d, b.copy_array(v), alpha=2, beta=1)
+    np.testing.assert_allclose( u_d.to_host(), 2 * (A.H * v) + u, rtol=1e-4, atol=1e-5 )
+
+
+@pytest.mark.parametrize("backend,batch,matrix_free",
+    product( BACKENDS, [1,3], [False,True] )
+)
+def test_NUFFT_reorder(backend, batch, matrix_free):
+    from indigo.interp import morton_order
+    b = backend()
+    if matrix_free and getattr(b.cgridmm, '__isabstractmethod__', False):
+        pytest.skip("backend does not implement cgridmm")
+    N = (8, 10, 6)
+    coord = (np.random.rand(3, 17, 5) - 0.5).astype(np.float32)
+    A = b.NUFFT( (1,17,5), N, coord, oversamp=1.5, matrix_free=matrix_free )
+    B = b.NUFFT( (1,17,5), N, coord, oversamp=1.5, matrix_free=matrix_free, reorder=True )
+    assert A.shape == B.shape
+
+    order = morton_order((12, 15, 9), coord.reshape((3,-1), order='F'))
+    assert sorted(order) == list(range(85))
+
+    x = indigo.util.rand64c(A.shape[1], batch)
+    y = indigo.util.rand64c(A.shape[0], batch)
+    np.testing.assert_allclose( B * x, A * x, rtol=1e-4, atol=1e-4 )
+    np.testing.assert_allclose( B.H * y, A.H * y, rtol=1e-4, atol=1e-4 )
+
+    # realization must not fold the permutation back into the interpolation
+    from indigo.operators import Permutation
+    R = B.realize()
+    assert R.has(Permutation)
+    np.testing.assert_allclose( R * x, A * x, rtol=1e-4, atol=1e-4 )
+    np.testing.assert_allclose( R.H * y, A.H * y, rtol=1e-4, atol=1e-4 )
+
+
 @pytest.mark.parametrize("backend,batch,M,N,c1,c2",
     product( BACKENDS, [1,2,4,8], [3,4],[3,4], [4,5],[3,6] )
 )
@@ -666,3 +1068,22 @@ def test_Convolution(backend, M, N, P):
 
     pytest.xfail("under development")
     #npt.assert_allclose(y_act, y_exp, rtol=1e-5)
+
+
+@pytest.mark.parametrize("backend,M,N,normalize",
+    product( BACKENDS, [8,9], [6,7], [True, False] ))
+def test_Convolution_real(backend, M, N, normalize):
+    b = backend()
+    if getattr(b.rfftn, '__isabstractmethod__', False):
+        pytest.skip("backend does not implement real FFTs")
+    k = np.random.rand(M,N)
+    x = np.require(np.random.rand(M*N, 2), dtype=np.float32)
+
+    C = b.Convolution(k.astype(np.complex64), normalize=normalize)
+    R = b.Convolution(k, normalize=normalize, real=True)
+
+    y_exp = C * x.astype(np.complex64)
+    y_act = R * x
+    assert y_act.dtype == np.float32
+    npt.assert_allclose(y_act, y_exp.real, rtol=1e-4, atol=1e-5)
+    npt.assert_allclose((R.H * R) * x, ((C.H * C) * x.astype(np.complex64)).real, rtol=1e-4, atol=1e-5)
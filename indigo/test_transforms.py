@@ -193,3 +193,173 @@ def test_LiftUFFTS2(backend, M, N):
     b = backend()
     A = b.UnscaledFFT((M,N), dtype=np.complex64).realize().H
     LiftUnscaledFFTs().visit(A)
+
+@pytest.mark.parametrize("backend,K", list(product( BACKENDS, [1,3] )))
+def test_Realize_CenteredFFT(backend, K):
+    from indigo.operators import SpMatrix, CenteredFFT, UnscaledFFT
+    from indigo.transforms import SplitCenteredFFTs
+    b = backend()
+    shape = (4, 6, 5)
+    n = np.prod(shape)
+    F = b.FFTc(shape, dtype=np.dtype('complex64'))
+    G = b.SpMatrix(indigo.util.randM(7, n, 0.3))
+    Z = b.SpMatrix(indigo.util.randM(n, 9, 0.3))
+    x = indigo.util.rand64c(9, K)
+    u = indigo.util.rand64c(n, K)
+
+    # a matrix on either side absorbs the adjacent modulation
+    for A, v in ((G * F, u), (F * Z, x)):
+        R = A.realize()
+        assert not R.has(CenteredFFT) and R.has(UnscaledFFT)
+        if isinstance(F, CenteredFFT):
+            assert sum(isinstance(c, SpMatrix) for c in R.children) == 1
+        npt.assert_allclose(R * v, A * v, rtol=1e-3, atol=1e-4)
+
+    A = G * F * Z
+    S = SplitCenteredFFTs().visit(G * F * Z)
+    assert not S.has(CenteredFFT) and S.has(UnscaledFFT)
+    npt.assert_allclose(S * x, A * x, rtol=1e-3, atol=1e-4)
+
+
+@pytest.mark.parametrize("backend,M,N,R,K",
+    list(product( BACKENDS, [3,4], [5,6], [2,4], [1,3]))
+)
+def test_Realize_Kron_Blocks(backend, M, N, R, K):
+    from indigo.operators import SpMatrix
+    b = backend()
+    A_h = indigo.util.randM(M, N, 0.5)
+    B_h = indigo.util.rand64c(R, R)
+    A = b.Kron( b.SpMatrix(A_h), b.SpMatrix(spp.csr_matrix(B_h)) )
+    A = A.realize()
+    assert isinstance(A, SpMatrix)
+    if not getattr(b.cbsrmm, '__isabstractmethod__', False):
+        # dense neighbouring entries of A_h can make larger blocks cheaper
+        assert A._blocksize is not None and A._blocksize[0] % R == 0
+        assert A._nblocks == A._matrix.tobsr(A._blocksize).indices.size
+
+    K_h = spp.kron(A_h, B_h)
+    x = b.rand_array((K_h.shape[1],K))
+    y = b.rand_array((K_h.shape[0],K))
+    A.eval(y, x)
+    npt.assert_allclose(y.to_host(), K_h @ x.to_host(), rtol=1e-3)
+
+
+@pytest.mark.parametrize("backend,C,K", list(product(BACKENDS, [3,4,8], [1,5])))
+def test_Realize_Kron_Stacked(backend, C, K):
+    from indigo.operators import SpMatrix
+    from indigo.analyses import Memusage
+    b = backend()
+    P, N = 30, 200
+    G = b.SpMatrix(indigo.util.randM(P, N, 0.1), name='G')
+    S = b.VStack([b.Diag(indigo.util.rand64c(N,1), name='S%d' % c) for c in range(C)])
+    A = b.KronI(C, G) * S
+    A = A.realize()
+    assert isinstance(A, SpMatrix)
+    M_h = A._matrix.copy()
+    if getattr(b.cbsrmm, '__isabstractmethod__', False) or b.bsr_matrix._square_blocks:
+        assert A._stack_height is None
+    else:
+        assert A._stack_height == C and A._blocksize == (C, 1)
+        assert A._nblocks == M_h.nnz // C
+        assert Memusage().measure(A) < (12 * M_h.nnz + 4 * (M_h.shape[0]+1)) + 8 * M_h.shape[0]
+
+    x = b.rand_array((N,K))
+    y = b.rand_array((C*P,K))
+    A.eval(y, x)
+    npt.assert_allclose(y.to_host(), M_h @ x.to_host(), rtol=1e-3, atol=1e-5)
+
+    x = b.rand_array((C*P,K))
+    y = b.rand_array((N,K))
+    A.H.eval(y, x)
+    npt.assert_allclose(y.to_host(), M_h.H @ x.to_host(), rtol=1e-3, atol=1e-5)
+
+
+@pytest.mark.parametrize("backend,kind,K",
+    list(product( BACKENDS, ['random','diag','codes','zpad','perm','blocks'], [1,5] ))
+)
+def test_SelectFormats(backend, kind, K):
+    from indigo.transforms import SelectFormats
+    b = backend()
+    n = 48
+    if kind == 'random':
+        M_h, expected = indigo.util.randM(n, n, 0.3), ['csr']
+    elif kind == 'diag':
+        M_h, expected = spp.diags(indigo.util.rand64c(n)), ['dia']
+    elif kind == 'codes':
+        M_h, expected = spp.vstack([spp.diags(indigo.util.rand64c(n)) for c in range(3)]), ['dia']
+    elif kind == 'zpad':
+        M_h, expected = spp.eye(2*n, n, k=-n//2), ['sel', 'dia']
+    elif kind == 'perm':
+        M_h, expected = spp.eye(n).tocsr()[np.random.permutation(n)], ['sel']
+    elif kind == 'blocks':
+        M_h = spp.kron(indigo.util.randM(n//4, n//4, 0.2), np.ones((4,4)))
+        expected = ['bsr']
+    M_h = spp.csr_matrix(M_h, dtype=np.complex64)
+    expected = [f for f in expected + ['csr'] if f in b.native_formats()][0]
+
+    A = SelectFormats().visit( b.SpMatrix(M_h, name=kind) )
+    assert A._format == expected
+
+    x = b.rand_array((M_h.shape[1],K))
+    y = b.rand_array((M_h.shape[0],K))
+    A.eval(y, x)
+    npt.assert_allclose(y.to_host(), M_h @ x.to_host(), rtol=1e-3, atol=1e-5)
+
+    x = b.rand_array((M_h.shape[0],K))
+    y = b.rand_array((M_h.shape[1],K))
+    A.H.eval(y, x)
+    npt.assert_allclose(y.to_host(), M_h.H @ x.to_host(), rtol=1e-3, atol=1e-5)
+
+
+@pytest.mark.parametrize("backend,span", product(BACKENDS, [48**2, 2**16]))
+def test_SelectFormats_csr16(backend, span):
+    from indigo.transforms import SelectFormats
+    from indigo.analyses import Memusage
+    b = backend()
+    # 2x2x2 interpolation neighbourhoods around random points of a 48^3 grid
+    n, m = 48**3, 5000
+    nbhd = np.array([0, 1, 48, 49, span, span+1, span+48, span+49])
+    cols = np.random.randint(0, n - nbhd[-1], m)[:,None] + nbhd
+    rows = np.repeat(np.arange(m), nbhd.size)
+    M_h = spp.csr_matrix( (indigo.util.rand64c(rows.size), (rows, cols.ravel())), shape=(m,n) )
+
+    sf = SelectFormats()
+    sf.streaming_bytes = 0
+    A = sf.visit( b.SpMatrix(M_h, name='interp') )
+    if getattr(b.ccsr16mm, '__isabstractmethod__', False) or span >= 2**16:
+        assert A._format != 'csr16'
+        return
+    assert A._format == 'csr16'
+    assert Memusage().measure(A) < 12 * M_h.nnz + 4 * (m+1)
+
+    x = b.rand_array((n,2))
+    y = b.rand_array((m,2))
+    A.eval(y, x)
+    npt.assert_allclose(y.to_host(), M_h @ x.to_host(), rtol=1e-3)
+
+
+@pytest.mark.parametrize("backend,C,K", list(product(BACKENDS, [3,4,8], [1,5])))
+def test_SelectFormats_stacked(backend, C, K):
+    from indigo.transforms import SelectFormats
+    from indigo.analyses import Memusage
+    b = backend()
+    P, N = 30, 200
+    M_h = spp.vstack([indigo.util.randM(P, N, 0.05)] * C).tocsr()
+    M_h.data = indigo.util.rand64c(M_h.nnz)
+    A = SelectFormats().visit( b.SpMatrix(M_h, name='stack') )
+    if getattr(b.cbsrmm, '__isabstractmethod__', False) or b.bsr_matrix._square_blocks:
+        assert A._stack_height is None
+    else:
+        assert A._format == 'bsr' and A._blocksize == (C, 1) and A._stack_height == C
+        assert A._nblocks == M_h.nnz // C
+        assert Memusage().measure(A) < (12 * M_h.nnz + 4 * (M_h.shape[0]+1)) + 8 * M_h.shape[0]
+
+    x = b.rand_array((N,K))
+    y = b.rand_array((C*P,K))
+    A.eval(y, x)
+    npt.assert_allclose(y.to_host(), M_h @ x.to_host(), rtol=1e-3, atol=1e-5)
+
+    x = b.rand_array((C*P,K))
+    y = b.rand_array((N,K))
+    A.H.eval(y, x)
+    npt.assert_allclose(y.to_host(), M_h.H @ x.to_host(), rtol=1e-3, atol=1e-5)
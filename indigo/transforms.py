@@ -1,4 +1,5 @@
 import copy
+import math
 import random
 import logging
 import numpy as np
@@ -10,7 +11,7 @@ from indigo.operators import (
     CompositeOperator, Product,
     Eye, BlockDiag, Kron,
     VStack, SpMatrix,
-    Adjoint, UnscaledFFT,
+    Adjoint, UnscaledFFT, CenteredFFT,
 )
 
 log = logging.getLogger(__name__)
@@ -78,20 +79,133 @@ class Optimize(Transform):
         return node
 
 
+def _implements(backend, method):
+    """ True if `backend` overrides the abstract kernel named `method`. """
+    return not getattr(getattr(backend, method), '__isabstractmethod__', False)
+
+
+def count_blocks(M, blocksize):
+    """ Number of blocks of shape `blocksize` holding nonzeros of `M`. """
+    r, c = blocksize
+    M = M.tocoo()
+    ids = (M.row.astype(np.int64) // r) * (M.shape[1] // c) + M.col // c
+    return np.unique(ids).size
+
+
+def find_blocksize(M, sizes=(2,3,4,6,8)):
+    """
+    Looks for dense square blocks in sparse matrix `M`. Returns the block
+    size (r, r) that minimizes bytes streamed per evaluation, or None if
+    plain CSR is cheaper. CSR costs 12 bytes per nonzero, BSR costs 8 bytes
+    per stored (possibly zero) block entry plus 4 per block.
+    """
+    m, n = M.shape
+    M = M.tocoo()
+    best_bytes, best_size = 12 * M.nnz + 4 * (m+1), None
+    for r in sizes:
+        if m % r or n % r or M.nnz < r*r:
+            continue
+        nblocks = count_blocks(M, (r, r))
+        nbytes = nblocks * (8*r*r + 4) + 4 * (m//r + 1)
+        if nbytes < best_bytes:
+            best_bytes, best_size = nbytes, (r, r)
+    return best_size
+
+
+def find_stack_height(M):
+    """
+    Looks for sparse matrix `M` being C row-wise stacked copies of a single
+    sparsity pattern, as realized coil stacks like Kron(I_C, A) * VStack(S)
+    are. Returns the largest such C > 1, or None. Interleaving the rows of
+    the copies turns each column index of the pattern into a dense (C, 1)
+    block.
+    """
+    M = M.tocsr()
+    if M.nnz == 0:
+        return None
+    if not M.has_sorted_indices:
+        M = M.sorted_indices()
+    m, rowlens = M.shape[0], np.diff(M.indptr)
+    g = math.gcd(m, M.nnz)
+    divisors = set()
+    for d in range(1, int(math.sqrt(g)) + 1):
+        if g % d == 0:
+            divisors.update((d, g // d))
+    for C in sorted(divisors - {1, m}, reverse=True):
+        if np.any(rowlens.reshape(C, -1) != rowlens[:m//C]):
+            continue
+        indices = M.indices.reshape(C, -1)
+        if np.all(indices == indices[0]):
+            return C
+    return None
+
+
+def stacked_bytes(backend, M, height):
+    """
+    Bytes streamed per evaluation by `M` stored as `height` stacked copies
+    with interleaved rows in (height, 1) blocks. The rows are unstacked by a
+    permutation, stored as a selection matrix (4 bytes per row) or in CSR
+    (16), that also writes and reads the interleaved rows in scratch (16).
+    """
+    m, nnz = M.shape[0], M.nnz
+    unstack = 4 if _implements(backend, 'cselmm') else 16
+    return nnz // height * (8*height + 4) + 4 * (m//height + 1) + (unstack + 16) * m
+
+
 class RealizeMatrices(Transform):
     """
     Converts CompositeOps into SpMatrix ops if all
     children of the CompositeOp are SpMatrices.
     """
+    def _maybe_block(self, node):
+        """ Requests BSR storage if the backend supports it and node has dense blocks. """
+        if not _implements(node._backend, 'cbsrmm'):
+            return node
+        blocksize = find_blocksize(node._matrix)
+        if blocksize is not None:
+            log.debug('detected %dx%d blocks in %s', *blocksize, node._name)
+            node._format, node._blocksize = 'bsr', blocksize
+            node._nblocks = count_blocks(node._matrix, blocksize)
+        return node
+
+    def _maybe_stack(self, node):
+        """
+        Requests BSR storage with (C, 1) blocks of interleaved rows if node
+        stacks C copies of one sparsity pattern and that streams fewer bytes
+        than CSR.
+        """
+        b = node._backend
+        if not _implements(b, 'cbsrmm') or b.bsr_matrix._square_blocks:
+            return node
+        M = node._matrix
+        height = find_stack_height(M)
+        if height is None:
+            return node
+        m, nnz = M.shape[0], M.nnz
+        if stacked_bytes(b, M, height) < 12 * nnz + 4 * (m+1):
+            log.debug('detected %d stacked copies of one pattern in %s', height, node._name)
+            node._format, node._blocksize = 'bsr', (height, 1)
+            node._stack_height, node._nblocks = height, nnz // height
+        return node
+
     def visit_Product(self, node):
-        """ Product( SpMatrices+ ) => SpMatrix """
+        """
+        Product( SpMatrices+ ) => SpMatrix. A CenteredFFT next to an
+        SpMatrix is split so the matrix absorbs the adjacent modulation.
+        """
         node = self.generic_visit(node)
         left, right = node._children
+        if isinstance(left, SpMatrix) and isinstance(right, CenteredFFT):
+            log.debug('absorbing the modulation of %s into %s', right._name, left._name)
+            return self.visit(left * right._post) * (right._fft * right._pre)
+        if isinstance(left, CenteredFFT) and isinstance(right, SpMatrix):
+            log.debug('absorbing the modulation of %s into %s', left._name, right._name)
+            return (left._post * left._fft) * self.visit(left._pre * right)
         if isinstance(left, SpMatrix) and isinstance(right, SpMatrix):
             name = "{}*{}".format(left._name, right._name)
             log.debug('realizing product %s * %s', left._name, right._name)
             m = left._matrix @ right._matrix
-            return SpMatrix( node._backend, m, name=name )
+            return self._maybe_stack( SpMatrix( node._backend, m, name=name ) )
         else:
             return node
 
@@ -103,7 +217,7 @@ class RealizeMatrices(Transform):
             dtype = node._children[0].dtype
             log.debug('realizing vstack %s', ', '.join(c._name for c in node._children))
             m = spp.vstack( [c._matrix for c in node._children], dtype=dtype )
-            return SpMatrix( node._backend, m, name=name )
+            return self._maybe_block( SpMatrix( node._backend, m, name=name ) )
         else:
             return node
     
@@ -141,7 +255,7 @@ class RealizeMatrices(Transform):
             name = "({}(x){})".format(L._name, R._name)
             log.debug('realizing kron %s x %s', L._name, R._name)
             K = spp.kron(L._matrix, R._matrix)
-            return SpMatrix( node._backend, K, name=name )
+            return self._maybe_block( SpMatrix( node._backend, K, name=name ) )
         else:
             return node
 
@@ -162,6 +276,10 @@ class RealizeMatrices(Transform):
         eye = spp.eye(node.shape[0], dtype=node.dtype)
         return SpMatrix( node._backend, eye, name=node._name )
 
+    def visit_SeparableDiag(self, node):
+        diag = spp.diags(node.diagonal(), offsets=0, format='csr', dtype=node.dtype)
+        return SpMatrix( node._backend, diag, name=node._name )
+
     def visit_Scale(self, node):
         node = self.generic_visit(node)
         if isinstance(node.child, SpMatrix):
@@ -175,6 +293,102 @@ class RealizeMatrices(Transform):
         return SpMatrix( node._backend, one, name=node._name)
 
 
+class SelectFormats(Transform):
+    """
+    Chooses a device storage format for each SpMatrix by estimating the
+    bytes of matrix data streamed per evaluation:
+
+      csr  12 bytes per nonzero plus 4 per row
+      bsr  8 bytes per stored block entry plus 4 per block and block row
+      stacked  bsr with (C, 1) blocks for C stacked copies of one sparsity
+           pattern with interleaved rows, plus the permutation that unstacks
+           them (see `stacked_bytes`); only for backends that take
+           non-square blocks
+      dia  8 bytes per stored diagonal entry (including padding) plus 4 per
+           diagonal; a lone main diagonal is a dense vector
+      sel  4 bytes per row, for unit-valued matrices with at most one entry
+           per row and distinct columns (permutations, zero-padding, cropping)
+      csr16  10 bytes per nonzero plus 8 per row, for matrices whose rows
+           each span fewer than 2**16 columns; only considered once the CSR
+           matrix exceeds `streaming_bytes`, below which it stays in cache
+      lut  4 bytes per nonzero plus 1 per nonzero and axis, plus 4 per row,
+           for quantized interpolation matrices (`Backend.Interp(quantize=True)`)
+
+    Only the backend's `native_formats` are considered, and CSR wins ties.
+    The reasons for each choice are logged.
+    """
+    streaming_bytes = 1 << 25
+
+    def visit_SpMatrix(self, node):
+        M = node._matrix.tocsr()
+        (m, n), nnz = M.shape, M.nnz
+        b = node._backend
+        formats = b.native_formats()
+
+        rowlens = np.diff(M.indptr)
+        collens = np.bincount(M.indices, minlength=n)
+        overlap = int((collens > 1).sum())
+        coo = M.tocoo()
+        offsets = np.unique(coo.col.astype(np.int64) - coo.row)
+        cv = rowlens.std() / rowlens.mean() if nnz else 0.0
+
+        costs = dict(csr=12*nnz + 4*(m+1))
+        if 'dia' in formats and nnz:
+            costs['dia'] = offsets.size * (8*n + 4)
+        blocksize = find_blocksize(M) if 'bsr' in formats else None
+        if blocksize is not None:
+            r, c = blocksize
+            nblocks = count_blocks(M, blocksize)
+            costs['bsr'] = nblocks * (8*r*c + 4) + 4 * (m//r + 1)
+        height = None
+        if 'bsr' in formats and not b.bsr_matrix._square_blocks:
+            height = find_stack_height(M)
+        if height is not None:
+            costs['stacked'] = stacked_bytes(b, M, height)
+        if 'sel' in formats and rowlens.max(initial=0) <= 1 and \
+                overlap == 0 and np.all(M.data == 1):
+            costs['sel'] = 4*m
+        if 'csr16' in formats and costs['csr'] > self.streaming_bytes and \
+                b.csr16_matrix.row_span(M) < 2**16:
+            costs['csr16'] = 10*nnz + 8*m + 4
+
+        if 'lut' in formats and node._lut is not None:
+            lut, levels = node._lut
+            costs['lut'] = 4*nnz + lut.nbytes + levels.nbytes + 4*(m+1)
+
+        fmt = min(costs, key=lambda f: (costs[f], f != 'csr'))
+        if fmt == 'stacked':
+            blocksize, nblocks = (height, 1), nnz // height
+        else:
+            height = None
+        node._format = 'bsr' if fmt == 'stacked' else fmt
+        node._blocksize = blocksize if node._format == 'bsr' else None
+        node._nblocks = nblocks if node._format == 'bsr' else None
+        node._stack_height = height
+        if fmt == 'dia' and offsets.size == 1 and offsets[0] == 0:
+            fmt = 'dia, dense diagonal'
+        elif fmt == 'sel':
+            fmt = 'sel, permutation' if nnz == m == n else 'sel, selection'
+        elif fmt == 'bsr':
+            fmt = 'bsr, %dx%d blocks' % blocksize
+        elif fmt == 'stacked':
+            fmt = 'bsr, %dx1 blocks of interleaved rows' % height
+        log.info("storing %s as %s: %d nnz, %d diagonals, row length cv %.2f, "
+            "%d overlapping columns; estimated bytes %s", node._name, fmt, nnz,
+            offsets.size, cv, overlap,
+            ', '.join('%s=%d' % fc for fc in sorted(costs.items(), key=lambda fc: fc[1])))
+        return node
+
+
+class SplitCenteredFFTs(Transform):
+    """
+    CenteredFFT ==> post * UnscaledFFT * pre, so later steps can group the
+    modulations with neighbouring matrices.
+    """
+    def visit_CenteredFFT(self, node):
+        return node.split()
+
+
 class DistributeKroniOverProd(Transform):
     """ Kron(I, A*B) ==> Kron(I, A) * Kron(I, B) """
     def visit_Kron(self, node):
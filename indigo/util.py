@@ -1,4 +1,5 @@
 import time
+import hashlib
 import logging
 import numpy as np
 import scipy.sparse as spp
@@ -30,6 +31,45 @@ def randM(M, N, density):
     return A
 
 
+def sparsity_key(A):
+    """
+    Returns a hashable key identifying the shape and sparsity pattern of
+    CSR matrix `A`, independent of its values.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(A.indptr))
+    h.update(np.ascontiguousarray(A.indices))
+    return (A.shape, A.indptr.dtype.str, A.indices.dtype.str, h.hexdigest())
+
+
+class Timer(object):
+    """
+    Context manager that records the wall-clock duration of each
+    `with` block it guards.
+    """
+    def __init__(self):
+        self.times = []
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.times.append( time.time() - self._start )
+
+    @property
+    def min(self):
+        return min(self.times)
+
+    @property
+    def max(self):
+        return max(self.times)
+
+    @property
+    def median(self):
+        return float(np.median(self.times))
+
+
 class profile(object):
     extra = dict()
 
@@ -7,7 +7,7 @@ exts = []
 customcpu_backend = Extension('indigo.backends._customcpu',
     sources = ['indigo/backends/_customcpu.c'],
     include_dirs=[np.get_include()],
-    extra_compile_args = ['-std=c11', '-fopenmp', '-m64', '-O3', '-Wno-unknown-pragmas'],
+    extra_compile_args = ['-std=c11', '-fopenmp', '-m64', '-O3', '-fcx-limited-range', '-Wno-unknown-pragmas'],
     extra_link_args=['-fopenmp', '-mavx'],
 )
 exts.append(customcpu_backend)